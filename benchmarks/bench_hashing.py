@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark pyx.executor.HashExecutor thread scaling.
+
+Hashes random spans sized like small, typical and very large transactions
+with 1, 2, 4, ... threads and reports MB/s and speed up over 1 thread.
+
+Run from top level directory:
+    python -m benchmarks.bench_hashing --threads 16 --mb 512
+"""
+
+# %% Imports
+
+import argparse
+import os
+import time
+
+from pybit.pyx.executor import HashExecutor
+
+
+# %% Benchmark
+
+def make_spans(total: int, span_size: int) -> list:
+    """Split total bytes into consecutive spans of span_size."""
+    return [(s, min(s + span_size, total))
+            for s in range(0, total, span_size)]
+
+
+def run(max_threads: int, mb: int, repeats: int=3) -> list:
+    """Time hashing for each span size and thread count."""
+    total = mb * 2 ** 20
+    buf = os.urandom(total)
+
+    results = []
+    for span_size in [250, 10 * 1024, 1024 * 1024]:
+        spans = make_spans(total, span_size)
+        base = None
+        threads = 1
+        while threads <= max_threads:
+            with HashExecutor(threads=threads) as ex:
+                best = float('inf')
+                for _ in range(repeats):
+                    t0 = time.perf_counter()
+                    ex.map(buf, spans)
+                    best = min(best, time.perf_counter() - t0)
+
+            base = base or best
+            results.append({'span_bytes': span_size,
+                            'threads': threads,
+                            'seconds': best,
+                            'MB/s': mb / best,
+                            'speed_up': base / best})
+            threads *= 2
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int,
+                        default=os.cpu_count())
+    parser.add_argument('--mb', type=int,
+                        default=256)
+    args = parser.parse_args()
+
+    print(f"{'span':>10} {'threads':>8} {'MB/s':>10} {'speed up':>9}")
+    for r in run(args.threads, args.mb):
+        print(f"{r['span_bytes']:>10} {r['threads']:>8} "
+              f"{r['MB/s']:>10.1f} {r['speed_up']:>9.2f}")
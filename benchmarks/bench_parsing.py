@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark parsing, hashing, export and address derivation.
+
+Runs each case in its own process and reports time, MB/s, blocks/s, tx/s
+and peak RSS. Uses synthetic blocks from pyx.generator unless --path points
+at a folder of real blk?????.dat files. Results are saved as JSON; pass an
+earlier file with --compare to see the change per case.
+
+Run from top level directory:
+    python -m benchmarks.bench_parsing --mb 64 --out bench.json
+    python -m benchmarks.bench_parsing --mb 64 --compare bench.json
+"""
+
+# %% Imports
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.harness import compare, load, print_table, run_case, save
+from pybit.py3.block import Block
+from pybit.py3.chain import Chain, Dat
+from pybit.py3.chain_map import DatMap
+from pybit.pyx.generator import BlockGenerator
+from pybit.pyx.scripts import ADDRESS_CACHE
+
+DAT_KWARGS = {'verb': 0,
+              'validateBlocks': False,
+              'validateTrans': False}
+
+
+# %% Helpers
+
+def _dats(path: str, files: list,
+          dat_class=Dat) -> list:
+    return [dat_class(path, f, **DAT_KWARGS) for f in files]
+
+
+def _read(path: str, files: list,
+          dat_class=Dat) -> list:
+    dats = _dats(path, files, dat_class)
+    for d in dats:
+        d.read_all()
+
+    return dats
+
+
+def _counts(dats: list) -> dict:
+    return {'bytes': sum(d.lastComplete for d in dats),
+            'blocks': sum(len(d.blocks) for d in dats),
+            'tx': sum(len(b.trans) for d in dats for b in d.blocks.values())}
+
+
+# %% Cases
+
+def case_read_header(path: str, files: list) -> dict:
+    """Block.read_header for every block, stepping over transactions."""
+    dats = _dats(path, files)
+    n = 0
+    t0 = time.perf_counter()
+    for d in dats:
+        while d.next_block_complete():
+            b = Block(d.mmap, d.cursor,
+                      network=d.network)
+            b.read_header()
+            d.cursor += 8 + b.blockSize
+            n += 1
+    s = time.perf_counter() - t0
+
+    return {'seconds': s,
+            'bytes': sum(d.cursor for d in dats),
+            'blocks': n}
+
+
+def case_read_trans(path: str, files: list) -> dict:
+    """Block.read_header and Block.read_trans for every block."""
+    dats = _dats(path, files)
+    n = 0
+    tx = 0
+    t0 = time.perf_counter()
+    for d in dats:
+        while d.next_block_complete():
+            b = Block(d.mmap, d.cursor,
+                      network=d.network,
+                      validateTrans=False)
+            b.read_header()
+            b.read_trans()
+            d.cursor = b.cursor
+            n += 1
+            tx += len(b.trans)
+    s = time.perf_counter() - t0
+
+    return {'seconds': s,
+            'bytes': sum(d.cursor for d in dats),
+            'blocks': n,
+            'tx': tx}
+
+
+def case_dat_read_all(path: str, files: list) -> dict:
+    """Dat.read_all (Block mode)."""
+    t0 = time.perf_counter()
+    dats = _read(path, files)
+    s = time.perf_counter() - t0
+
+    out = _counts(dats)
+    out['seconds'] = s
+    return out
+
+
+def case_datmap_read_all(path: str, files: list) -> dict:
+    """DatMap.read_all (BlockMap mode)."""
+    t0 = time.perf_counter()
+    dats = _read(path, files, DatMap)
+    s = time.perf_counter() - t0
+
+    out = _counts(dats)
+    out['seconds'] = s
+    return out
+
+
+def case_output_addr(path: str, files: list) -> dict:
+    """TxOut.outputAddr for every output, starting from a cold cache."""
+    dats = _read(path, files)
+    outs = [o for d in dats for b in d.blocks.values()
+            for t in b.trans.values() for o in t.txOut]
+    ADDRESS_CACHE.clear()
+
+    t0 = time.perf_counter()
+    for o in outs:
+        o.outputAddr
+    s = time.perf_counter() - t0
+
+    out = _counts(dats)
+    out.update({'seconds': s, 'outputs': len(outs)})
+    return out
+
+
+def case_outputs_to_pandas(path: str, files: list) -> dict:
+    """Dat.outputs_to_pandas (bulk address derivation)."""
+    dats = _read(path, files)
+    ADDRESS_CACHE.clear()
+
+    t0 = time.perf_counter()
+    for d in dats:
+        d.outputs_to_pandas()
+    s = time.perf_counter() - t0
+
+    out = _counts(dats)
+    out['seconds'] = s
+    return out
+
+
+def case_blocks_to_pandas(path: str, files: list) -> dict:
+    """Dat.blocks_to_pandas on the first file."""
+    dats = _read(path, files[0:1])
+
+    t0 = time.perf_counter()
+    dats[0].blocks_to_pandas()
+    s = time.perf_counter() - t0
+
+    out = _counts(dats)
+    out['seconds'] = s
+    return out
+
+
+def case_trans_to_pandas(path: str, files: list) -> dict:
+    """Dat.trans_to_pandas on the first file."""
+    dats = _read(path, files[0:1])
+
+    t0 = time.perf_counter()
+    dats[0].trans_to_pandas()
+    s = time.perf_counter() - t0
+
+    out = _counts(dats)
+    out['seconds'] = s
+    return out
+
+
+def case_txids(path: str, files: list) -> dict:
+    """Dat.txids: double SHA256 of every transaction."""
+    dats = _read(path, files)
+
+    t0 = time.perf_counter()
+    for d in dats:
+        d.txids()
+    s = time.perf_counter() - t0
+
+    out = _counts(dats)
+    out['seconds'] = s
+    return out
+
+
+def case_chain_read_all(path: str, files: list) -> dict:
+    """Chain.read_all, exporting blocks, trans and outputs to csv."""
+    out_path = tempfile.mkdtemp() + os.sep
+    c = Chain(path,
+              datStart=Dat.file_number(files[0]),
+              datn=len(files),
+              outputPath=out_path,
+              **DAT_KWARGS)
+    try:
+        t0 = time.perf_counter()
+        c.read_all()
+        s = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(out_path)
+
+    out = _counts(list(c.dats.values()))
+    out['seconds'] = s
+    return out
+
+
+CASES = {'read_header': case_read_header,
+         'read_trans': case_read_trans,
+         'dat_read_all': case_dat_read_all,
+         'datmap_read_all': case_datmap_read_all,
+         'txids': case_txids,
+         'output_addr': case_output_addr,
+         'outputs_to_pandas': case_outputs_to_pandas,
+         'blocks_to_pandas': case_blocks_to_pandas,
+         'trans_to_pandas': case_trans_to_pandas,
+         'chain_read_all': case_chain_read_all}
+
+
+# %% Run
+
+def run(path: str, files: list,
+        cases: list=None,
+        repeats: int=3) -> list:
+    """Run named cases (default all) over files in path."""
+    return [run_case(name, CASES[name], (path, files),
+                     repeats=repeats)
+            for name in (cases or CASES)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=None,
+                        help="Folder of blk?????.dat files to use")
+    parser.add_argument('--files', type=int,
+                        default=1,
+                        help="Number of files to use from --path")
+    parser.add_argument('--mb', type=float,
+                        default=32,
+                        help="Size of synthetic data to generate")
+    parser.add_argument('--seed', type=int,
+                        default=0)
+    parser.add_argument('--cases', nargs='+',
+                        choices=list(CASES),
+                        default=None)
+    parser.add_argument('--repeats', type=int,
+                        default=3)
+    parser.add_argument('--out', default=None,
+                        help="Save results to this JSON file")
+    parser.add_argument('--compare', default=None,
+                        help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.path is None:
+        tmp = tempfile.mkdtemp() + os.sep
+        path = tmp
+        files = BlockGenerator(seed=args.seed,
+                               tx_per_block=(100, 2000)).write(
+            path, total_bytes=int(args.mb * 2 ** 20))
+    else:
+        path = args.path
+        files = sorted(f for f in os.listdir(path)
+                       if Dat.file_number(f) is not None
+                       and f.startswith('blk'))[0:args.files]
+
+    try:
+        results = run(path, files,
+                      cases=args.cases,
+                      repeats=args.repeats)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+
+    print_table(results)
+
+    if args.out:
+        save(results, args.out,
+             data=args.path or f"synthetic seed={args.seed}",
+             mb=sum(os.path.getsize(os.path.join(path, f)) for f in files)
+             / 2 ** 20 if args.path else args.mb)
+
+    if args.compare:
+        new = {'results': results}
+        print(f"\n{'case':<24} {'old s':>8} {'new s':>8} {'speed up':>9}")
+        for case, o, n, r in compare(load(args.compare), new):
+            print(f"{case:<24} {o:>8.3f} {n:>8.3f} {r:>9.2f}")
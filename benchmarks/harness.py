@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for benchmarks: isolated runs, rates, JSON results.
+
+Each case runs in a fresh (spawned) process so its peak RSS isn't polluted
+by earlier cases or the parent. Case functions do their own setup and
+return the time taken by the measured part along with the amount of work
+done, from which MB/s, blocks/s and tx/s are calculated.
+"""
+
+# %% Imports
+
+import json
+import multiprocessing as mp
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+
+# %% Running cases
+
+def _child(fn, args: tuple, queue) -> None:
+    """Run case in child process and report its result and peak RSS."""
+    try:
+        res = fn(*args)
+        # ru_maxrss is KB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            rss /= 1024
+        res['peak_rss_mb'] = rss / 1024
+        queue.put(res)
+    except Exception as e:
+        queue.put({'error': repr(e)})
+
+
+def run_case(name: str, fn, args: tuple=(),
+             repeats: int=3) -> dict:
+    """
+    Run fn(*args) repeats times, each in a new process, keep the fastest.
+
+    fn must be importable (module level) and return a dict with at least
+    'seconds', and optionally 'bytes', 'blocks' and 'tx' counts.
+
+    Returns:
+        Dict of counts, best time, rates and peak RSS (MB).
+    """
+    ctx = mp.get_context('spawn')
+    best = None
+    for _ in range(repeats):
+        queue = ctx.Queue()
+        p = ctx.Process(target=_child, args=(fn, args, queue))
+        p.start()
+        res = queue.get()
+        p.join()
+
+        if 'error' in res:
+            raise RuntimeError(f"{name}: {res['error']}")
+        if best is None or res['seconds'] < best['seconds']:
+            best = res
+
+    out = {'case': name}
+    out.update(best)
+    s = best['seconds']
+    if best.get('bytes'):
+        out['MB/s'] = best['bytes'] / 2 ** 20 / s
+    if best.get('blocks'):
+        out['blocks/s'] = best['blocks'] / s
+    if best.get('tx'):
+        out['tx/s'] = best['tx'] / s
+
+    return out
+
+
+# %% Results
+
+def metadata() -> dict:
+    """Describe the environment and code version results came from."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor()}
+
+
+def save(results: list, fn: str,
+         **meta) -> None:
+    """Write results and metadata to JSON file."""
+    m = metadata()
+    m.update(meta)
+    with open(fn, 'w') as f:
+        json.dump({'meta': m, 'results': results}, f,
+                  indent=2)
+
+
+def load(fn: str) -> dict:
+    """Read results saved with save()."""
+    with open(fn, 'r') as f:
+        return json.load(f)
+
+
+def compare(old: dict, new: dict,
+            key: str='seconds') -> list:
+    """
+    Pair cases in two saved results.
+
+    Returns:
+        List of (case, old value, new value, old / new). For seconds a ratio
+        above 1 means new is faster.
+    """
+    prev = {r['case']: r for r in old['results']}
+    rows = []
+    for r in new['results']:
+        o = prev.get(r['case'])
+        if o is None or key not in o or key not in r:
+            continue
+        rows.append((r['case'], o[key], r[key], o[key] / r[key]))
+
+    return rows
+
+
+def print_table(results: list) -> None:
+    """Print results as a fixed width table."""
+    print(f"{'case':<24} {'s':>8} {'MB/s':>8} {'blocks/s':>10} "
+          f"{'tx/s':>10} {'RSS MB':>8}")
+    for r in results:
+        print(f"{r['case']:<24} {r['seconds']:>8.3f} "
+              f"{r.get('MB/s', 0):>8.2f} {r.get('blocks/s', 0):>10.1f} "
+              f"{r.get('tx/s', 0):>10.1f} {r['peak_rss_mb']:>8.1f}")
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent address index: every output paid to an address, and its spend.
+
+Built in one pass over the chain in height order, alongside a
+py3.utxo.UTXOSet (which supplies the script and value of each spent
+output). Records are buffered and written as sorted, append-only segments
+of a pyx.records.SegmentStore, which are compacted when there are too
+many. A query is a binary search per segment.
+
+Records are keyed by SHA256 of the address (as returned by
+TxOut.outputAddr, so P2PK outputs are found under their P2PKH address), or
+of the raw script for outputs without one.
+"""
+
+# %% Imports
+
+import numpy as np
+import pandas as pd
+
+from pybit.py3.common import chain_log
+from pybit.py3.utxo import UTXOSet, is_unspendable
+from pybit.pyx.networks import get_network
+from pybit.pyx.records import SegmentStore, pad
+from pybit.pyx.scripts import cached_script_to_addr
+from pybit.pyx.utils import hash_SHA256, hash_SHA256_twice
+
+
+# %% Records
+
+# kind 0: output (txid, n) paid value at height.
+# kind 1: output (txid, n) spent by input in_n of in_txid at height.
+RECORD = np.dtype([('key', 'S32'),
+                   ('height', '<u4'),
+                   ('txid', 'S32'),
+                   ('n', '<u4'),
+                   ('value', '<u8'),
+                   ('kind', 'u1'),
+                   ('in_txid', 'S32'),
+                   ('in_n', '<u4')])
+
+OUTPUT = 0
+SPEND = 1
+
+
+def address_key(addr) -> bytes:
+    """Index key for an address (str or bytes)."""
+    if isinstance(addr, str):
+        addr = addr.encode()
+
+    return hash_SHA256(addr)
+
+
+def script_key(script: bytes, network=None) -> bytes:
+    """Index key for an output script, via its address if it has one."""
+    addr = cached_script_to_addr(script, get_network(network))
+
+    return hash_SHA256(script) if addr is None else address_key(addr)
+
+
+# %% Index class
+
+class AddressIndex():
+    """
+    Address -> history of (height, txid, vout, value, spent by).
+
+    Usage:
+        idx = AddressIndex("addr_index/")
+        idx.build(Chain("Blocks/", datn=100), UTXOSet("utxo.sqlite"))
+        idx.history("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa")
+    """
+
+    def __init__(self, path: str,
+                 flush_every: int=1000,
+                 max_segments: int=16) -> None:
+        """
+        Args:
+            path: Folder for the index segments. Created if needed.
+            flush_every: Write a segment every this many blocks.
+            max_segments: Compact when there are more segments than this.
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.store = SegmentStore(path, RECORD,
+                                  max_segments=max_segments)
+
+        self.height = self.store.meta.get('height', -1)
+        self.network = self.store.meta.get('network', None)
+        self._buf = []
+        self._since = 0
+
+    def __repr__(self) -> str:
+        return f"AddressIndex: {self.path} @ height {self.height}"
+
+    # Building
+
+    def _key(self, script: bytes) -> bytes:
+        return script_key(script, self.network)
+
+    def add_block(self, block,
+                  height: int,
+                  txids: list,
+                  spent: list) -> None:
+        """
+        Buffer records for a block's outputs and spends.
+
+        Args:
+            block: Block (read, with transactions).
+            height: Height of block.
+            txids: Transaction hashes (internal byte order).
+            spent: Spent coins per transaction, from UTXOSet.apply_block.
+        """
+        block.check_complete()
+        if self.network is None:
+            self.network = block.network.name
+
+        buf = self._buf
+        for ti, (t, txid) in enumerate(zip(block.trans.values(), txids)):
+            if ti > 0:
+                for vin, (i, coin) in enumerate(zip(t.txIn, spent[ti])):
+                    if coin is None:
+                        continue
+                    buf.append((self._key(coin[1]), height,
+                                i._prevOutput,
+                                int.from_bytes(i._prevIndex, 'little'),
+                                coin[0], SPEND, txid, vin))
+
+            for n, o in enumerate(t.txOut):
+                script = o._pkScript
+                if is_unspendable(script):
+                    continue
+                buf.append((self._key(script), height, txid, n,
+                            int.from_bytes(o._value, 'little'),
+                            OUTPUT, b"", 0))
+
+        self.height = height
+        self._since += 1
+
+    def flush(self) -> None:
+        """Write buffered records as a new segment."""
+        self.store.append(np.array(self._buf, dtype=RECORD),
+                          height=self.height,
+                          network=self.network)
+        self._buf = []
+        self._since = 0
+
+    def build(self, chain,
+              utxo: UTXOSet=None,
+              height: int=None) -> None:
+        """
+        Index blocks in height order, up to and including height.
+
+        Resumes from the indexed height. The UTXO set is updated as blocks
+        are indexed and only flushed with the index, so pass the same set
+        each time. The index is written first, so a set left behind by an
+        interruption in between is caught up on resume.
+
+        Args:
+            chain: py3.chain.Chain over the .dat files.
+            utxo: UTXOSet at (or below) the height of the index. Default
+                None uses a new in memory set.
+            height: Last height to index. Default None (chain tip).
+        """
+        if utxo is None:
+            utxo = UTXOSet()
+        if utxo.height > self.height:
+            raise ValueError(f"UTXO set is at height {utxo.height}, "
+                             f"ahead of index at {self.height}")
+        if utxo.height < self.height:
+            utxo.build(chain, height=self.height)
+
+        stop = None if height is None else height + 1
+        for h, b in chain.iter_blocks_by_height(self.height + 1, stop):
+            txids = [hash_SHA256_twice(b.mmap[s:e])
+                     for s, e in b.trans_spans()]
+            spent = utxo.apply_block(b, h, txids=txids, flush=False)
+            self.add_block(b, h, txids, spent)
+            if self._since >= self.flush_every:
+                self.flush()
+                utxo.flush()
+                chain_log.info("Address index at height %s", h)
+
+        self.flush()
+        utxo.flush()
+
+    def compact(self) -> None:
+        """Merge all segments into one."""
+        self.store.compact()
+
+    # Queries
+
+    def _history(self, key: bytes) -> list:
+        outs = {}
+        spends = {}
+        for r in self.store.find(key):
+            op = (pad(r['txid']), int(r['n']))
+            if r['kind'] == OUTPUT:
+                outs[op] = (int(r['height']), int(r['value']))
+            else:
+                spends[op] = (pad(r['in_txid'])[::-1].hex(), int(r['in_n']),
+                              int(r['height']))
+
+        hist = [(h, txid[::-1].hex(), n, v, spends.get((txid, n)))
+                for (txid, n), (h, v) in outs.items()]
+
+        return sorted(hist, key=lambda x: (x[0], x[1], x[2]))
+
+    def history(self, addr) -> list:
+        """
+        All outputs paid to an address, in height order.
+
+        Returns:
+            List of (height, txid, vout, value, spent_by). txid is hex in
+            display order and spent_by is None if unspent, or
+            (spending txid, input index, height).
+        """
+        return self._history(address_key(addr))
+
+    def history_script(self, script: bytes) -> list:
+        """As .history(), for an output script."""
+        return self._history(self._key(script))
+
+    def balance(self, addr) -> int:
+        """Sum of unspent outputs paid to an address (satoshis)."""
+        return sum(x[3] for x in self.history(addr) if x[4] is None)
+
+    def history_to_pandas(self, addr) -> pd.DataFrame:
+        """.history() as a DataFrame."""
+        rows = [(h, txid, n, v) + (s if s is not None else (None,) * 3)
+                for h, txid, n, v, s in self.history(addr)]
+
+        return pd.DataFrame(rows, columns=['height', 'txid', 'vout', 'value',
+                                           'spentTxid', 'spentVin',
+                                           'spentHeight'])
@@ -5,15 +5,25 @@
 
 # %% Imports
 import codecs
+import logging
 import mmap
 import pickle
+import time
 from datetime import datetime as dt
 
 import base58
 import pandas as pd
 
-from pybit.py3.common import API, Common, Export
-from pybit.pyx.utils import OP_CODES, hash_SHA256_ripemd160, hash_SHA256_twice
+from pybit.py3.common import (API, Common, Export, FilteredBlock,
+                               MagicMismatch, api_log, block_log, trans_log,
+                               txio_log)
+from pybit.pyx.executor import HashExecutor
+from pybit.pyx.filters import scan_trans
+from pybit.pyx.networks import get_network
+from pybit.pyx.scripts import (ADDRESS_CACHE, P2PK, P2PKH,
+                               cached_script_to_addr, classify_script)
+from pybit.pyx.utils import (OP_CODES, hash_SHA256_ripemd160,
+                             hash_SHA256_twice, merkle_root)
 
 
 # %% Low level classes
@@ -27,13 +37,12 @@ class Block(Common, API, Export):
     .name is a get method which converts the ._name into a more readable/useful
      format.
     """
-    # Count blocks that have been created
-    _index = -1
-
     def __init__(self, mmap: "mmap.mmap", cursor: int,
-                 verb: int=3,
                  f: str=None,
+                 index: int=None,
+                 datn: int=None,
                  map: bool=False,
+                 network=None,
                  **trans_kwargs) -> None:
         """
         Prepare Block object.
@@ -42,15 +51,19 @@ class Block(Common, API, Export):
             mmap mapped .dat.
             cursor: Current location in mapped file.
             f: Full path to .dat file.
+            index: Position of block in .dat (counting from 0). Assigned by
+                the containing Dat.
+            datn: Number of the .dat file, eg. 1 for "blk00001.dat".
             map: If True, just map file rather than load. Slower, but
                 uses less memory. Default = False.
-            verb: Control verbsoity. 6 = Print all including API
-                validation. 1 = Use TQDM waitbar.
+            network: Network name or pyx.networks.Network. Block magic is
+                checked against it. Default mainnet.
             **trans_kwargs: kwargs to pass on to each transaction found.
         """
-        # Increment block counter and remember which one this is
-        Block._index += 1
-        self.index = Block._index
+        # Identity is owned by the containing Dat: (file number, ordinal)
+        self.index = index
+        self.datn = datn
+        self.network = get_network(network)
 
         # Hold keyword args for lower labels
         self.trans_kwargs = trans_kwargs
@@ -59,9 +72,12 @@ class Block(Common, API, Export):
         self.start = cursor
         self.cursor = cursor
         self.mmap = mmap
-        self.verb = verb
         self.f = f
-        self.validateTrans = self.trans_kwargs.get('validateTrans', True)
+        # Used here, not by Trans
+        self.validateTrans = self.trans_kwargs.pop('validateTrans', True)
+        # Optional pyx.filters predicate, checked on raw bytes
+        self.predicate = self.trans_kwargs.pop('predicate', None)
+        self.skipped = 0
         self.end = None
         self.trans: dict = {}
 
@@ -103,49 +119,71 @@ class Block(Common, API, Export):
         return s
 
     def _print(self) -> None:
-        """Print depending on .verb."""
-        if self.verb >= 3:
-            print(self)
+        """Log block header info (shown with verb >= 3)."""
+        if block_log.isEnabledFor(logging.INFO):
+            block_log.info("%s", self)
+
+    @property
+    def id(self) -> tuple:
+        """Return (.dat number, position in .dat). Stable across runs."""
+        return (self.datn, self.index)
 
     @classmethod
-    def genesis(self) -> bytes:
-        """Return genesis block bytes."""
-        gen = b"\xf9\xbe\xb4\xd9\x1d\x01\x00\x00\x01\x00\x00\x00"\
-            b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"\
-            b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"\
-            b"\x00\x00\x00\x00\x00\x00\x00\x00;\xa3\xed\xfdz{\x12"\
-            b"\xb2z\xc7,>gv\x8fa\x7f\xc8\x1b\xc3\x88\x8aQ2:\x9f"\
-            b"\xb8\xaaK\x1e^J)\xab_I\xff\xff\x00\x1d\x1d\xac+|\x01"\
-            b"\x01\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00"\
-            b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"\
-            b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\xff\xff"\
-            b"\xff\xffM\x04\xff\xff\x00\x1d\x01\x04EThe Times 03/Jan/2009 "\
-            b"Chancellor on brink of second bailout for banks\xff\xff"\
-            b"\xff\xff\x01\x00\xf2\x05*\x01\x00\x00\x00CA\x04g\x8a"\
-            b"\xfd\xb0\xfeUH'\x19g\xf1\xa6q0\xb7\x10\\\xd6\xa8(\xe09\t"\
-            b"\xa6yb\xe0\xea\x1fa\xde\xb6I\xf6\xbc?L\xef8\xc4\xf3U\x04"\
-            b"\xe5\x1e\xc1\x12\xde\\8M\xf7\xba\x0b\x8dW\x8aLp+k\xf1\x1d_"\
-            b"\xac\x00\x00\x00\x00"
-
-        return gen
-
-    def read_block(self) -> None:
-        """Read full block."""
+    def genesis(self,
+                network=None) -> bytes:
+        """
+        Return genesis block bytes, as stored in a .dat.
+
+        Args:
+            network: Network name or pyx.networks.Network. Default mainnet.
+        """
+        return get_network(network).genesis()
+
+    def read_block(self,
+                   stats=None,
+                   profiler=None) -> tuple:
+        """
+        Read full block.
+
+        Args:
+            stats: Optional py3.stats.ParseStats to add header, tx and
+                validation times to.
+            profiler: Optional py3.profiling.BlockProfiler to record
+                transaction parse times in.
+
+        Returns:
+            Tuple of (parse, validation) seconds.
+        """
+        t0 = time.perf_counter()
+
         # Read header
         self.read_header()
 
+        # Check framing matches network before reading further
+        if self._magic != self.network.magic:
+            raise MagicMismatch(self._magic, self.network.magic)
+
         # Read transactions
-        self.read_trans()
+        t1 = time.perf_counter()
+        self.read_trans(profiler=profiler)
 
         # Record end of block
         self.end = self.cursor
-        if self.verb >= 3:
-            b = self.verb*" "*2
-            print(f"{b}Block ends at: {self.end}")
-            print(f"{b}{'**'*10}")
+        block_log.debug("Block ends at: %s", self.end)
 
-        # Check size as expected
+        # Check size as expected, validate transactions if on
+        t2 = time.perf_counter()
         self.verify()
+        if self.validateTrans:
+            self.verify_trans()
+
+        t3 = time.perf_counter()
+        if stats is not None:
+            stats.add("header", t1 - t0)
+            stats.add("tx", t2 - t1)
+            stats.add("validation", t3 - t2)
+
+        return t2 - t0, t3 - t2
 
     @property
     def magic(self) -> str:
@@ -271,28 +309,48 @@ class Block(Common, API, Export):
         # Read the number of transactions: VarInt 1-9 bytes
         self._nTransactions = self.read_var()
 
-        # Print (depends on verbosity)
-        self._print()
+        # Log (only formatted if enabled)
+        if block_log.isEnabledFor(logging.INFO):
+            block_log.info("%s", self)
 
-    def read_trans(self) -> None:
+    def read_trans(self,
+                   profiler=None) -> None:
         """Read transactions in block.
 
-        Store in dict in .trans.
+        Store in dict in .trans, keyed by position in block. If .predicate
+        is set, transactions it rejects are skipped over (counted in
+        .skipped) without being parsed, so keys can have gaps.
+
+        Args:
+            profiler: Optional py3.profiling.BlockProfiler, times each
+                transaction if set.
         """
         self.trans = {}
+        self.skipped = 0
+        predicate = self.predicate
         for t in range(self.nTransactions):
+            if predicate is not None:
+                end, outputs = scan_trans(self.mmap, self.cursor)
+                if not predicate(self.mmap, outputs):
+                    self.cursor = end
+                    self.skipped += 1
+                    continue
+
+            if profiler is not None:
+                t0 = time.perf_counter()
 
             # Make transaction objects (and table later?)
-            trans = Trans(self.mmap, self.cursor,
-                          verb=self.verb,
-                          **self.trans_kwargs)
+            trans = self.trans_class(self.mmap, self.cursor,
+                                     f=self.f,
+                                     index=t,
+                                     network=self.network,
+                                     **self.trans_kwargs)
 
             # Read the transaction
             trans.get_transaction()
 
-            # Validate, if on
-            if self.validateTrans:
-                trans.api_verify()
+            if profiler is not None:
+                profiler.record_trans(trans, time.perf_counter() - t0, self)
 
             # Update cursor
             self.cursor = trans.cursor
@@ -300,6 +358,49 @@ class Block(Common, API, Export):
             # Save
             self.trans[t] = trans
 
+    def verify_trans(self) -> None:
+        """Validate each transaction read against the API."""
+        for trans in self.trans.values():
+            trans.api_verify()
+
+    def check_complete(self) -> None:
+        """Raise FilteredBlock if a predicate skipped any transactions."""
+        if self.skipped:
+            raise FilteredBlock(self.start, self.skipped)
+
+    def trans_spans(self,
+                    partial: bool=False) -> list:
+        """
+        Return (start, end) of each transaction in .mmap.
+
+        Args:
+            partial: Allow a block read with a predicate, giving the spans
+                of the transactions parsed. Default False raises
+                FilteredBlock if any were skipped.
+        """
+        if not partial:
+            self.check_complete()
+
+        return [(t.start, t.end) for t in self.trans.values()]
+
+    def calc_merkleRootHash(self,
+                            executor: HashExecutor=None) -> bytes:
+        """Calculate Merkle root from the transactions read.
+
+        Args:
+            executor: Optional pyx.executor.HashExecutor to hash the
+                transactions with. Default None hashes here.
+
+        Returns bytes in the same order as ._merkleRootHash.
+        """
+        spans = self.trans_spans()
+        if executor is None:
+            txids = [hash_SHA256_twice(self.mmap[s:e]) for s, e in spans]
+        else:
+            txids = executor.map(self.mmap, spans)
+
+        return merkle_root(txids)
+
     def verify(self):
         """Verify block size.
 
@@ -365,9 +466,7 @@ class Block(Common, API, Export):
         TODO:
             - Tidy printing
         """
-        if self.verb > 4:
-            print("{0}{1}Validating{1}".format(" "*3,
-                                               "_"*10))
+        api_log.info("Validating block")
 
         jr = self.api_get(url=url,
                           wait=wait)
@@ -388,9 +487,7 @@ class Block(Common, API, Export):
             self.api_validated = 'Skipped'
 
         # Report
-        if self.verb > 3:
-            print(f"{' '*3}Validation passed: {self.api_validated}",
-                  f"\n{' '*3}{'_'*30}")
+        api_log.info("Validation passed: %s", self.api_validated)
 
     def to_pic(self,
                fn: str='test.pic') -> None:
@@ -424,13 +521,11 @@ class Trans(Common, API, Export):
      format.
     """
 
-    # Object counter
-    _index = -1
-
     def __init__(self, mmap, cursor,
-                 verb: int=4,
                  f: str=None,
-                 map: bool=False) -> None:
+                 index: int=None,
+                 map: bool=False,
+                 network=None) -> None:
         """
         Prepare Trans object.
 
@@ -438,23 +533,25 @@ class Trans(Common, API, Export):
             mmap mapped .dat.
             cursor: Current location in mapped file.
             f: Full path to .dat file.
+            index: Position of transaction in block (counting from 0).
+                Assigned by the containing Block.
             map: If True, just map file rather than load. Slower, but
                 uses less memory. Default = False.
-            verb: Control verbsoity. 6 = Print all including API
-                validation. 1 = Use TQDM waitbar.
+            network: Network name or pyx.networks.Network, used for output
+                addresses. Default mainnet.
         """
-        # Increment block counter and remember which one this is
-        Trans._index += 1
-        self.index = Trans._index
+        self.index = index
+        self.network = get_network(network)
 
         self.start = cursor
         self.cursor = cursor
         self.mmap = mmap
-        self.verb = verb
         self.f = f
         self.txIn = {}
         self.txOut = {}
         self.api_validated = None
+        # Satoshis spent by each input, once resolved (see py3.fees)
+        self.inputValues = None
         self.end = None
 
         # Prepare other attributes
@@ -482,7 +579,7 @@ class Trans(Common, API, Export):
             f"{b}nOutputs: {self.nOutputs}\n" \
             f"{b}lock time: {self.lockTime}\n"
 
-        if self.verb > 5:
+        if txio_log.isEnabledFor(logging.INFO):
             # Print inputs
             for inp in self.txIn:
                 s += f"{inp.__str__()}\n"
@@ -494,8 +591,9 @@ class Trans(Common, API, Export):
         return s
 
     def _print(self):
-        if self.verb >= 4:
-            print(self)
+        """Log transaction info (shown with verb >= 4)."""
+        if trans_log.isEnabledFor(logging.INFO):
+            trans_log.info("%s", self)
 
     @property
     def nInputs(self) -> int:
@@ -513,6 +611,46 @@ class Trans(Common, API, Export):
         """
         return int(codecs.encode(self._nOutputs[::-1], "hex"), 16)
 
+    @property
+    def size(self) -> int:
+        """Serialised size in bytes."""
+        return self.end - self.start
+
+    @property
+    def vsize(self) -> int:
+        """
+        Virtual size. Witness data isn't parsed, so this is the size (weight
+        is 4 * size).
+        """
+        return self.size
+
+    @property
+    def outputValue(self) -> int:
+        """Total of outputs, in satoshis."""
+        return sum(o.satoshis for o in self.txOut)
+
+    @property
+    def inputValue(self) -> int:
+        """Total of spent outputs in satoshis, None if not resolved."""
+        if self.inputValues is None or None in self.inputValues:
+            return None
+
+        return sum(self.inputValues)
+
+    @property
+    def fee(self) -> int:
+        """Input value - output value in satoshis, None if not resolved."""
+        iv = self.inputValue
+
+        return None if iv is None else iv - self.outputValue
+
+    @property
+    def feerate(self) -> float:
+        """Fee in satoshis per virtual byte, None if not resolved."""
+        fee = self.fee
+
+        return None if fee is None else fee / self.vsize
+
     @property
     def lockTime(self) -> str:
         """Return lock time as str.
@@ -533,8 +671,7 @@ class Trans(Common, API, Export):
         self.txIn = []
         for _ in range(self.nInputs):
             # Create the TxIn object
-            txIn = TxIn(self.mmap, self.cursor,
-                        verb=self.verb)
+            txIn = TxIn(self.mmap, self.cursor)
 
             # Read the input data
             txIn.read_in()
@@ -553,7 +690,7 @@ class Trans(Common, API, Export):
         for _ in range(self.nOutputs):
             # Create TxOut object
             txOut = TxOut(self.mmap, self.cursor,
-                          verb=self.verb)
+                          network=self.network)
 
             # Read the output data
             txOut.read_out()
@@ -570,8 +707,9 @@ class Trans(Common, API, Export):
         # Record the end for reference, remove later?
         self.end = self.cursor
 
-        # Print (depends on verbosity)
-        self._print()
+        # Log (only formatted if enabled)
+        if trans_log.isEnabledFor(logging.INFO):
+            trans_log.info("%s", self)
 
     def to_dict_full(self) -> dict:
         """Return transaction as dict.
@@ -625,9 +763,7 @@ class Trans(Common, API, Export):
         TODO:
             - Tidy printing
         """
-        if self.verb > 4:
-            print("{0}{1}Validating{1}".format(" "*4,
-                                               "_"*10))
+        api_log.info("Validating transaction")
 
         jr = self.api_get(url=url,
                           wait=wait)
@@ -644,38 +780,21 @@ class Trans(Common, API, Export):
             self.api_validated = 'Skipped'
 
         # Report
-        if self.verb > 4:
-            print("{0}Validation passed: {1}\n{0}{2}".format(
-                                            " "*4,
-                                            self.api_validated,
-                                            "_"*30))
+        api_log.info("Validation passed: %s", self.api_validated)
 
     def prep_header(self) -> bytes:
-        """Return transaction header bytes.
+        """Return transaction bytes for hashing.
 
-        Only works for single input and output transactions for now
+        The hash covers the whole serialised transaction (all inputs and
+        outputs), which is the span .start -> .end in the .dat.
         """
-        header = self._version \
-            + self._nInputs \
-            + self.txIn[0]._prevOutput \
-            + self.txIn[0]._prevIndex \
-            + self.txIn[0]._scriptLength \
-            + self.txIn[0]._scriptSig \
-            + self.txIn[0]._sequence \
-            + self._nOutputs \
-            + self.txOut[0]._value \
-            + self.txOut[0]._pkScriptLen \
-            + self.txOut[0]._pkScript \
-            + self._lockTime
-
-        return header
+        return self.mmap[self.start:self.end]
 
 
 class TxIn(Common, Export):
     """Class to handle transaction inputs."""
     def __init__(self, mmap, cursor,
                  n: int=None,
-                 verb: int=5,
                  f: str=None,
                  map: bool=False) -> None:
         """
@@ -688,15 +807,12 @@ class TxIn(Common, Export):
             f: Full path to .dat file.
             map: If True, just map file rather than load. Slower, but
                 uses less memory. Default = False.
-            verb: Control verbsoity. 6 = Print all including API
-                validation. 1 = Use TQDM waitbar.
         """
         # Add a reference, if provided
         if n is not None:
             self.n = n
 
         self.f = f
-        self.verb = verb
         self.mmap = mmap
         self.cursor = cursor
 
@@ -720,8 +836,9 @@ class TxIn(Common, Export):
         return s
 
     def _print(self) -> None:
-        if self.verb >= 5:
-            print(self)
+        """Log info (shown with verb >= 5)."""
+        if txio_log.isEnabledFor(logging.INFO):
+            txio_log.info("%s", self)
 
     @property
     def prevOutput(self) -> str:
@@ -740,9 +857,9 @@ class TxIn(Common, Export):
     @property
     def scriptLength(self) -> int:
         """
-        Convert to hex, convert to int from base 16
+        Reverse endedness, convert to hex, convert to int from base 16
         """
-        return int(codecs.encode(self._scriptLength, "hex"), 16)
+        return int(codecs.encode(self._scriptLength[::-1], "hex"), 16)
 
     @property
     def scriptSig(self) -> str:
@@ -783,18 +900,23 @@ class TxOut(Common, Export):
     """
     Class to handle transaction outputs
     """
+    # Derived addresses, shared by all TxOuts (see pyx.scripts)
+    address_cache = ADDRESS_CACHE
+
     def __init__(self, mmap, cursor,
                  n: int=None,
-                 verb: int=5,
                  f: str=None,
-                 map: bool=False) -> None:
+                 map: bool=False,
+                 network=None) -> None:
 
         # Add a reference, if provided
         if n is not None:
             self.n = n
 
+        # Address versions and hrp
+        self.network = get_network(network)
+
         self.f = f
-        self.verb = verb
         self.mmap = mmap
         self.cursor = cursor
         self.end = None
@@ -816,8 +938,9 @@ class TxOut(Common, Export):
         return s
 
     def _print(self) -> None:
-        if self.verb >= 5:
-            print(self)
+        """Log info (shown with verb >= 5)."""
+        if txio_log.isEnabledFor(logging.INFO):
+            txio_log.info("%s", self)
 
     @property
     def value(self) -> int:
@@ -827,12 +950,17 @@ class TxOut(Common, Export):
         """
         return int(codecs.encode(self._value[::-1], "hex"), 16)/100000000
 
+    @property
+    def satoshis(self) -> int:
+        """Value in satoshis, as int."""
+        return int.from_bytes(self._value, 'little')
+
     @property
     def pkScriptLen(self) -> int:
         """
-        Convert to hex, convert to int from base 16
+        Reverse endedness, convert to hex, convert to int from base 16
         """
-        return int(codecs.encode(self._pkScriptLen, "hex"), 16)
+        return int(codecs.encode(self._pkScriptLen[::-1], "hex"), 16)
 
     @property
     def pkScript(self) -> str:
@@ -845,21 +973,21 @@ class TxOut(Common, Export):
     def parsed_pkScript(self) -> list:
         return TxOut.split_script(self.pkScript)
 
+    @property
+    def outputType(self) -> str:
+        """
+        Match pk script against standard templates, return type
+        """
+        return classify_script(self._pkScript)
+
     @property
     def outputAddr(self) -> str:
         """
-        Split script, detect output type, get address
+        Detect output type from script template, get address (cached)
         """
-        # Get the encoded address from the output script
-        script = self.parsed_pkScript
-        pk = script[script.index("PUSH_BYTES")+2]
+        addr = cached_script_to_addr(self._pkScript, self.network)
 
-        # Decode the address
-        if len(pk) == 65:
-            addr = self.get_P2PKH()
-        elif len(pk) == 130:
-            addr = self.get_PK2Addr()
-        else:
+        if addr is None:
             addr = "Unknown address"
 
         return addr
@@ -899,12 +1027,14 @@ class TxOut(Common, Export):
 
     @staticmethod
     def P2PKH(pk: hex,
-              debug: bool=False) -> str:
+              debug: bool=False,
+              version: bytes=b"\x00") -> str:
         """
         pk = public key in hex
+        version = address version byte, see pyx.networks
         """
         # Add version
-        pk = b"\00" + pk
+        pk = version + pk
         if debug:
             print("{0}pk + ver: {1}".format(" "*6, codecs.encode(pk, "hex")))
 
@@ -927,21 +1057,21 @@ class TxOut(Common, Export):
 
     def get_P2PKH(self) -> str:
         """
-        Get script, extract public key, convert to address
+        Get script, extract public key hash, convert to address
         """
-        # Get the parsed script
-        script = self.parsed_pkScript
-        pk = script[script.index("PUSH_BYTES")+2]
+        script = self._pkScript
+        if classify_script(script) != P2PKH:
+            return "Unknown address"
 
-        b58 = TxOut.P2PKH(pk)
-
-        return b58
+        return cached_script_to_addr(script, self.network)
 
     @staticmethod
     def PK2Addr(pk: hex,
-                debug: bool=False) -> str:
+                debug: bool=False,
+                version: bytes=b"\x00") -> str:
         """
         pk = public key in hex
+        version = address version byte, see pyx.networks
         """
         # Decode input to binary
         pk = codecs.decode(pk, "hex")
@@ -954,7 +1084,7 @@ class TxOut(Common, Export):
             print("{0}SHA256: h1: {1}".format(" "*6, codecs.encode(h, "hex")))
 
         # Add version
-        h = b"\00" + h
+        h = version + h
         if debug:
             print("{0}version + h1: {1}".format(
                             " "*6, codecs.encode(h, "hex")))
@@ -982,13 +1112,11 @@ class TxOut(Common, Export):
         """
         Get script, extract public key, convert to address
         """
-        # Get the parsed script
-        script = self.parsed_pkScript
-        pk = script[script.index("PUSH_BYTES")+2]
+        script = self._pkScript
+        if classify_script(script) != P2PK:
+            return "Unknown address"
 
-        b58 = self.PK2Addr(pk)
-
-        return b58
+        return cached_script_to_addr(script, self.network)
 
     def read_out(self) -> None:
         """
@@ -1009,3 +1137,7 @@ class TxOut(Common, Export):
 
         # Record end of transaction for debugging
         self.end = self.cursor
+
+
+# Set here as Trans is defined after Block
+Block.trans_class = Trans
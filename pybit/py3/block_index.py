@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Read Bitcoin Core's block index (the LevelDB database in blocks/index).
+
+Core keeps an entry for every header it has seen, under b"b" + block hash
+(internal byte order). Each value is a CDiskBlockIndex:
+
+    VARINT(client version), VARINT(height), VARINT(status), VARINT(nTx),
+    VARINT(file) if the block or its undo data is stored,
+    VARINT(data position) if the block is stored,
+    VARINT(undo position) if the undo data is stored,
+    80 byte header
+
+Data positions point just after the block's magic and size. Loading these
+into a HeaderIndex locates every block without scanning the blk files.
+
+Uses plyvel if it's installed, otherwise the pure Python reader in
+pyx.leveldb. Core must not be running (LevelDB holds a lock on the folder
+and may be mid-write).
+"""
+
+# %% Imports
+
+from pybit.pyx.compress import read_varint, write_varint
+from pybit.pyx.leveldb import iter_db
+
+# Optional, faster LevelDB bindings
+try:
+    import plyvel
+except ImportError:
+    plyvel = None
+
+
+# %% Status flags
+
+BLOCK_VALID_MASK = 7
+BLOCK_VALID_SCRIPTS = 5
+BLOCK_HAVE_DATA = 8
+BLOCK_HAVE_UNDO = 16
+BLOCK_FAILED_MASK = 32 | 64
+
+PREFIX = b"b"
+
+
+# %% Encoding
+
+def decode_block_index(raw: bytes) -> dict:
+    """
+    Decode a block index entry.
+
+    Returns:
+        Dict of version, height, status, nTx, file, dataPos, undoPos (None
+        when not stored) and header (80 bytes).
+    """
+    version, pos = read_varint(raw, 0)
+    height, pos = read_varint(raw, pos)
+    status, pos = read_varint(raw, pos)
+    n_tx, pos = read_varint(raw, pos)
+
+    file = data_pos = undo_pos = None
+    if status & (BLOCK_HAVE_DATA | BLOCK_HAVE_UNDO):
+        file, pos = read_varint(raw, pos)
+    if status & BLOCK_HAVE_DATA:
+        data_pos, pos = read_varint(raw, pos)
+    if status & BLOCK_HAVE_UNDO:
+        undo_pos, pos = read_varint(raw, pos)
+
+    return {'version': version,
+            'height': height,
+            'status': status,
+            'nTx': n_tx,
+            'file': file,
+            'dataPos': data_pos,
+            'undoPos': undo_pos,
+            'header': bytes(raw[pos:pos+80])}
+
+
+def encode_block_index(entry: dict) -> bytes:
+    """Inverse of decode_block_index."""
+    status = entry['status']
+    out = [write_varint(entry['version']),
+           write_varint(entry['height']),
+           write_varint(status),
+           write_varint(entry['nTx'])]
+    if status & (BLOCK_HAVE_DATA | BLOCK_HAVE_UNDO):
+        out.append(write_varint(entry['file']))
+    if status & BLOCK_HAVE_DATA:
+        out.append(write_varint(entry['dataPos']))
+    if status & BLOCK_HAVE_UNDO:
+        out.append(write_varint(entry['undoPos']))
+    out.append(entry['header'])
+
+    return b"".join(out)
+
+
+# %% Reading
+
+def read_block_index(path: str) -> dict:
+    """
+    Read all entries from a block index database.
+
+    Args:
+        path: The blocks/index folder.
+
+    Returns:
+        Dict of block hash (internal byte order) -> decoded entry.
+    """
+    if plyvel is not None:
+        db = plyvel.DB(path, create_if_missing=False)
+        try:
+            items = list(db.iterator(prefix=PREFIX))
+        finally:
+            db.close()
+    else:
+        items = iter_db(path, prefix=PREFIX)
+
+    return {bytes(k[1:]): decode_block_index(v)
+            for k, v in items if len(k) == 33}
@@ -14,7 +14,10 @@ Properties replace the ._[name] attributes with a get method.
 
 # %% Imports
 
+import logging
+
 from pybit.py3.block import Block, Trans, TxIn, TxOut
+from pybit.py3.common import block_log, trans_log
 
 
 # %% Lower level classes
@@ -113,34 +116,9 @@ class BlockMap(Block):
         # Read the number of transactions: VarInt 1-9 bytes
         self._nTransactions_i, _ = self.map_var()
 
-        # Print (depends on verbosity)
-        self._print()
-
-    def read_trans(self):
-        """
-        Read transaction information in block
-        """
-        self.trans = {}
-        for t in range(self.nTransactions):
-
-            # Make transaction objects (and table later?)
-            trans = TransMap(self.mmap, self.cursor,
-                             verb=self.verb,
-                             f=self.f,
-                             **self.trans_kwargs)
-
-            # Read the transaction
-            trans.get_transaction()
-
-            # Validate, if on
-            if self.validateTrans:
-                trans.api_verify()
-
-            # Update cursor
-            self.cursor = trans.cursor
-
-            # Save
-            self.trans[t] = trans
+        # Log (only formatted if enabled)
+        if block_log.isEnabledFor(logging.INFO):
+            block_log.info("%s", self)
 
 
 class TransMap(Trans):
@@ -191,7 +169,6 @@ class TransMap(Trans):
         for _ in range(self.nInputs):
             # Create the TxIn object
             txIn = TxInMap(self.mmap, self.cursor,
-                           verb=self.verb,
                            f=self.f)
 
             # Read the input data
@@ -211,8 +188,8 @@ class TransMap(Trans):
         for _ in range(self.nOutputs):
             # Create TxOut object
             txOut = TxOutMap(self.mmap, self.cursor,
-                             verb=self.verb,
-                             f=self.f)
+                             f=self.f,
+                             network=self.network)
 
             # Read the output data
             txOut.read_out()
@@ -229,8 +206,9 @@ class TransMap(Trans):
         # Record the end for reference, remove later?
         self.end = self.cursor
 
-        # Print (depends on verbosity)
-        self._print()
+        # Log (only formatted if enabled)
+        if trans_log.isEnabledFor(logging.INFO):
+            trans_log.info("%s", self)
 
 
 class TxInMap(TxIn):
@@ -336,6 +314,10 @@ class TxOutMap(TxOut):
         self.end = self.cursor
 
 
+# Set here as TransMap is defined after BlockMap
+BlockMap.trans_class = TransMap
+
+
 if __name__ == "__main__":
     """
     See map_dat.py
@@ -6,20 +6,34 @@ quick tests
 
 # %% Imports
 
+import glob
+import logging
 import mmap
+import os
 import pickle
+import re
+import time
+from typing import Callable, Iterator
 
-import numpy as np
 import pandas as pd
 
-from pybit.py3.block import Block
-from pybit.py3.common import Export
-from pybit.pyx.utils import tqdm_off
+from pybit.py3.block import Block, Trans
+from pybit.py3.checkpoint import Checkpoint
+from pybit.py3.common import (Export, MagicMismatch, chain_log, dat_log,
+                               set_verbosity)
+from pybit.py3.header_index import HeaderIndex
+from pybit.py3.profiling import BlockProfiler
+from pybit.py3.stats import ParseStats
+from pybit.py3.tx_index import TxIndex
+from pybit.pyx.executor import HashExecutor
+from pybit.pyx.filters import scan_trans
+from pybit.pyx.networks import MAGICS, MAINNET, detect_network, get_network
+from pybit.pyx.scripts import bulk_script_to_addr
+from pybit.pyx.utils import hash_SHA256_twice, read_compact_size, tqdm_off
 
 # Optional import for pretty waitbars
 try:
     from tqdm import tqdm
-    print("Imported tqdm")
 except ImportError:
     tqdm = tqdm_off
 
@@ -33,11 +47,16 @@ class Dat(Export):
     Opens and maps .dat ready for reading
     """
 
-    _index = -1
+    # Class used for each block read
+    block_class = Block
 
     def __init__(self, path: str, f: str,
-                 verb: int=2,
+                 datn: int=None,
+                 verb: int=None,
                  defer_printing: int=0,
+                 network="auto",
+                 stats: ParseStats=None,
+                 profiler: BlockProfiler=None,
                  **kwargs) -> None:
         """Initialise Dat.
 
@@ -46,29 +65,61 @@ class Dat(Export):
         Args:
             path: Path to folder containing .dats eg. "Blocks/"
             fn: File name of .dat eg. "blk0000.dat"
-            verb: Control verbosity of printing. Level 2 (default)
-                prints Dat level updates (ie. not detailed block
-                or trans info.)
-            defer_printing: Don't print anything until block
-                n then print at level specified by verb.
-            **kwargs: Args to pass on to Block and Trans classes when used.
+            datn: Number of .dat file. Default None gets it from the
+                file name.
+            verb: Control verbosity of logging, eg. 2 logs Dat level
+                updates (ie. not detailed block or trans info.) See
+                common.set_verbosity. Default None leaves logging config
+                to the application.
+            defer_printing: Don't log anything until block
+                n then log at level specified by verb. Only used with
+                verb.
+            network: Network name or pyx.networks.Network. Blocks must
+                start with its magic. Default "auto" detects it from the
+                file, falling back to mainnet.
+            stats: py3.stats.ParseStats to record counts and stage times
+                in, eg. one shared by a Chain. Default None creates one.
+            profiler: Optional py3.profiling.BlockProfiler to record per
+                block and transaction parse times in. Default None (off).
+            **kwargs: Args to pass on to Block and Trans classes when used,
+                eg. predicate (pyx.filters) to only parse matching
+                transactions.
         """
-        # Increment Dat counter and remember which one this is
-        Dat._index += 1
-        self.index = Dat._index
+        # Identify by file number, rather than order of creation
+        if datn is None:
+            datn = Dat.file_number(f)
+        self.datn = datn
+        self.index = datn
 
         self.f = f
         self.path = path
         self.mmap = None
         self.length = 0
         self.prepare_mem()
+        if network == "auto":
+            network = detect_network(self.mmap, default=MAINNET)
+        self.network = get_network(network)
+        # Network magic at the start of each block
+        self.magic = self.network.magic
         self.cursor = 0
         self.blocks = {}
         self.nBlock = -1
+        # End of last complete block, and why reading stopped there
+        self.lastComplete = 0
+        self.tailState = None
+        self.stats = stats if stats is not None else ParseStats()
+        self.profiler = profiler
         self.verb = verb
         self.defer_printing = defer_printing
+        self._deferred = False
         self.block_kwargs = kwargs
-        self.validateBlocks = kwargs.get('validateBlocks', True)
+        # Used here, not by Block
+        self.validateBlocks = kwargs.pop('validateBlocks', True)
+
+        # Logging levels are set once here, not checked per object
+        if verb is not None:
+            self._deferred = defer_printing > 0
+            set_verbosity(0 if self._deferred else verb)
 
     def __repr__(self) -> str:
         """
@@ -90,9 +141,16 @@ class Dat(Export):
         return s
 
     def _print(self):
-        """Print after checking verbosity level."""
-        if self.verb >= 2:
-            print(self)
+        """Log Dat info (shown with verb >= 2)."""
+        if dat_log.isEnabledFor(logging.INFO):
+            dat_log.info("%s", self)
+
+    @staticmethod
+    def file_number(f: str) -> int:
+        """Return n from "blk[n].dat" style file names, or None."""
+        m = re.match(r"^[a-z]+(\d+)\.dat$", os.path.basename(f))
+
+        return int(m.group(1)) if m else None
 
     def prepare_mem(self) -> None:
         """Open file, map, reset cursor.
@@ -104,10 +162,132 @@ class Dat(Export):
             self.mmap = mmap.mmap(fo.fileno(), 0,
                                   access=mmap.ACCESS_READ)
 
-        # Reset cursor and block count
+        # Reset cursor
         self.cursor = 0
         self.length = len(self.mmap)
-        Block._index = -1
+
+    def remap(self) -> bool:
+        """
+        Map the file again if it has grown, keeping cursor position.
+
+        Returns True if the file was remapped.
+        """
+        size = os.path.getsize(self.path + self.f)
+        if size <= self.length:
+            return False
+
+        with open(self.path + self.f, 'rb') as fo:
+            self.mmap = mmap.mmap(fo.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        self.length = len(self.mmap)
+        dat_log.info("Remapped %s, %s bytes", self.f, self.length)
+
+        return True
+
+    def next_block_complete(self) -> bool:
+        """
+        Check a whole block has been written at .cursor.
+
+        Looks at the 8 byte magic + size prefix only: the magic must be
+        present (not zero padding) and the block must fit in the file.
+        """
+        c = self.cursor
+        if c + 8 > self.length:
+            return False
+
+        prefix = self.mmap[c:c+8]
+        if prefix[0:4] != self.magic:
+            return False
+
+        return c + 8 + int.from_bytes(prefix[4:8], 'little') <= self.length
+
+    def find_next_block(self) -> bool:
+        """
+        Make sure .cursor is at a complete block, skipping padding.
+
+        If there's no magic at the cursor (eg. zero padding at the end of a
+        preallocated file), scans forward for the next magic with a single
+        mmap.find(). A block with a magic that runs past the end of the file
+        is a partially written block and ends reading.
+
+        Sets .lastComplete and .tailState ("end", "padding" or "truncated")
+        when there are no more complete blocks. Raises MagicMismatch if a
+        block from another network is found at the cursor.
+
+        Returns:
+            True if cursor is now at a complete block, otherwise False
+            (cursor is left where it was).
+        """
+        if self.next_block_complete():
+            return True
+
+        self.lastComplete = self.cursor
+        if self.cursor >= self.length:
+            self.tailState = "end"
+            return False
+
+        head = self.mmap[self.cursor:self.cursor+4]
+        if head == self.magic:
+            self.tailState = "truncated"
+            dat_log.info("Partial block at %s in %s", self.cursor, self.f)
+            return False
+        if head in MAGICS:
+            raise MagicMismatch(head, self.magic)
+
+        nxt = self.mmap.find(self.magic, self.cursor)
+        if nxt >= 0:
+            start = self.cursor
+            self.cursor = nxt
+            if self.next_block_complete():
+                dat_log.info("Skipped %s bytes at %s in %s",
+                             nxt - start, start, self.f)
+                return True
+            self.cursor = start
+
+        self.tailState = "padding"
+        dat_log.info("No more blocks after %s in %s", self.cursor, self.f)
+
+        return False
+
+    def skip_to_end(self) -> None:
+        """
+        Move cursor past all complete blocks without parsing them.
+
+        Steps through the magic + size prefixes only.
+        """
+        while self.next_block_complete():
+            size = int.from_bytes(self.mmap[self.cursor+4:self.cursor+8],
+                                  'little')
+            self.cursor += 8 + size
+            self.nBlock += 1
+
+    def seek(self, cursor: int,
+             nBlock: int=-1) -> None:
+        """
+        Move to a block boundary, eg. to resume from a Checkpoint.
+
+        Args:
+            cursor: Offset of the next block to read.
+            nBlock: Index of the block before cursor, so numbering
+                continues. Default -1 (none read).
+        """
+        self.cursor = cursor
+        self.nBlock = nBlock
+
+    def read_block_at(self, cursor: int,
+                      index: int) -> Block:
+        """
+        Read and return the block at cursor, eg. from a HeaderIndex.
+
+        Doesn't store the block in .blocks.
+
+        Args:
+            cursor: Offset of the block's magic.
+            index: Position of the block in the file.
+        """
+        self.seek(cursor, index - 1)
+
+        return self._read_block()
 
     def read_next_block(self,
                         n: int=1,
@@ -132,59 +312,150 @@ class Dat(Export):
             tqdm_runner = tqdm_off
 
         for _ in tqdm_runner(range(n)):
-            # Check progress to control printing
-            # If verb is >0 tqdm will already have been turned off in Chain
-            if Block._index+1 >= self.defer_printing:
-                # Allow printing
-                verb = self.verb
-            else:
-                # Keep off for now
-                verb = 0
+            if not self._next_framed():
+                break
+            b = self._read_block()
 
-            # Create Block object
-            b = Block(self.mmap, self.cursor,
-                      f=self.path+self.f,
-                      verb=verb,
-                      **self.block_kwargs)
+            # Save block dat object - unordered at this point
+            self.blocks[self.nBlock] = b
 
-            # Read it
-            b.read_block()
+    def _next_framed(self) -> bool:
+        """find_next_block(), timed as framing."""
+        t0 = time.perf_counter()
+        found = self.find_next_block()
+        self.stats.add("framing", time.perf_counter() - t0)
 
-            # Validate, if on
-            if self.validateBlocks:
-                b.api_verify()
+        return found
 
-            self.cursor = b.end
-            self.nBlock += 1
+    def _read_block(self) -> Block:
+        """
+        Read the block at .cursor and move cursor to its end.
 
-            # Save block dat object - unordered at this point
-            # self.blocks[self.nBlock] = b
-            self.blocks[b.index] = b
+        Doesn't store the block in .blocks.
+        """
+        # Turn logging on once deferred block count is reached
+        if self._deferred and self.nBlock + 1 >= self.defer_printing:
+            set_verbosity(self.verb)
+            self._deferred = False
+
+        # Create Block object
+        b = self.block_class(self.mmap, self.cursor,
+                             f=self.path+self.f,
+                             index=self.nBlock+1,
+                             datn=self.datn,
+                             network=self.network,
+                             **self.block_kwargs)
+
+        # Read it
+        parse, validation = b.read_block(stats=self.stats,
+                                         profiler=self.profiler)
+
+        # Validate, if on
+        if self.validateBlocks:
+            t0 = time.perf_counter()
+            b.api_verify()
+            t = time.perf_counter() - t0
+            self.stats.add("validation", t)
+            validation += t
+
+        if self.profiler is not None:
+            self.profiler.record(b, parse, validation)
+
+        self.stats.count_block(b)
+        self.stats.tick()
+
+        self.cursor = b.end
+        self.lastComplete = b.end
+        self.nBlock += 1
+
+        dat_log.info("Read block %s", self.nBlock)
+
+        return b
+
+    def iter_blocks(self,
+                    retain: bool=False) -> Iterator[Block]:
+        """
+        Yield blocks from .cursor to the end of the file.
 
-            if self.verb == 2:
-                print(f"{self.verb*' '*2}Read block {self.nBlock}")
+        Blocks aren't kept once the caller is finished with them, so memory
+        use is constant over the file.
+
+        Stops cleanly at zero padding or a partially written block, see
+        .find_next_block(). .lastComplete then holds the offset reading
+        stopped at.
+
+        Args:
+            retain: Also store each block in .blocks. Default False.
+        """
+        while self._next_framed():
+            b = self._read_block()
+            if retain:
+                self.blocks[self.nBlock] = b
+
+            yield b
+
+    def iter_transactions(self,
+                          retain: bool=False) -> Iterator[Trans]:
+        """
+        Yield transactions from .cursor to the end of the file.
+
+        Args:
+            retain: Also store each block in .blocks. Default False.
+        """
+        for b in self.iter_blocks(retain=retain):
+            yield from b.trans.values()
+
+    def iter_trans_spans(self) -> Iterator[tuple]:
+        """
+        Yield (block start, tx start, tx end) from .cursor to the end of
+        the file, walking the transaction framing without building
+        objects or validating.
+
+        Stops where .iter_blocks() would, and moves cursor and nBlock on
+        the same way.
+        """
+        mmap = self.mmap
+        while self._next_framed():
+            c = self.cursor
+            size = int.from_bytes(mmap[c+4:c+8], 'little')
+            # Magic, size and 80 byte header, then the tx count
+            n, pos = read_compact_size(mmap, c + 88)
+            for _ in range(n):
+                end = scan_trans(mmap, pos)[0]
+                yield c, pos, end
+                pos = end
+
+            self.cursor = c + 8 + size
+            self.nBlock += 1
 
     def read_all(self) -> None:
         """
         Read all blocks in .dat.
 
-        Reads one by one until end is found.
+        Reads one by one until end is found. Zero padding and a partially
+        written final block end reading without raising; .lastComplete and
+        .tailState say where and why.
         """
         nBlock = 0
-        pbar = tqdm(total=int(self.length),
-                    unit_divisor=1024)
-        while self.cursor < self.length:
-            # Read next block without waitbars
-            self.read_next_block(tqdm_on=False)
-            # And update this one manually
-            pbar.update(np.around(
-                (self.blocks[nBlock].end - self.blocks[nBlock].start),
-                4).astype(np.int))
+        # Waitbar by bytes, if on and tqdm is available
+        pbar = None
+        if self.verb and tqdm is not tqdm_off:
+            pbar = tqdm(total=int(self.length),
+                        unit='B',
+                        unit_scale=True,
+                        unit_divisor=1024)
+        for b in self.iter_blocks(retain=True):
+            if pbar is not None:
+                pbar.update(b.end - b.start)
 
             nBlock += 1
 
-        if self.verb >= 2:
-            print(f"\nRead {nBlock} blocks")
+        if pbar is not None:
+            pbar.close()
+
+        dat_log.info("Read %s blocks, stopped at %s (%s)",
+                     nBlock, self.lastComplete, self.tailState)
+        dat_log.info("%s", self.stats)
 
     def blocks_to_pandas(self) -> pd.DataFrame:
         """
@@ -246,6 +517,76 @@ class Dat(Export):
 
         return df
 
+    def trans_spans(self) -> list:
+        """Return (start, end) of every loaded transaction in .mmap."""
+        spans = []
+        for b in self.blocks.values():
+            spans.extend(b.trans_spans(partial=True))
+
+        return spans
+
+    def txids(self,
+              executor: HashExecutor=None) -> list:
+        """
+        Return hashes (internal byte order) of all loaded transactions.
+
+        Args:
+            executor: Optional pyx.executor.HashExecutor to hash in a
+                thread pool. Default None hashes here.
+        """
+        t0 = time.perf_counter()
+        spans = self.trans_spans()
+        if executor is None:
+            txids = [hash_SHA256_twice(self.mmap[s:e]) for s, e in spans]
+        else:
+            txids = executor.map(self.mmap, spans)
+        self.stats.add("hashing", time.perf_counter() - t0)
+
+        return txids
+
+    def outputs_to_pandas(self,
+                          threads: int=None) -> pd.DataFrame:
+        """
+        Output all loaded TxOuts to pandas df, one row per output.
+
+        Outputs are found by walking each transaction's raw bytes (see
+        pyx.filters.scan_trans) rather than through TxOut objects, and
+        script types and addresses are derived in a single bulk pass over
+        the mapped .dat (see pyx.scripts.bulk_script_to_addr). Address is
+        None for outputs without one.
+
+        Args:
+            threads: Number of threads to hash with. Default None (inline).
+        """
+        cols = {'block': [], 'trans': [], 'n': [],
+                'value': [], 'pkScriptLen': []}
+        spans = []
+        for bk, b in self.blocks.items():
+            for tk, (s, _) in zip(b.trans, b.trans_spans(partial=True)):
+                outputs = scan_trans(self.mmap, s)[1]
+                k = len(outputs)
+                cols['block'].extend([bk] * k)
+                cols['trans'].extend([tk] * k)
+                cols['n'].extend(range(k))
+                for v, start, end in outputs:
+                    # BTC, as TxOut.value
+                    cols['value'].append(v / 100000000)
+                    cols['pkScriptLen'].append(end - start)
+                    spans.append((start, end))
+
+        net = self.network
+        types, addrs = bulk_script_to_addr(self.mmap, spans,
+                                           p2pkh_version=net.p2pkh_version,
+                                           p2sh_version=net.p2sh_version,
+                                           hrp=net.hrp,
+                                           threads=threads)
+
+        df = pd.DataFrame(cols)
+        df['outputType'] = types
+        df['outputAddr'] = addrs
+
+        return df
+
     def to_pic(self,
                fn: str='test.pic') -> None:
 
@@ -282,12 +623,19 @@ class Dat(Export):
 class Chain():
     """Class to handle chain and loading from .dat files."""
 
+    # Class used for each .dat read
+    dat_class = Dat
+
     def __init__(self,
                  path: str='Blocks/',
                  datStart: int=0,
                  datn: int=10,
-                 verb: int=1,
+                 verb: int=None,
                  outputPath: str=None,
+                 checkpoint: Checkpoint=None,
+                 network="auto",
+                 stats: ParseStats=None,
+                 exportOutputs: bool=False,
                  **kwargs) -> None:
         """
         Initialise Chain object.
@@ -295,10 +643,22 @@ class Chain():
         Args:
             path: Path to folder containing .dats eg. "Blocks/"
             fn: File name of .dat eg. "blk0000.dat"
-            verb: Control verbosity of printing. Level 1 (default)
-                prints Chain level updates (ie. not detailed Dat, Block
-                or Trans info.)
-            **kwargs: Args to pass on to Dat, Block, and Trans
+            verb: Control verbosity of logging, eg. 1 logs Chain level
+                updates (ie. not detailed Dat, Block or Trans info.) See
+                common.set_verbosity. Default None leaves logging config
+                to the application.
+            checkpoint: Optional Checkpoint. If it has a saved position,
+                .iter_blocks() and .read_all() resume from there, and
+                record progress in it as they go.
+            network: Network name or pyx.networks.Network. Default "auto"
+                detects it from the first .dat read and uses it for the
+                rest.
+            stats: py3.stats.ParseStats shared by every Dat read, eg. with
+                periodic logging set up. Default None creates one.
+            exportOutputs: Also save a one row per output table
+                (Dat.outputs_to_pandas) in .read_all() when outputPath is
+                set. Default False.
+            **kwargs: Args to pass on to Dat (eg. profiler), Block, and Trans
                 classes when used.
         """
         self.datStart = datStart
@@ -310,6 +670,13 @@ class Chain():
         self.dats = {}
         self.on = datStart
         self.outputPath = outputPath
+        self.checkpoint = checkpoint
+        self.network = network
+        self.stats = stats if stats is not None else ParseStats()
+        self.exportOutputs = exportOutputs
+        self.headers = None
+        self.txIndex = None
+        self._txDats = {}
 
         self.dat_kwargs = kwargs
 
@@ -344,46 +711,384 @@ class Chain():
         """
         fn = "blk{0:05d}.dat".format(datn)
 
-        if self.verb >= 1:
-            print(fn)
+        chain_log.info(fn)
 
-        d = Dat(path=self.datPath,
-                f=fn,
-                verb=self.verb,
-                **self.dat_kwargs)
+        d = self.dat_class(path=self.datPath,
+                           f=fn,
+                           datn=datn,
+                           verb=self.verb,
+                           network=self.network,
+                           stats=self.stats,
+                           **self.dat_kwargs)
+
+        # Keep detected network for the remaining files
+        if self.network == "auto":
+            self.network = d.network
+            chain_log.info("Detected %s", d.network)
 
         self.datni += 1
 
         return d
 
+    def iter_blocks(self,
+                    retain: bool=False) -> Iterator[Block]:
+        """
+        Yield blocks from each .dat in range, in file order.
+
+        Nothing is kept unless retain is True, so memory use is constant
+        over the whole range. Each .dat is released once its last block has
+        been yielded.
+
+        If .checkpoint is set, starts from its saved position and records
+        each block once the caller has finished with it. If the scan is
+        interrupted, the last save stands - position and stage state are
+        always saved together, so stages can roll back to it on resume.
+
+        Args:
+            retain: Keep each Dat in .dats and its blocks in Dat.blocks.
+                Default False.
+        """
+        cp = self.checkpoint
+        start = self.datStart
+        resume = None
+        if cp is not None and cp.started:
+            start = max(cp.datn, self.datStart)
+            resume = (cp.datn, cp.cursor, cp.nBlock)
+            chain_log.info("Resuming from %s", cp)
+
+        for fi in range(start, self.datEnd):
+            d = self.readDat(datn=fi)
+            if resume is not None and fi == resume[0]:
+                d.seek(resume[1], resume[2])
+            if retain:
+                self.dats[fi] = d
+
+            for b in d.iter_blocks(retain=retain):
+                yield b
+
+                # Caller is done with this block
+                if cp is not None:
+                    cp.update(fi, d.cursor, d.nBlock)
+
+            if cp is not None:
+                cp.update(fi + 1, 0,
+                          block=False)
+
+        if cp is not None:
+            cp.save()
+
+    def iter_transactions(self,
+                          retain: bool=False) -> Iterator[Trans]:
+        """
+        Yield transactions from each .dat in range, in file order.
+
+        Args:
+            retain: Keep each Dat in .dats and its blocks in Dat.blocks.
+                Default False.
+        """
+        for b in self.iter_blocks(retain=retain):
+            yield from b.trans.values()
+
+    def header_index(self,
+                     rebuild: bool=False,
+                     block_index: str=None) -> HeaderIndex:
+        """
+        Build (once) and return a HeaderIndex over every .dat.
+
+        Heights need the chain back to genesis, so all files from 0 are
+        indexed whatever datStart and datn are; they only limit the blocks
+        .select_heights() picks.
+
+        Args:
+            rebuild: Scan the files again, eg. after new blocks are written.
+            block_index: Path to Bitcoin Core's blocks/index. If set, block
+                positions are read from it instead of scanning the files.
+        """
+        if self.headers is None or rebuild or block_index is not None:
+            self.headers = HeaderIndex(self.datPath,
+                                       dat_class=self.dat_class,
+                                       network=self.network,
+                                       stats=self.stats,
+                                       **self.dat_kwargs)
+            if block_index is None:
+                self.headers.scan()
+            else:
+                self.headers.load_block_index(block_index)
+            self.headers.build()
+
+        return self.headers
+
+    def iter_blocks_by_height(self,
+                              start: int=0,
+                              stop: int=None) -> Iterator[tuple]:
+        """
+        Yield (height, block) along the best chain, in height order.
+
+        Stale blocks are skipped. Uses .header_index(), so only headers are
+        read to work out the order. Heights aren't limited to the files in
+        range, so builders (eg. UTXOSet) see every block.
+
+        Args:
+            start: First height.
+            stop: Height to stop before. Default None (tip).
+        """
+        yield from self.header_index().iter_blocks(start, stop)
+
+    def select_heights(self, start: int=0,
+                       stop: int=None,
+                       start_time=None,
+                       end_time=None) -> list:
+        """
+        Best chain heights in [start, stop) with timestamps in
+        [start_time, end_time), of blocks stored in the files in range
+        (datStart to datStart + datn).
+
+        Resolved with the .header_index(), see HeaderIndex.heights_in_time.
+
+        Args:
+            start: First height.
+            stop: Height to stop before. Default None (tip).
+            start_time: Unix time, or anything pd.Timestamp takes (eg.
+                "2020-01-01", UTC). Default None (no limit).
+            end_time: As start_time.
+        """
+        hi = self.header_index()
+        stop = len(hi) if stop is None else min(stop, len(hi))
+        if start_time is None and end_time is None:
+            heights = range(start, stop)
+        else:
+            heights = [int(h) for h in hi.heights_in_time(start_time,
+                                                          end_time)
+                       if start <= h < stop]
+
+        return [h for h in heights
+                if self.datStart <= hi.position(h)[0] < self.datEnd]
+
+    def byte_ranges(self, start: int=0,
+                    stop: int=None,
+                    start_time=None,
+                    end_time=None) -> list:
+        """
+        Minimal (datn, start, end) byte ranges holding the selected blocks.
+
+        Adjacent blocks in a file are merged. See .select_heights() for
+        args.
+        """
+        return self.header_index().byte_ranges(
+            self.select_heights(start, stop, start_time, end_time))
+
+    def iter_blocks_by_time(self, start_time=None,
+                            end_time=None,
+                            order: str="height") -> Iterator[tuple]:
+        """
+        Yield (height, block) for best chain blocks with timestamps in
+        [start_time, end_time), eg. start_time=pd.Timestamp.now(tz="UTC")
+        - pd.Timedelta(days=30).
+
+        Only the selected blocks are read.
+
+        Args:
+            start_time: Unix time, or anything pd.Timestamp takes
+                (tz-naive is taken as UTC). Default None (no limit).
+            end_time: As start_time.
+            order: "height", or "file" for file and offset order.
+        """
+        yield from self.header_index().iter_heights(
+            self.select_heights(start_time=start_time, end_time=end_time),
+            order=order)
+
+    def block_at(self, height: int) -> Block:
+        """Read the best chain block at height, see .header_index()."""
+        return self.header_index().read_block(height)
+
+    def tx_index(self, path: str,
+                 rebuild: bool=False) -> TxIndex:
+        """
+        Open (once) and return a TxIndex, building it if needed.
+
+        Args:
+            path: Folder for the index.
+            rebuild: Index blocks added to the files since the last build.
+        """
+        if self.txIndex is None or self.txIndex.path != path:
+            self.txIndex = TxIndex(path)
+            if not self.txIndex.files:
+                rebuild = True
+        if rebuild:
+            self.txIndex.build(self)
+
+        return self.txIndex
+
+    def get_transaction(self, txid) -> Trans:
+        """
+        Read a single transaction using the .tx_index().
+
+        Only the transaction's bytes are parsed.
+
+        Args:
+            txid: Hex (display order) or bytes (internal order).
+
+        Returns:
+            Trans, or None if txid isn't in the index.
+        """
+        if self.txIndex is None:
+            raise ValueError("No txid index, call .tx_index() first")
+
+        pos = self.txIndex.lookup(txid)
+        if pos is None:
+            return None
+        datn, _, offset, length = pos
+
+        d = self._txDats.get(datn)
+        if d is None:
+            d = self.dat_class(path=self.datPath,
+                               f="blk{0:05d}.dat".format(datn),
+                               datn=datn,
+                               verb=None,
+                               network=self.network,
+                               stats=self.stats,
+                               **self.dat_kwargs)
+            self._txDats[datn] = d
+
+        t = d.block_class.trans_class(d.mmap, offset,
+                                      f=d.path + d.f,
+                                      network=d.network)
+        t.get_transaction()
+
+        return t
+
+    def latest_datn(self) -> int:
+        """Return number of the highest numbered .dat in .datPath."""
+        nums = [Dat.file_number(f)
+                for f in glob.glob(os.path.join(self.datPath, "blk*.dat"))]
+        nums = [n for n in nums if n is not None]
+
+        return max(nums) if nums else None
+
+    def follow(self,
+               datn: int=None,
+               from_end: bool=True,
+               poll: float=1.0,
+               stop: Callable[[], bool]=None) -> Iterator[Block]:
+        """
+        Yield new blocks as they are appended by a running node.
+
+        Watches the highest numbered .dat (by polling), remaps it when it
+        grows and parses only newly written, complete blocks. Zero padding
+        from preallocation is treated as "not written yet". Moves on to
+        the next file number once it appears and the current file has no
+        further complete blocks.
+
+        If .checkpoint is set and has a position, follows from there
+        instead, and records each block once the caller is finished with
+        it.
+
+        Args:
+            datn: File number to start from. Default None uses the latest.
+            from_end: Skip blocks already in the starting file. Default
+                True. Ignored when resuming from a checkpoint.
+            poll: Seconds to wait between checks for new data.
+            stop: Optional callable, checked while idle. Return True to
+                end following.
+        """
+        cp = self.checkpoint
+        if cp is not None and cp.started:
+            datn = cp.datn
+        elif datn is None:
+            datn = self.latest_datn()
+
+        d = self.readDat(datn=datn)
+        if cp is not None and cp.started:
+            d.seek(cp.cursor, cp.nBlock)
+        elif from_end:
+            d.skip_to_end()
+
+        while True:
+            if d.next_block_complete():
+                b = d._read_block()
+                yield b
+
+                if cp is not None:
+                    cp.update(d.datn, d.cursor, d.nBlock)
+                continue
+
+            # Nothing complete at cursor - check for more data
+            if d.remap():
+                continue
+
+            nextF = os.path.join(self.datPath,
+                                 "blk{0:05d}.dat".format(d.datn + 1))
+            if os.path.exists(nextF) and os.path.getsize(nextF) > 0:
+                # Node has moved on, current file is finished
+                d = self.readDat(datn=d.datn + 1)
+                if cp is not None:
+                    cp.update(d.datn, 0,
+                              block=False)
+                continue
+
+            if stop is not None and stop():
+                break
+
+            time.sleep(poll)
+
+        if cp is not None:
+            cp.save()
+
     def read_all(self) -> None:
         """
         Read all (or specified range of) blocks in .dat.
 
         Limited range specified by datStart -> datStart+datn
         when initializing Chain object.
+
+        If .checkpoint is set, reading starts from its saved position:
+        .dats already finished are skipped, and a .dat left part way
+        through (eg. by .iter_blocks()) is read from the saved block on,
+        so only the remaining blocks are read and exported. The checkpoint
+        is saved after each .dat's export.
         """
+        cp = self.checkpoint
+        start = self.datStart
+        resume = None
+        if cp is not None and cp.started:
+            start = max(cp.datn, self.datStart)
+            resume = (cp.datn, cp.cursor, cp.nBlock)
+            chain_log.info("Resuming from %s", cp)
+
         # Read requested range
-        for fi in range(self.datStart,
-                        self.datStart+self.datn):
+        for fi in range(start, self.datEnd):
             d = self.readDat(datn=fi)
+            if resume is not None and fi == resume[0]:
+                d.seek(resume[1], resume[2])
             d.read_all()
 
             if self.outputPath is not None:
+                t0 = time.perf_counter()
                 # Save dat and transactions to csv
-                print(f"Saving blocks to {self.outputPath}")
+                chain_log.info("Saving blocks to %s", self.outputPath)
                 d.blocks_to_pandas().to_csv(
                         self.outputPath + d.f + "_blocks.csv",
                         index=False)
-                print(f"Saving trans to {self.outputPath}")
+                chain_log.info("Saving trans to %s", self.outputPath)
                 d.trans_to_pandas().to_csv(
                         self.outputPath + d.f + "_trans.csv",
                         index=False)
+                if self.exportOutputs:
+                    chain_log.info("Saving outputs to %s", self.outputPath)
+                    d.outputs_to_pandas().to_csv(
+                            self.outputPath + d.f + "_outputs.csv",
+                            index=False)
+                self.stats.add("export", time.perf_counter() - t0)
 
             # For now:
             # Save dat contents to Chain (dats ordered, blocks not)
-            print(d)
-            self.dats[d.index] = d
+            chain_log.info("%s", d)
+            self.dats[d.datn] = d
+
+            if cp is not None:
+                cp.update(fi + 1, 0,
+                          block=False,
+                          force=True)
 
 
 if __name__ == "__main__":
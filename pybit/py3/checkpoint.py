@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpointing for long chain scans.
+
+A Checkpoint records how far a scan has got (file number, byte offset and
+block count in that file) plus any per-stage state, in a small JSON file.
+Chain resumes from it rather than starting again from datStart.
+"""
+
+# %% Imports
+
+import json
+import os
+import time
+from typing import Callable
+
+from pybit.py3.common import chain_log
+
+
+# %% Checkpoint class
+
+class Checkpoint():
+    """
+    Scan position and per-stage state, saved to a local JSON file.
+
+    Stages (eg. an exporter) register a callable with .register(). It's
+    called before every save and should flush any buffered output and
+    return a JSON serialisable dict describing it (eg. rows written, file
+    offset). On resume the last saved dict is in .state[name], so output
+    written after the checkpoint can be discarded and rows aren't emitted
+    twice.
+
+    The position is only advanced once the consumer has finished with a
+    block, so a resumed scan starts at the first block not yet processed.
+    """
+
+    def __init__(self, fn: str,
+                 every: int=1000,
+                 every_s: float=None) -> None:
+        """
+        Args:
+            fn: Path to state file. Loaded if it exists.
+            every: Save after this many blocks. None to not save on count.
+            every_s: Save if this many seconds have passed since the last
+                save. Default None.
+        """
+        self.fn = fn
+        self.every = every
+        self.every_s = every_s
+
+        # Position: next block to read is at .cursor in file .datn
+        self.datn = None
+        self.cursor = 0
+        self.nBlock = -1
+        self.blocks = 0
+        self.state = {}
+
+        self._stages = {}
+        self._since = 0
+        self._lastSave = time.time()
+
+        self.load()
+
+    def __repr__(self) -> str:
+        return f"Checkpoint: {self.fn} @ file {self.datn}, {self.cursor}"
+
+    @property
+    def started(self) -> bool:
+        """True if a position has been recorded."""
+        return self.datn is not None
+
+    def register(self, name: str,
+                 fn: Callable[[], dict]) -> None:
+        """
+        Add a stage whose state is saved with the position.
+
+        Args:
+            name: Key in .state.
+            fn: Called before saving, returns stage state as dict.
+        """
+        self._stages[name] = fn
+
+    def load(self) -> bool:
+        """Load state file, if it exists. Returns True if loaded."""
+        if not os.path.exists(self.fn):
+            return False
+
+        with open(self.fn, 'r') as f:
+            cp = json.load(f)
+
+        self.datn = cp['datn']
+        self.cursor = cp['cursor']
+        self.nBlock = cp['nBlock']
+        self.blocks = cp['blocks']
+        self.state = cp['state']
+
+        chain_log.info("Loaded %s", self)
+
+        return True
+
+    def save(self) -> None:
+        """
+        Collect stage states and write the file.
+
+        Writes to a temporary file and renames, so an interruption never
+        leaves a partial state file.
+        """
+        for name, fn in self._stages.items():
+            self.state[name] = fn()
+
+        cp = {'datn': self.datn,
+              'cursor': self.cursor,
+              'nBlock': self.nBlock,
+              'blocks': self.blocks,
+              'state': self.state,
+              'time': time.time()}
+
+        tmp = self.fn + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(cp, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.fn)
+
+        self._since = 0
+        self._lastSave = time.time()
+
+    def update(self, datn: int, cursor: int,
+               nBlock: int=-1,
+               block: bool=True,
+               force: bool=False) -> None:
+        """
+        Record position of the next block to read, save if due.
+
+        Args:
+            datn: File number.
+            cursor: Offset in file.
+            nBlock: Index of the last block read in this file.
+            block: True if called after a block was processed, False when
+                just moving position (eg. on to the next file).
+            force: Save now regardless of interval.
+        """
+        if block:
+            self._since += 1
+            self.blocks += 1
+
+        self.datn = datn
+        self.cursor = cursor
+        self.nBlock = nBlock
+
+        due = force \
+            or (self.every is not None and self._since >= self.every) \
+            or (self.every_s is not None
+                and (time.time() - self._lastSave) >= self.every_s)
+        if due:
+            self.save()
+
+    def clear(self) -> None:
+        """Forget position and state and delete the file."""
+        self.datn = None
+        self.cursor = 0
+        self.nBlock = -1
+        self.blocks = 0
+        self.state = {}
+        if os.path.exists(self.fn):
+            os.remove(self.fn)
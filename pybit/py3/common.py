@@ -5,6 +5,7 @@
 import time
 import requests
 import codecs
+import logging
 import mmap
 
 from typing import Tuple
@@ -14,6 +15,59 @@ import pandas as pd
 from pybit.pyx.utils import hash_SHA256_twice
 
 
+# %% Logging
+
+# One logger per level of the hierarchy. Old integer verbosity levels map on
+# to these (see set_verbosity). Objects check .isEnabledFor() before building
+# any output, so when logging is off no strings are built and nothing is
+# hashed. As a library, pybit only adds a NullHandler; output is configured
+# by the application, or by passing verb explicitly.
+pybit_log = logging.getLogger("pybit")
+pybit_log.addHandler(logging.NullHandler())
+
+chain_log = logging.getLogger("pybit.chain")
+dat_log = logging.getLogger("pybit.dat")
+block_log = logging.getLogger("pybit.block")
+trans_log = logging.getLogger("pybit.trans")
+txio_log = logging.getLogger("pybit.txio")
+api_log = logging.getLogger("pybit.api")
+
+VERB_LOGGERS = {1: chain_log,
+                2: dat_log,
+                3: block_log,
+                4: trans_log,
+                5: txio_log,
+                6: api_log}
+
+
+def set_verbosity(verb: int) -> None:
+    """
+    Set pybit logger levels from integer verbosity.
+
+      - 0 = logging off
+      - 1 = Chain level info
+      - 2 = .dat level info
+      - 3 = Block level info
+      - 4 = Transaction level info
+      - 5 = TxIn and TxOut level info
+      - 6 = Above and API validation checks
+
+    Only called when verb is passed explicitly (eg. to Dat or Chain). If
+    verb > 0 and the application hasn't configured any logging handlers,
+    adds a plain stream handler to the "pybit" logger so output is seen.
+    """
+    for level, log in VERB_LOGGERS.items():
+        log.setLevel(logging.INFO if verb >= level else logging.WARNING)
+
+    configured = logging.getLogger().handlers \
+        or any(not isinstance(h, logging.NullHandler)
+               for h in pybit_log.handlers)
+    if verb > 0 and not configured:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        pybit_log.addHandler(handler)
+
+
 # %% Error classes
 
 
@@ -25,6 +79,24 @@ class BlockSizeMismatch(Exception):
         return repr(self.value)
 
 
+class MagicMismatch(Exception):
+    def __init__(self, magic: bytes, expected: bytes):
+        self.value = f"Block magic {magic.hex()} doesn't match network " \
+            f"({expected.hex()})"
+
+    def __str__(self):
+        return repr(self.value)
+
+
+class FilteredBlock(Exception):
+    def __init__(self, start: int, skipped: int):
+        self.value = f"Block at {start} skipped {skipped} transactions " \
+            "(predicate), all are needed"
+
+    def __str__(self):
+        return repr(self.value)
+
+
 # %% Common classes
 
 
@@ -119,7 +191,11 @@ class Common():
 
     def map_var(self,
                 pr: int=False) -> Tuple[int, bytes]:
-        """Find the indexes of the next (variable) data locations."""
+        """
+        Find the indexes of the next (variable) data locations.
+
+        As read_var, the range excludes the 0xfd-0xff prefix byte.
+        """
         # Get the next byte
         index = self.cursor
         by = self.read_next(1)
@@ -138,15 +214,15 @@ class Common():
             # Reverse endedness
             # Convert to int in base 16
             out = self.map_next(2)
-            index = (index, index + 1 + 2)
+            index = (index + 1, index + 1 + 2)
         elif o == 254:  # 0xfe
             # Read next 4 bytes, convert as above
             out = self.map_next(4)
-            index = (index, index + 1 + 4)
+            index = (index + 1, index + 1 + 4)
         elif o == 255:  # 0xff
             # Read next 8 bytes, convert as above
             out = self.map_next(8)
-            index = (index, index + 1 + 8)
+            index = (index + 1, index + 1 + 8)
 
         if pr:
             print(out)
@@ -199,7 +275,7 @@ class Common():
 
 class API():
     """
-    Class for common API functions, handles last query time, verbosity etc.
+    Class for common API functions, handles last query time etc.
     """
 
     # Keep track of last query time across objects
@@ -209,10 +285,6 @@ class API():
     def lastQueryTime(self):
         return dt.fromtimestamp(round(self._lastQueryTime))
 
-    def __init__(self,
-                 verb=3):
-        self.verb = verb
-
     def api_wait(self,
                  wait: bool=False,
                  ttw: int=11):
@@ -226,21 +298,13 @@ class API():
         if dTime <= ttw:
             if wait:
                 sleep_time = ttw - dTime
-                if self.verb > 3:
-                    print("{0}Sleeping for {1}".format(" "*self.verb,
-                                                       sleep_time))
+                api_log.info("Sleeping for %s", sleep_time)
                 time.sleep(sleep_time)
                 return True
 
             else:
                 # Skip
                 self.api_validated = 'Skipped'
-                if self.verb > 3:
-                    """
-                    print("{0}Validation skipped \n{0}{1}".format(
-                                            " "*self.verb,
-                                            "_"*30))
-                    """
                 return False
         else:
             # No need to wait
@@ -295,11 +359,7 @@ class API():
         result = True
         for k, v in validationFields.items():
             test = k == v
-            if self.verb > 5:
-                print("{0}{1} | {2}: {3}".format(" "*self.verb,
-                                                 v,
-                                                 k,
-                                                 test))
+            api_log.info("%s | %s: %s", v, k, test)
             # Keep track of overall result
             result &= test
 
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+BIP158 compact block filters.
+
+A basic filter holds every output script in a block (except empty and
+OP_RETURN scripts) and the script of every output the block spends, in a
+Golomb-coded set (see pyx.gcs). Testing a watch-list of scripts against
+each block's filter (a few KB) gives the candidate blocks that may involve
+them, so only those need reading in full. False positives are about 1 in
+784931 per script per block; there are no false negatives.
+
+Spent scripts come from a py3.utxo.UTXOSet, so filters are built in height
+order. Filters and their header chain are stored in SQLite, like the UTXO
+set, and can be kept next to it.
+"""
+
+# %% Imports
+
+import sqlite3
+import time
+from typing import Iterator
+
+from pybit.py3.common import chain_log
+from pybit.py3.utxo import UTXOSet
+from pybit.pyx.gcs import (BASIC_M, build_filter, decode_filter,
+                           filter_header, filter_key, filter_size,
+                           hash_to_range)
+from pybit.pyx.networks import MAINNET
+from pybit.pyx.scripts import address_to_script
+from pybit.pyx.utils import hash_SHA256_twice
+
+
+# %% Elements
+
+def filter_elements(block,
+                    spent: list=None) -> set:
+    """
+    Basic filter elements of a block.
+
+    Args:
+        block: Block (read, with transactions).
+        spent: Spent coins per transaction, from UTXOSet.apply_block or
+            py3.rev. Default None gives output scripts only, which isn't
+            a BIP158 filter but still finds payments to watched scripts.
+    """
+    block.check_complete()
+    elements = set()
+    for t in block.trans.values():
+        for o in t.txOut:
+            script = o._pkScript
+            if script and script[0] != 0x6a:
+                elements.add(bytes(script))
+
+    for coins in spent or []:
+        for c in coins:
+            if c is not None and c[1]:
+                elements.add(bytes(c[1]))
+
+    return elements
+
+
+def block_filter(block,
+                 spent: list=None) -> bytes:
+    """Serialised basic filter of a block (see filter_elements)."""
+    return build_filter(filter_elements(block, spent),
+                        hash_SHA256_twice(block.prep_header()))
+
+
+def watch_scripts(items,
+                  network=MAINNET) -> list:
+    """
+    Output scripts of a watch-list.
+
+    Args:
+        items: Iterable of raw scripts (bytes) and addresses (str).
+        network: Network of the addresses.
+    """
+    return [address_to_script(i, network) if isinstance(i, str) else bytes(i)
+            for i in items]
+
+
+# %% Index
+
+class FilterIndex():
+    """
+    Basic block filters and filter headers in SQLite.
+
+    Usage:
+        fi = FilterIndex("filters.sqlite")
+        fi.build(Chain("Blocks/", datn=100))
+        for h in fi.match(["1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa"]):
+            ...
+    """
+
+    def __init__(self, fn: str=":memory:",
+                 flush_every: int=1000,
+                 network=MAINNET) -> None:
+        """
+        Args:
+            fn: SQLite database file. Default in memory.
+            flush_every: Write to the database every this many blocks.
+            network: Network used to decode watch-list addresses.
+        """
+        self.fn = fn
+        self.flush_every = flush_every
+        self.network = network
+
+        self.db = sqlite3.connect(fn)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS filters "
+                        "(height INTEGER PRIMARY KEY, hash BLOB, "
+                        "filter BLOB, header BLOB)")
+        self.db.commit()
+
+        self._new = []
+        row = self.db.execute("SELECT height, header FROM filters "
+                              "ORDER BY height DESC LIMIT 1").fetchone()
+        self.height, self.header = (-1, b"\x00" * 32) if row is None else row
+
+    def __repr__(self) -> str:
+        return f"FilterIndex: {self.fn} @ height {self.height}"
+
+    def __len__(self) -> int:
+        self.flush()
+        return self.db.execute("SELECT COUNT(*) FROM filters").fetchone()[0]
+
+    def close(self) -> None:
+        """Flush and close database."""
+        self.flush()
+        self.db.close()
+
+    # Building
+
+    def add(self, block_hash: bytes,
+            height: int,
+            filt: bytes,
+            flush: bool=True) -> None:
+        """
+        Add the next block's filter, extending the header chain.
+
+        Args:
+            block_hash: Block hash (internal byte order).
+            height: Height of block, must follow the last one added.
+            filt: Serialised filter, eg. from block_filter.
+            flush: Flush every flush_every filters. Default True.
+        """
+        if height != self.height + 1:
+            raise ValueError(f"Expected height {self.height + 1}, "
+                             f"got {height}")
+
+        self.header = filter_header(filt, self.header)
+        self.height = height
+        self._new.append((height, block_hash, filt, self.header))
+        if flush and len(self._new) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write new filters to the database in one transaction."""
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO filters "
+                                "VALUES (?, ?, ?, ?)", self._new)
+        self._new = []
+
+    def build(self, chain,
+              utxo: UTXOSet=None,
+              height: int=None,
+              log_every: float=30) -> None:
+        """
+        Build filters in height order, up to and including height.
+
+        Resumes from the height already in the database. utxo provides
+        spent scripts and is advanced alongside, only flushed after the
+        filters at the same height, so a set left behind by an
+        interruption in between is caught up on resume.
+
+        Args:
+            chain: py3.chain.Chain over the .dat files.
+            utxo: UTXOSet at (or below) the filter height. Default None
+                uses a new in memory set.
+            height: Last height to add. Default None (chain tip).
+            log_every: Log progress at most this often (seconds).
+        """
+        if utxo is None:
+            utxo = UTXOSet()
+        if utxo.height > self.height:
+            raise ValueError(f"UTXO set is at height {utxo.height}, "
+                             f"ahead of filters at {self.height}")
+        if utxo.height < self.height:
+            utxo.build(chain, height=self.height)
+
+        stop = None if height is None else height + 1
+        last = time.perf_counter()
+        for h, b in chain.iter_blocks_by_height(self.height + 1, stop):
+            spent = utxo.apply_block(b, h, flush=False)
+            block_hash = hash_SHA256_twice(b.prep_header())
+            self.add(block_hash, h, build_filter(filter_elements(b, spent),
+                                                 block_hash),
+                     flush=False)
+            if len(self._new) >= self.flush_every:
+                self.flush()
+                utxo.flush()
+            if time.perf_counter() - last > log_every:
+                last = time.perf_counter()
+                chain_log.info("Filters at height %s", h)
+
+        self.flush()
+        utxo.flush()
+
+    # Lookups
+
+    def get(self, height: int) -> tuple:
+        """(block hash, filter, filter header) at height, or None."""
+        self.flush()
+        return self.db.execute("SELECT hash, filter, header FROM filters "
+                               "WHERE height = ?", (height,)).fetchone()
+
+    def match(self, items,
+              start: int=0,
+              stop: int=None) -> Iterator[int]:
+        """
+        Yield heights of blocks whose filter matches any watched item.
+
+        Args:
+            items: Raw scripts (bytes) and/or addresses (str).
+            start: First height.
+            stop: Height to stop before. Default None (last filter).
+        """
+        scripts = set(watch_scripts(items, self.network))
+        if not scripts:
+            return
+
+        self.flush()
+        stop = self.height + 1 if stop is None else stop
+        rows = self.db.execute("SELECT height, hash, filter FROM filters "
+                               "WHERE height >= ? AND height < ? "
+                               "ORDER BY height", (start, stop))
+        for height, block_hash, filt in rows:
+            n = filter_size(filt)
+            if n == 0:
+                continue
+            query = set(hash_to_range(scripts, filter_key(block_hash),
+                                      n * BASIC_M))
+            if not query.isdisjoint(decode_filter(filt)):
+                yield height
+
+    def iter_matching_blocks(self, chain,
+                             items,
+                             start: int=0,
+                             stop: int=None) -> Iterator[tuple]:
+        """Yield (height, Block) for each candidate block (see match)."""
+        for h in self.match(items, start, stop):
+            yield h, chain.block_at(h)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Transaction fees from input values resolved against a UTXO set.
+
+Input values aren't in the spending transaction, so each input's prevout
+has to be looked up. Blocks are applied to a py3.utxo.UTXOSet in height
+order, which resolves all of a block's inputs in one batched lookup and
+returns the spent coins; their values are attached to each Trans
+(.inputValues), giving .inputValue, .fee and .feerate.
+"""
+
+# %% Imports
+
+from typing import Iterator
+
+import pandas as pd
+
+from pybit.py3.utxo import UTXOSet
+from pybit.pyx.utils import hash_SHA256_twice
+
+
+# %% Functions
+
+def resolve_inputs(block, spent: list) -> None:
+    """
+    Attach spent values to each non-coinbase transaction in block.
+
+    Args:
+        block: Block read with transactions.
+        spent: Spent coins per transaction, as returned by
+            UTXOSet.apply_block. None entries (unknown prevouts) stay None.
+    """
+    for t, coins in zip(block.trans.values(), spent):
+        if t.index == 0:
+            continue
+        t.inputValues = [None if c is None else c[0] for c in coins]
+
+
+def iter_fees(chain,
+              utxo: UTXOSet=None,
+              start: int=0,
+              stop: int=None) -> Iterator[tuple]:
+    """
+    Yield (height, block, txids) with input values resolved.
+
+    Blocks from the UTXO set's height + 1 are applied in height order.
+    Blocks below start are applied (to build the set) but not yielded.
+
+    Args:
+        chain: py3.chain.Chain over the .dat files.
+        utxo: UTXOSet to resolve against and update. Default None uses a
+            new in memory set, starting from genesis.
+        start: First height to yield.
+        stop: Height to stop before. Default None (tip).
+    """
+    if utxo is None:
+        utxo = UTXOSet()
+
+    for h, b in chain.iter_blocks_by_height(utxo.height + 1, stop):
+        txids = [hash_SHA256_twice(b.mmap[s:e]) for s, e in b.trans_spans()]
+        spent = utxo.apply_block(b, h, txids=txids)
+        if h < start:
+            continue
+
+        resolve_inputs(b, spent)
+        yield h, b, txids
+
+
+def block_fees_to_pandas(blocks: Iterator[tuple]) -> pd.DataFrame:
+    """
+    Fee table, one row per non-coinbase transaction.
+
+    Columns: height, block (hash), txid (hex, display order), size, vsize,
+    nInputs, inputValue, outputValue, fee (satoshis) and feerate (sat/vB).
+    Values are NaN where an input couldn't be resolved.
+
+    Args:
+        blocks: (height, block, txids) with input values resolved, eg.
+            from iter_fees.
+    """
+    cols = {'height': [], 'block': [], 'txid': [], 'size': [], 'vsize': [],
+            'nInputs': [], 'inputValue': [], 'outputValue': [],
+            'fee': [], 'feerate': []}
+    for h, b, txids in blocks:
+        block = b.hash
+        for t, txid in zip(b.trans.values(), txids):
+            if t.index == 0:
+                continue
+            cols['height'].append(h)
+            cols['block'].append(block)
+            cols['txid'].append(txid[::-1].hex())
+            cols['size'].append(t.size)
+            cols['vsize'].append(t.vsize)
+            cols['nInputs'].append(len(t.txIn))
+            cols['inputValue'].append(t.inputValue)
+            cols['outputValue'].append(t.outputValue)
+            cols['fee'].append(t.fee)
+            cols['feerate'].append(t.feerate)
+
+    return pd.DataFrame(cols)
+
+
+def fees_to_pandas(chain,
+                   utxo: UTXOSet=None,
+                   start: int=0,
+                   stop: int=None) -> pd.DataFrame:
+    """
+    Fee table for heights start to stop, see block_fees_to_pandas.
+
+    See iter_fees for args.
+    """
+    return block_fees_to_pandas(iter_fees(chain, utxo, start, stop))
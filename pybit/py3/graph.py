@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Transaction spend graph export.
+
+Each input becomes an edge from the funding transaction (and output index)
+to the spending transaction, with the value and both heights. Transactions
+are numbered in height order (0 is the genesis coinbase), so edges hold
+integer ids rather than 32 byte hashes.
+
+Blocks are applied to a py3.utxo.UTXOSet, which gives each spent output's
+value and height. Funding txids are mapped to ids through a SQLite table
+with an in-memory cache of recent transactions (most outputs are spent
+soon after they're created), so memory stays bounded. Edges and the id ->
+txid table are written in fixed size compressed chunks as they fill.
+"""
+
+# %% Imports
+
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from pybit.py3.common import chain_log
+from pybit.py3.utxo import UTXOSet
+from pybit.pyx.utils import hash_SHA256_twice
+
+
+# %% Columns
+
+EDGE_COLUMNS = {'src': '<i8',
+                'vout': '<u4',
+                'dst': '<i8',
+                'vin': '<u4',
+                'value': '<u8',
+                'srcHeight': '<u4',
+                'dstHeight': '<u4'}
+
+NODE_COLUMNS = {'id': '<i8',
+                'txid': 'S32',
+                'height': '<u4'}
+
+
+# %% Exporter
+
+class GraphExporter():
+    """
+    Write the spend graph as chunked edge and node files.
+
+    Output in out_dir:
+        edges_00000.npz (or .parquet), ...: columns of EDGE_COLUMNS.
+        nodes_00000.npz (or .parquet), ...: id, txid (internal byte order,
+            fixed width so trailing null bytes are dropped on reading, see
+            pyx.records.pad) and height of each transaction.
+
+    Usage:
+        g = GraphExporter("graph/")
+        g.export(Chain("Blocks/", datn=10))
+        edges = load_edges("graph/")
+    """
+
+    def __init__(self, out_dir: str,
+                 chunk_size: int=2 ** 22,
+                 fmt: str="npz",
+                 cache_size: int=2 ** 20,
+                 batch_size: int=500) -> None:
+        """
+        Args:
+            out_dir: Output folder. Created if needed.
+            chunk_size: Rows per output file.
+            fmt: "npz" (numpy, compressed) or "parquet" (needs pyarrow or
+                fastparquet).
+            cache_size: Recent txids to keep in memory.
+            batch_size: Keys per SQLite lookup query.
+        """
+        if fmt not in ("npz", "parquet"):
+            raise ValueError(f"Unknown format {fmt}")
+
+        self.out_dir = out_dir
+        self.chunk_size = chunk_size
+        self.fmt = fmt
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        os.makedirs(out_dir, exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(out_dir, "txids.sqlite"))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("DROP TABLE IF EXISTS txids")
+        self.db.execute("CREATE TABLE txids "
+                        "(k BLOB PRIMARY KEY, id INTEGER) WITHOUT ROWID")
+
+        self._cache = {}
+        self._new = []
+        self.nTx = 0
+        self.nEdges = 0
+        self.missing = 0
+        self._edges = {k: [] for k in EDGE_COLUMNS}
+        self._nodes = {k: [] for k in NODE_COLUMNS}
+        self._files = {'edges': 0, 'nodes': 0}
+
+    def __repr__(self) -> str:
+        return f"GraphExporter: {self.out_dir}, {self.nTx} transactions, " \
+            f"{self.nEdges} edges"
+
+    # txid -> id
+
+    def _ids(self, txids: list) -> dict:
+        """Ids of funding txids, from the cache or one batched query."""
+        found = {}
+        need = []
+        for t in set(txids):
+            i = self._cache.get(t)
+            if i is None:
+                need.append(t)
+            else:
+                found[t] = i
+
+        for i in range(0, len(need), self.batch_size):
+            batch = need[i:i+self.batch_size]
+            q = "SELECT k, id FROM txids WHERE k IN (" \
+                + ",".join("?" * len(batch)) + ")"
+            found.update(self.db.execute(q, batch))
+
+        return found
+
+    def _flush_ids(self) -> None:
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO txids VALUES (?, ?)",
+                                self._new)
+        self._new = []
+        if len(self._cache) > self.cache_size:
+            self._cache = {}
+
+    # Output
+
+    def _write(self, kind: str, cols: dict, dtypes: dict) -> None:
+        """Write one chunk of columns."""
+        fn = os.path.join(self.out_dir,
+                          "{0}_{1:05d}.{2}".format(kind, self._files[kind],
+                                                   self.fmt))
+        arrs = {k: np.array(v, dtype=dtypes[k]) for k, v in cols.items()}
+        if self.fmt == "npz":
+            np.savez_compressed(fn, **arrs)
+        else:
+            pd.DataFrame(arrs).to_parquet(fn)
+        self._files[kind] += 1
+
+    def _flush(self, final: bool=False) -> None:
+        """Write full (or, if final, any remaining) chunks."""
+        for kind, cols, dtypes in (('edges', self._edges, EDGE_COLUMNS),
+                                   ('nodes', self._nodes, NODE_COLUMNS)):
+            n = len(cols['dst' if kind == 'edges' else 'id'])
+            while n >= self.chunk_size or (final and n):
+                self._write(kind, {k: v[:self.chunk_size]
+                                   for k, v in cols.items()}, dtypes)
+                for v in cols.values():
+                    del v[:self.chunk_size]
+                n = len(cols['dst' if kind == 'edges' else 'id'])
+
+    # Building
+
+    def add_block(self, block,
+                  height: int,
+                  txids: list,
+                  spent: list) -> None:
+        """
+        Number a block's transactions and add edges for its inputs.
+
+        Args:
+            block: Block (read, with transactions).
+            height: Height of block.
+            txids: Transaction hashes (internal byte order).
+            spent: Spent coins per transaction, from UTXOSet.apply_block.
+        """
+        block.check_complete()
+        trans = list(block.trans.values())
+        ids = self._ids([i._prevOutput for t in trans[1:] for i in t.txIn])
+
+        e = self._edges
+        for ti, (t, txid) in enumerate(zip(trans, txids)):
+            dst = self.nTx
+            self.nTx += 1
+            self._nodes['id'].append(dst)
+            self._nodes['txid'].append(txid)
+            self._nodes['height'].append(height)
+
+            if ti > 0:
+                for vin, (i, coin) in enumerate(zip(t.txIn, spent[ti])):
+                    src = ids.get(i._prevOutput)
+                    if src is None:
+                        # Funded earlier in this block
+                        src = self._cache.get(i._prevOutput)
+                    if src is None or coin is None:
+                        self.missing += 1
+                        continue
+                    e['src'].append(src)
+                    e['vout'].append(int.from_bytes(i._prevIndex, 'little'))
+                    e['dst'].append(dst)
+                    e['vin'].append(vin)
+                    e['value'].append(coin[0])
+                    e['srcHeight'].append(coin[2])
+                    e['dstHeight'].append(height)
+                    self.nEdges += 1
+
+            self._cache[txid] = dst
+            self._new.append((txid, dst))
+
+    def export(self, chain,
+               utxo: UTXOSet=None,
+               stop: int=None,
+               flush_every: int=1000) -> None:
+        """
+        Export the graph from genesis, in height order.
+
+        Args:
+            chain: py3.chain.Chain over the .dat files.
+            utxo: Empty UTXOSet to use, eg. on disk for a large range.
+                Default None uses a new in memory set.
+            stop: Height to stop before. Default None (chain tip).
+            flush_every: Write txid ids to SQLite every this many blocks.
+        """
+        if utxo is None:
+            utxo = UTXOSet()
+        if utxo.height != -1:
+            raise ValueError("Export needs an empty UTXO set, "
+                             f"this one is at height {utxo.height}")
+
+        for h, b in chain.iter_blocks_by_height(0, stop):
+            txids = [hash_SHA256_twice(b.mmap[s:e])
+                     for s, e in b.trans_spans()]
+            spent = utxo.apply_block(b, h, txids=txids)
+            self.add_block(b, h, txids, spent)
+            self._flush()
+            if h % flush_every == 0:
+                self._flush_ids()
+                chain_log.info("Graph at height %s, %s edges",
+                               h, self.nEdges)
+
+        self._flush_ids()
+        self._flush(final=True)
+        utxo.flush()
+
+
+# %% Loading
+
+def load_edges(out_dir: str) -> pd.DataFrame:
+    """Concatenate all edge chunks in out_dir into one DataFrame."""
+    return _load(out_dir, "edges")
+
+
+def load_nodes(out_dir: str) -> pd.DataFrame:
+    """Concatenate all node chunks in out_dir into one DataFrame."""
+    return _load(out_dir, "nodes")
+
+
+def _load(out_dir: str, kind: str) -> pd.DataFrame:
+    fns = sorted(f for f in os.listdir(out_dir) if f.startswith(kind + "_"))
+    dfs = []
+    for f in fns:
+        fn = os.path.join(out_dir, f)
+        if f.endswith(".npz"):
+            with np.load(fn) as z:
+                dfs.append(pd.DataFrame({k: z[k] for k in z.files}))
+        else:
+            dfs.append(pd.read_parquet(fn))
+
+    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
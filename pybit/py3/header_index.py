@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Index of block headers across .dat files, for reading in height order.
+
+Nodes write blocks to blk files in the order they arrive, not by height,
+and files can contain stale blocks. HeaderIndex reads just the 80 byte
+header of every block (using each Dat's framing, so no transactions are
+parsed), links them by previous hash, and picks the chain with the most
+work. Blocks can then be read by height.
+"""
+
+# %% Imports
+
+import glob
+import os
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from pybit.py3.block_index import (BLOCK_FAILED_MASK, BLOCK_HAVE_DATA,
+                                   read_block_index)
+from pybit.py3.common import chain_log
+from pybit.pyx.utils import hash_SHA256_twice
+
+
+# %% Helpers
+
+def to_timestamp(t) -> int:
+    """
+    Unix time from a number, or anything pd.Timestamp takes. Tz-naive
+    times are taken as UTC, not local time.
+    """
+    if t is None or isinstance(t, (int, float, np.integer)):
+        return t
+
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+
+    return int(ts.timestamp())
+
+
+def bits_to_work(bits: int) -> int:
+    """Expected number of hashes for a block with compact target bits."""
+    exponent = bits >> 24
+    mantissa = bits & 0x007fffff
+    if exponent <= 3:
+        target = mantissa >> (8 * (3 - exponent))
+    else:
+        target = mantissa << (8 * (exponent - 3))
+
+    return 2 ** 256 // (target + 1)
+
+
+# %% Index class
+
+class HeaderIndex():
+    """
+    Headers of every block in a range of .dat files, linked into a chain.
+
+    After .build(), .hashes[h] is the hash (internal byte order) of the
+    block at height h on the best chain and .entries[hash] is
+    (datn, offset, ordinal in file, prev hash, nBits, timestamp).
+    """
+
+    def __init__(self, path: str,
+                 datStart: int=0,
+                 datn: int=None,
+                 dat_class=None,
+                 **dat_kwargs) -> None:
+        """
+        Args:
+            path: Folder containing blk?????.dat files.
+            datStart: First file number.
+            datn: Number of files. Default None indexes all files from
+                datStart.
+            dat_class: Class used to open files. Default py3.chain.Dat.
+            **dat_kwargs: Passed on to dat_class, eg. network.
+        """
+        if dat_class is None:
+            from pybit.py3.chain import Dat
+            dat_class = Dat
+
+        self.path = path
+        self.datStart = datStart
+        self.datn = datn
+        self.dat_class = dat_class
+        self.dat_kwargs = dat_kwargs
+        self.dat_kwargs.setdefault('verb', None)
+
+        self.entries = {}
+        self.hashes = []
+        self.heights = {}
+        self.work = {}
+        self._dats = {}
+        # Best chain timestamps by height, and running max/min for search
+        self.times = np.empty(0, dtype=np.int64)
+        self._timeMax = self.times
+        self._timeMin = self.times
+
+    def __repr__(self) -> str:
+        return f"HeaderIndex: {len(self.entries)} headers, " \
+            f"height {self.height}"
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @property
+    def height(self) -> int:
+        """Height of best chain tip, -1 if empty."""
+        return len(self.hashes) - 1
+
+    def files(self) -> list:
+        """Numbers of the files in range that exist."""
+        nums = sorted(self.dat_class.file_number(f)
+                      for f in glob.glob(os.path.join(self.path,
+                                                      "blk*.dat")))
+        end = None if self.datn is None else self.datStart + self.datn
+
+        return [n for n in nums
+                if n is not None and n >= self.datStart
+                and (end is None or n < end)]
+
+    def open(self, datn: int):
+        """Return the (cached) Dat for file number datn."""
+        d = self._dats.get(datn)
+        if d is None:
+            d = self.dat_class(self.path, "blk{0:05d}.dat".format(datn),
+                               datn=datn,
+                               **self.dat_kwargs)
+            self._dats[datn] = d
+
+        return d
+
+    def scan_file(self, datn: int) -> int:
+        """Add headers of every complete block in a file. Returns count."""
+        d = self.open(datn)
+        d.seek(0)
+        n = 0
+        while d.find_next_block():
+            c = d.cursor
+            header = d.mmap[c+8:c+88]
+            self.entries[hash_SHA256_twice(header)] = (
+                datn, c, n, header[4:36],
+                int.from_bytes(header[72:76], 'little'),
+                int.from_bytes(header[68:72], 'little'))
+            d.cursor = c + 8 + int.from_bytes(d.mmap[c+4:c+8], 'little')
+            n += 1
+
+        return n
+
+    def scan(self) -> None:
+        """Read headers from all files in range."""
+        for datn in self.files():
+            n = self.scan_file(datn)
+            chain_log.info("Indexed %s headers in file %s", n, datn)
+
+    def load_block_index(self, index) -> None:
+        """
+        Add headers from Bitcoin Core's block index instead of scanning.
+
+        Only blocks stored in files in range, and not marked invalid, are
+        added. Ordinals in file aren't known and are set to 0.
+
+        Args:
+            index: Path to Core's blocks/index folder, or entries already
+                read with py3.block_index.read_block_index.
+        """
+        if isinstance(index, str):
+            index = read_block_index(index)
+
+        files = set(self.files())
+        for h, e in index.items():
+            if not e['status'] & BLOCK_HAVE_DATA \
+                    or e['status'] & BLOCK_FAILED_MASK \
+                    or e['file'] not in files:
+                continue
+            header = e['header']
+            self.entries[h] = (
+                e['file'], e['dataPos'] - 8, 0, header[4:36],
+                int.from_bytes(header[72:76], 'little'),
+                int.from_bytes(header[68:72], 'little'))
+        chain_log.info("Loaded %s headers from block index",
+                       len(self.entries))
+
+    def build(self) -> None:
+        """
+        Assign heights and select the best (most work) chain.
+
+        Blocks whose ancestors aren't in the index can't be placed and are
+        left out, so the index has to start from the file holding genesis.
+        Raises ValueError if there's no genesis block.
+        """
+        genesis_prev = b"\x00" * 32
+        heights = {}
+        work = {}
+        # Hashes known not to lead back to genesis, so each is walked once
+        unlinked = set()
+        for h in self.entries:
+            # Walk back to a block with known height
+            path = []
+            cur = h
+            while cur not in heights:
+                e = self.entries.get(cur)
+                if e is None or cur in unlinked:
+                    break
+                path.append(cur)
+                if e[3] == genesis_prev:
+                    heights[cur] = 0
+                    work[cur] = bits_to_work(e[4])
+                    path.pop()
+                    break
+                cur = e[3]
+            if cur not in heights:
+                unlinked.update(path)
+                continue
+
+            # Fill in heights on the way forward
+            for p in reversed(path):
+                prev = self.entries[p][3]
+                heights[p] = heights[prev] + 1
+                work[p] = work[prev] + bits_to_work(self.entries[p][4])
+
+        if not work:
+            raise ValueError(f"No genesis block among {len(self.entries)} "
+                             "headers, index from the first .dat file")
+        self.heights = heights
+        self.work = work
+
+        # Best tip: most work, then lowest height on ties
+        tip = max(work, key=lambda k: (work[k], -heights[k]))
+        hashes = [None] * (heights[tip] + 1)
+        cur = tip
+        while True:
+            hashes[heights[cur]] = cur
+            if heights[cur] == 0:
+                break
+            cur = self.entries[cur][3]
+        self.hashes = hashes
+        self._set_times()
+
+        stale = len(heights) - len(hashes)
+        chain_log.info("Best chain height %s, %s stale, %s unlinked",
+                       self.height, stale, len(self.entries) - len(heights))
+
+    def _set_times(self) -> None:
+        """
+        Timestamps along the best chain.
+
+        Block times aren't monotonic (they only have to exceed the median
+        of the previous 11), so searches use the running maximum (for the
+        first block at or after a time) and the minimum of all later blocks
+        (for the first block after which every time is later).
+        """
+        self.times = np.array([self.entries[h][5] for h in self.hashes],
+                              dtype=np.int64)
+        self._timeMax = np.maximum.accumulate(self.times) \
+            if len(self.times) else self.times
+        self._timeMin = np.minimum.accumulate(self.times[::-1])[::-1] \
+            if len(self.times) else self.times
+
+    def update(self) -> None:
+        """Scan and build."""
+        self.scan()
+        self.build()
+
+    def position(self, height: int) -> tuple:
+        """Return (datn, offset, ordinal) of the block at height."""
+        e = self.entries[self.hashes[height]]
+
+        return e[0], e[1], e[2]
+
+    def time_window(self, start=None,
+                    end=None) -> tuple:
+        """
+        Smallest (start, stop) height range containing every block with
+        start <= timestamp < end.
+
+        Binary searches on the running max and later min of the timestamps,
+        so blocks inside the window can still be outside the time range;
+        see .heights_in_time().
+
+        Args:
+            start: Unix time, or anything pd.Timestamp takes (eg. "2020-01-01"
+                or a datetime, UTC). None for no lower limit.
+            end: As start. None for no upper limit.
+        """
+        start = to_timestamp(start)
+        end = to_timestamp(end)
+        lo = 0 if start is None \
+            else int(np.searchsorted(self._timeMax, start, side='left'))
+        hi = len(self.times) if end is None \
+            else int(np.searchsorted(self._timeMin, end, side='left'))
+
+        return lo, max(lo, hi)
+
+    def heights_in_time(self, start=None,
+                        end=None) -> np.ndarray:
+        """Heights of best chain blocks with start <= timestamp < end."""
+        lo, hi = self.time_window(start, end)
+        t = self.times[lo:hi]
+        keep = np.ones(len(t), dtype=bool)
+        if start is not None:
+            keep &= t >= to_timestamp(start)
+        if end is not None:
+            keep &= t < to_timestamp(end)
+
+        return np.arange(lo, hi)[keep]
+
+    def block_span(self, height: int) -> tuple:
+        """(datn, start, end) bytes of the block at height, incl. framing."""
+        datn, offset, _ = self.position(height)
+        size = int.from_bytes(self.open(datn).mmap[offset+4:offset+8],
+                              'little')
+
+        return datn, offset, offset + 8 + size
+
+    def byte_ranges(self, heights) -> list:
+        """
+        Coalesced byte ranges holding the blocks at heights.
+
+        Blocks next to each other in a file are merged into one range.
+
+        Returns:
+            List of (datn, start, end), in file order.
+        """
+        spans = sorted(self.block_span(int(h)) for h in heights)
+        ranges = []
+        for datn, s, e in spans:
+            if ranges and ranges[-1][0] == datn and ranges[-1][2] == s:
+                ranges[-1][2] = e
+            else:
+                ranges.append([datn, s, e])
+
+        return [tuple(r) for r in ranges]
+
+    def read_block(self, height: int):
+        """Read and return the block at height on the best chain."""
+        datn, offset, ordinal = self.position(height)
+
+        return self.open(datn).read_block_at(offset, ordinal)
+
+    def iter_blocks(self, start: int=0,
+                    stop: int=None) -> Iterator:
+        """Yield (height, block) for heights start to stop (exclusive)."""
+        stop = len(self.hashes) if stop is None else min(stop,
+                                                         len(self.hashes))
+        for h in range(start, stop):
+            yield h, self.read_block(h)
+
+    def iter_heights(self, heights,
+                     order: str="height") -> Iterator:
+        """
+        Yield (height, block) for the given heights.
+
+        Args:
+            heights: Iterable of heights on the best chain.
+            order: "height", or "file" to read in file and offset order
+                (sequential reads).
+        """
+        heights = [int(h) for h in heights]
+        if order == "file":
+            heights.sort(key=self.position)
+        elif order != "height":
+            raise ValueError(f"Unknown order {order}")
+        else:
+            heights.sort()
+
+        for h in heights:
+            yield h, self.read_block(h)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in profiling of slow blocks and transactions.
+
+A BlockProfiler passed to Dat (or Chain) records how long each block took
+to parse, with its size and transaction count, and keeps the slowest N
+blocks and transactions in heaps. Parse time excludes API validation
+(validateBlocks/validateTrans), which is recorded in its own column, so the
+ranking isn't dominated by validation. Blocks slower than a threshold can be
+parsed again under cProfile and the stats dumped to disk, so optimisation
+can target the blocks that actually dominate runtime.
+"""
+
+# %% Imports
+
+import cProfile
+import heapq
+import itertools
+import os
+
+import pandas as pd
+
+from pybit.py3.common import dat_log
+
+
+# %% Profiler class
+
+class BlockProfiler():
+    """
+    Keep the slowest blocks and transactions seen.
+
+    Usage:
+        prof = BlockProfiler(top_n=20, threshold=0.5, profile_dir="prof/")
+        dat = Dat(path, f, profiler=prof)
+        dat.read_all()
+        print(prof.to_pandas())
+    """
+
+    COLUMNS = ["seconds", "validation", "size", "nTransactions", "datn",
+               "index", "start"]
+    TRANS_COLUMNS = ["seconds", "size", "nInputs", "nOutputs", "datn",
+                     "block", "index", "start"]
+
+    def __init__(self,
+                 top_n: int=20,
+                 threshold: float=None,
+                 profile_dir: str=None,
+                 max_profiles: int=10,
+                 record_all: bool=False) -> None:
+        """
+        Args:
+            top_n: Number of slowest blocks (and transactions) to keep.
+            threshold: Blocks taking longer than this to parse (seconds)
+                are parsed again under cProfile. Default None (off).
+            profile_dir: Folder to dump cProfile stats to, one .prof file
+                per block. Required if threshold is set.
+            max_profiles: Stop profiling after this many blocks.
+            record_all: Also keep a row for every block. Default False.
+        """
+        if threshold is not None and profile_dir is None:
+            raise ValueError("Set profile_dir to dump profiles to")
+
+        self.top_n = top_n
+        self.threshold = threshold
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+        self.record_all = record_all
+
+        self.blocks = []
+        self.trans = []
+        self.all = []
+        self.profiles = []
+        self.n = 0
+        self.seconds = 0.0
+        self.validation = 0.0
+        self._seq = itertools.count()
+
+    def __repr__(self) -> str:
+        return f"BlockProfiler: {self.n} blocks, {self.seconds:.3f}s " \
+            f"parsing, {self.validation:.3f}s validating, " \
+            f"{len(self.profiles)} profiles"
+
+    def _push(self, heap: list, seconds: float, row: tuple) -> None:
+        """Keep row if in the top_n by seconds (min heap of top_n)."""
+        item = (seconds, next(self._seq), row)
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, item)
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    def record(self, block, seconds: float,
+               validation: float=0.0) -> None:
+        """
+        Record a parsed block, profile it if over threshold.
+
+        Args:
+            block: Block just read.
+            seconds: Time it took to parse, excluding validation.
+            validation: Time spent validating it, if on.
+        """
+        self.n += 1
+        self.seconds += seconds
+        self.validation += validation
+        row = (seconds, validation, block.end - block.start,
+               len(block.trans), block.datn, block.index, block.start)
+
+        if self.record_all:
+            self.all.append(row)
+        self._push(self.blocks, seconds, row)
+
+        if self.threshold is not None and seconds > self.threshold \
+                and len(self.profiles) < self.max_profiles:
+            self.profile(block)
+
+    def record_trans(self, trans, seconds: float,
+                     block) -> None:
+        """
+        Record a parsed transaction.
+
+        Args:
+            trans: Trans just read.
+            seconds: Time it took to parse.
+            block: Containing Block.
+        """
+        self._push(self.trans, seconds,
+                   (seconds, trans.end - trans.start, len(trans.txIn),
+                    len(trans.txOut), block.datn, block.index, trans.index,
+                    trans.start))
+
+    def profile(self, block) -> str:
+        """
+        Parse block again under cProfile and dump stats.
+
+        The second parse doesn't repeat API validation.
+
+        Returns:
+            Path of the .prof file, readable with pstats.
+        """
+        b = type(block)(block.mmap, block.start,
+                        f=block.f,
+                        index=block.index,
+                        datn=block.datn,
+                        network=block.network,
+                        predicate=block.predicate,
+                        **block.trans_kwargs)
+        b.validateTrans = False
+
+        prof = cProfile.Profile()
+        prof.runcall(b.read_block)
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        fn = os.path.join(self.profile_dir,
+                          f"block_{block.datn}_{block.index}.prof")
+        prof.dump_stats(fn)
+        self.profiles.append(fn)
+
+        dat_log.info("Profiled block %s in %s: %s", block.index,
+                     block.datn, fn)
+
+        return fn
+
+    def slowest(self) -> list:
+        """Slowest block rows, slowest first."""
+        return [r for _, _, r in sorted(self.blocks, reverse=True)]
+
+    def slowest_trans(self) -> list:
+        """Slowest transaction rows, slowest first."""
+        return [r for _, _, r in sorted(self.trans, reverse=True)]
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Slowest blocks as a DataFrame, slowest first."""
+        return pd.DataFrame(self.slowest(),
+                            columns=self.COLUMNS)
+
+    def trans_to_pandas(self) -> pd.DataFrame:
+        """Slowest transactions as a DataFrame, slowest first."""
+        return pd.DataFrame(self.slowest_trans(),
+                            columns=self.TRANS_COLUMNS)
+
+    def all_to_pandas(self) -> pd.DataFrame:
+        """Every block recorded (needs record_all=True)."""
+        return pd.DataFrame(self.all,
+                            columns=self.COLUMNS)
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Classes to read Bitcoin Core's undo (rev?????.dat) files.
+
+When Core connects a block it writes the outputs the block spends to the
+rev file with the same number as the block's blk file. Each record is
+framed like a block (magic, 4 byte size) and followed by a 32 byte
+checksum, double SHA256 of the previous block's hash and the record:
+
+    CompactSize(number of non-coinbase transactions)
+    per transaction: CompactSize(inputs)
+        per input: VARINT(height * 2 + coinbase), VARINT(0) if height > 0,
+                   VARINT(compressed amount), compressed script
+
+Records aren't in the same order as the blocks, so they're matched by
+shape (inputs per transaction) and confirmed with the checksum. This gives
+each block's input values and scripts from one pair of files, without a
+UTXO set, so files can be processed independently (eg. in parallel).
+"""
+
+# %% Imports
+
+import mmap
+from typing import Iterator
+
+import pandas as pd
+
+from pybit.py3.common import MagicMismatch, chain_log
+from pybit.py3.fees import block_fees_to_pandas, resolve_inputs
+from pybit.pyx.compress import (compress_amount, compress_script,
+                                decompress_amount, read_script, read_varint,
+                                write_varint)
+from pybit.pyx.networks import MAINNET, detect_network, get_network
+from pybit.pyx.utils import hash_SHA256_twice, read_compact_size, var_int
+
+
+# %% Encoding
+
+def _script_size(kind: int) -> int:
+    """Bytes after the type VARINT of a compressed script."""
+    if kind < 2:
+        return 20
+    if kind < 6:
+        return 32
+
+    return kind - 6
+
+
+def read_block_undo(buf, pos: int=0) -> tuple:
+    """
+    Decode a block undo record.
+
+    Returns:
+        Tuple of (spent, end). spent has one list per transaction, of
+        (value, script, height, coinbase) per input, starting with an
+        empty list for the coinbase, as UTXOSet.apply_block.
+    """
+    spent = [[]]
+    n_tx, pos = read_compact_size(buf, pos)
+    for _ in range(n_tx):
+        n_in, pos = read_compact_size(buf, pos)
+        coins = []
+        for _ in range(n_in):
+            code, pos = read_varint(buf, pos)
+            if code >> 1 > 0:
+                _, pos = read_varint(buf, pos)
+            amount, pos = read_varint(buf, pos)
+            script, pos = read_script(buf, pos)
+            coins.append((decompress_amount(amount), script,
+                          code >> 1, bool(code & 1)))
+        spent.append(coins)
+
+    return spent, pos
+
+
+def undo_shape(buf, pos: int=0) -> tuple:
+    """Inputs per transaction of an undo record, without decoding coins."""
+    shape = []
+    n_tx, pos = read_compact_size(buf, pos)
+    for _ in range(n_tx):
+        n_in, pos = read_compact_size(buf, pos)
+        for _ in range(n_in):
+            code, pos = read_varint(buf, pos)
+            if code >> 1 > 0:
+                _, pos = read_varint(buf, pos)
+            _, pos = read_varint(buf, pos)
+            kind, pos = read_varint(buf, pos)
+            pos += _script_size(kind)
+        shape.append(n_in)
+
+    return tuple(shape)
+
+
+def encode_block_undo(spent: list) -> bytes:
+    """Inverse of read_block_undo (first, coinbase, entry is skipped)."""
+    out = [var_int(len(spent) - 1)]
+    for coins in spent[1:]:
+        out.append(var_int(len(coins)))
+        for value, script, height, coinbase in coins:
+            out.append(write_varint(height * 2 + coinbase))
+            if height > 0:
+                out.append(write_varint(0))
+            out.append(write_varint(compress_amount(value)))
+            out.append(compress_script(script))
+
+    return b"".join(out)
+
+
+def undo_checksum(prev_hash: bytes, undo: bytes) -> bytes:
+    """Checksum written after a record (prev_hash in internal order)."""
+    return hash_SHA256_twice(prev_hash + undo)
+
+
+def frame_undo(undo: bytes, prev_hash: bytes,
+               magic: bytes=MAINNET.magic) -> bytes:
+    """Undo record as written to a rev file: magic, size, data, checksum."""
+    return magic + len(undo).to_bytes(4, 'little') + undo \
+        + undo_checksum(prev_hash, undo)
+
+
+def block_shape(block) -> tuple:
+    """Inputs per non-coinbase transaction of a (read) block."""
+    block.check_complete()
+
+    return tuple(len(t.txIn) for t in list(block.trans.values())[1:])
+
+
+# %% File classes
+
+class Rev():
+    """
+    Undo records in one rev?????.dat.
+
+    Usage:
+        r = Rev("Blocks/", "rev00000.dat")
+        for start, end, checksum in r.iter_records():
+            spent = r.read(start)
+    """
+
+    def __init__(self, path: str, f: str,
+                 datn: int=None,
+                 network="auto") -> None:
+        """
+        Args:
+            path: Path to folder containing the file, eg. "Blocks/".
+            f: File name, eg. "rev00000.dat".
+            datn: File number. Default None gets it from the file name.
+            network: Network name or pyx.networks.Network. Default "auto"
+                detects it from the file's magic.
+        """
+        from pybit.py3.chain import Dat
+        self.datn = Dat.file_number(f) if datn is None else datn
+        self.path = path
+        self.f = f
+
+        with open(path + f, 'rb') as fo:
+            self.mmap = mmap.mmap(fo.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        self.length = len(self.mmap)
+        if network == "auto":
+            network = detect_network(self.mmap, default=MAINNET)
+        self.network = get_network(network)
+        self.magic = self.network.magic
+
+    def __repr__(self) -> str:
+        return f"rev: {self.f}"
+
+    def iter_records(self) -> Iterator[tuple]:
+        """
+        Yield (start, end, checksum) of each complete record's undo data.
+
+        Stops at zero padding or a partially written record.
+        """
+        c = 0
+        while c + 8 <= self.length:
+            head = self.mmap[c:c+4]
+            if head != self.magic:
+                if head == b"\x00" * 4:
+                    nxt = self.mmap.find(self.magic, c)
+                    if nxt < 0:
+                        return
+                    c = nxt
+                    continue
+                raise MagicMismatch(head, self.magic)
+
+            size = int.from_bytes(self.mmap[c+4:c+8], 'little')
+            end = c + 8 + size
+            if end + 32 > self.length:
+                return
+            yield c + 8, end, self.mmap[end:end+32]
+            c = end + 32
+
+    def read(self, start: int) -> list:
+        """Decode the undo record starting at start (see read_block_undo)."""
+        return read_block_undo(self.mmap, start)[0]
+
+
+class _UndoMatcher():
+    """Find the undo record for a block by shape, confirmed by checksum."""
+
+    # Records up to this size are grouped by content, so identical records
+    # (eg. coinbase only blocks) are hashed once per block, not once each
+    SMALL = 64
+
+    def __init__(self, rev: Rev) -> None:
+        self.rev = rev
+        self.by_shape = {}
+        self.by_sum = {}
+        for start, end, checksum in rev.iter_records():
+            raws, spans = self.by_shape.setdefault(
+                undo_shape(rev.mmap, start), (set(), []))
+            if end - start <= self.SMALL:
+                raws.add(rev.mmap[start:end])
+                self.by_sum[checksum] = start
+            else:
+                spans.append((start, end, checksum))
+
+    def match(self, block) -> int:
+        """Start of the block's undo data, or None."""
+        entry = self.by_shape.get(block_shape(block))
+        if entry is None:
+            return None
+
+        prev = block.mmap[block.start+12:block.start+44]
+        for raw in entry[0]:
+            start = self.by_sum.pop(undo_checksum(prev, raw), None)
+            if start is not None:
+                return start
+
+        for i, (start, end, checksum) in enumerate(entry[1]):
+            if undo_checksum(prev, self.rev.mmap[start:end]) == checksum:
+                entry[1].pop(i)
+                return start
+
+        return None
+
+
+class RevChain():
+    """
+    Blocks from blk?????.dat files paired with spent outputs from the
+    matching rev?????.dat files.
+
+    Usage:
+        rc = RevChain("Blocks/", datn=10)
+        for b, spent in rc.iter_blocks():
+            ...
+        rc.fees_to_pandas()
+    """
+
+    def __init__(self, path: str,
+                 datStart: int=0,
+                 datn: int=10,
+                 network="auto",
+                 **dat_kwargs) -> None:
+        """
+        Args:
+            path: Folder containing blk and rev files.
+            datStart: First file number.
+            datn: Number of files.
+            network: Network name or pyx.networks.Network. Default "auto".
+            **dat_kwargs: Passed on to py3.chain.Dat, eg. validateTrans.
+        """
+        self.path = path
+        self.datStart = datStart
+        self.datn = datn
+        self.network = network
+        self.dat_kwargs = dat_kwargs
+        self.dat_kwargs.setdefault('verb', None)
+        self.unmatched = 0
+
+    def __repr__(self) -> str:
+        return f"RevChain over {self.path} {self.datStart} - " \
+            f"{self.datStart + self.datn}"
+
+    def iter_file(self, datn: int) -> Iterator[tuple]:
+        """
+        Yield (block, spent) for each block in blk file datn.
+
+        spent is as read_block_undo, with input values also set on each
+        Trans (see py3.fees). It's None for blocks without an undo record,
+        ie. genesis and blocks that were never connected.
+        """
+        from pybit.py3.chain import Dat
+        d = Dat(self.path, "blk{0:05d}.dat".format(datn),
+                datn=datn,
+                network=self.network,
+                **self.dat_kwargs)
+        r = Rev(self.path, "rev{0:05d}.dat".format(datn),
+                datn=datn,
+                network=d.network)
+        matcher = _UndoMatcher(r)
+
+        for b in d.iter_blocks():
+            start = matcher.match(b)
+            if start is None:
+                self.unmatched += 1
+                yield b, None
+                continue
+
+            spent = r.read(start)
+            resolve_inputs(b, spent)
+            yield b, spent
+
+    def iter_blocks(self) -> Iterator[tuple]:
+        """Yield (block, spent) from each pair of files in range."""
+        for datn in range(self.datStart, self.datStart + self.datn):
+            chain_log.info("Reading blk/rev %05d", datn)
+            yield from self.iter_file(datn)
+
+    def _fee_blocks(self, blocks: Iterator[tuple]) -> Iterator[tuple]:
+        for b, spent in blocks:
+            if spent is not None:
+                yield None, b, [hash_SHA256_twice(b.mmap[s:e])
+                                for s, e in b.trans_spans()]
+
+    def file_fees_to_pandas(self, datn: int) -> pd.DataFrame:
+        """Fee table (see py3.fees) for the blocks in one file."""
+        return block_fees_to_pandas(self._fee_blocks(self.iter_file(datn)))
+
+    def fees_to_pandas(self) -> pd.DataFrame:
+        """Fee table for all blocks in range (height is left empty)."""
+        return block_fees_to_pandas(self._fee_blocks(self.iter_blocks()))
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput counters and per-stage timing for Dat and Chain.
+
+Dat and Chain fill in a ParseStats as they read: bytes, blocks,
+transactions, inputs and outputs, plus time spent in each stage. It can log
+a summary line periodically and/or write the counters as a Prometheus text
+file, so the slowest stage can be seen in production without a profiler.
+"""
+
+# %% Imports
+
+import os
+import time
+
+from pybit.py3.common import chain_log
+
+
+# %% Stats class
+
+class ParseStats():
+    """
+    Counters and stage timings for one scan.
+
+    Stages:
+        framing: Finding the next block (magic/size prefix, padding).
+        header: Block.read_header.
+        tx: Block.read_trans (transaction, input and output decoding).
+        hashing: Txid hashing (Dat.txids).
+        validation: Size checks and API validation of blocks/transactions.
+        export: Writing exported tables (Chain.read_all).
+    """
+
+    STAGES = ("framing", "header", "tx", "hashing", "validation", "export")
+
+    def __init__(self,
+                 log_every: float=None,
+                 prom_file: str=None) -> None:
+        """
+        Args:
+            log_every: Log a summary line (pybit.chain logger, INFO) at most
+                this often, in seconds. Default None (off).
+            prom_file: Also write Prometheus text format counters to this
+                file when logging. Default None (off).
+        """
+        self.log_every = log_every
+        self.prom_file = prom_file
+        self.reset()
+
+    def reset(self) -> None:
+        """Zero counters and timers."""
+        self.bytes = 0
+        self.blocks = 0
+        self.tx = 0
+        self.inputs = 0
+        self.outputs = 0
+        self.times = {s: 0.0 for s in self.STAGES}
+        self.start = time.perf_counter()
+        self._lastReport = self.start
+
+    def __repr__(self) -> str:
+        return f"ParseStats: {self.blocks} blocks, {self.tx} tx, " \
+            f"{self.bytes} bytes"
+
+    def __str__(self) -> str:
+        """One line summary: rates and share of time per stage."""
+        r = self.rates()
+        total = sum(self.times.values()) or 1
+        stages = " ".join(f"{s}={100 * t / total:.0f}%"
+                          for s, t in self.times.items() if t)
+
+        return f"{self.blocks} blocks, {self.tx} tx, " \
+            f"{r['MB/s']:.2f} MB/s, {r['blocks/s']:.1f} blocks/s, " \
+            f"{r['tx/s']:.1f} tx/s | {stages}"
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since created or reset."""
+        return time.perf_counter() - self.start
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Add time to a stage."""
+        self.times[stage] += seconds
+
+    def count_block(self, block) -> None:
+        """Add a parsed block's size and transaction/input/output counts."""
+        self.bytes += block.end - block.start
+        self.blocks += 1
+        self.tx += len(block.trans)
+        for t in block.trans.values():
+            self.inputs += len(t.txIn)
+            self.outputs += len(t.txOut)
+
+    def rates(self) -> dict:
+        """Throughput over elapsed time."""
+        s = self.elapsed or 1e-9
+        return {'MB/s': self.bytes / 2 ** 20 / s,
+                'blocks/s': self.blocks / s,
+                'tx/s': self.tx / s}
+
+    def bottleneck(self) -> str:
+        """Stage with most time spent, or None if nothing timed yet."""
+        stage = max(self.times, key=self.times.get)
+
+        return stage if self.times[stage] else None
+
+    def to_dict(self) -> dict:
+        """Counters, stage times and rates as a dict."""
+        d = {'bytes': self.bytes,
+             'blocks': self.blocks,
+             'tx': self.tx,
+             'inputs': self.inputs,
+             'outputs': self.outputs,
+             'elapsed': self.elapsed,
+             'times': dict(self.times)}
+        d.update(self.rates())
+
+        return d
+
+    def prometheus(self) -> str:
+        """Counters in Prometheus text exposition format."""
+        lines = []
+        for name, value, doc in (
+                ("bytes", self.bytes, "Block bytes parsed"),
+                ("blocks", self.blocks, "Blocks parsed"),
+                ("transactions", self.tx, "Transactions parsed"),
+                ("inputs", self.inputs, "Inputs parsed"),
+                ("outputs", self.outputs, "Outputs parsed")):
+            lines += [f"# HELP pybit_{name}_total {doc}.",
+                      f"# TYPE pybit_{name}_total counter",
+                      f"pybit_{name}_total {value}"]
+
+        lines += ["# HELP pybit_stage_seconds_total Time spent per stage.",
+                  "# TYPE pybit_stage_seconds_total counter"]
+        lines += [f'pybit_stage_seconds_total{{stage="{s}"}} {t:.6f}'
+                  for s, t in self.times.items()]
+
+        lines += ["# HELP pybit_elapsed_seconds Time since scan started.",
+                  "# TYPE pybit_elapsed_seconds gauge",
+                  f"pybit_elapsed_seconds {self.elapsed:.3f}"]
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, fn: str=None) -> None:
+        """
+        Write .prometheus() to fn (default .prom_file).
+
+        Writes to a temporary file and renames, so a scraper never reads a
+        partial file.
+        """
+        fn = fn or self.prom_file
+        tmp = fn + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.prometheus())
+        os.replace(tmp, fn)
+
+    def tick(self) -> None:
+        """Log and/or write counters if .log_every seconds have passed."""
+        if self.log_every is None:
+            return
+
+        now = time.perf_counter()
+        if now - self._lastReport < self.log_every:
+            return
+        self._lastReport = now
+
+        chain_log.info("%s", self)
+        if self.prom_file is not None:
+            self.write_prometheus()
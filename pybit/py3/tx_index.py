@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent txid -> position index over the .dat files.
+
+Each record is 80 bytes: txid (internal byte order), file number, offset of
+the block, offset and length of the transaction. Each file's records are
+sorted in memory and written as one run of a pyx.records.SegmentStore;
+runs are then merged in bounded memory (an external sort) into a single
+sorted file. A lookup is a binary search over the memory mapped txid
+column, about 30 reads for a billion entries.
+"""
+
+# %% Imports
+
+import numpy as np
+
+from pybit.py3.common import chain_log
+from pybit.pyx.records import SegmentStore
+from pybit.pyx.utils import hash_SHA256_twice
+
+
+# %% Records
+
+RECORD = np.dtype([('key', 'S32'),
+                   ('datn', '<u4'),
+                   ('block', '<u8'),
+                   ('offset', '<u8'),
+                   ('length', '<u4')])
+
+
+def txid_bytes(txid) -> bytes:
+    """Internal byte order txid from hex (display order) or bytes."""
+    if isinstance(txid, str):
+        return bytes.fromhex(txid)[::-1]
+
+    return bytes(txid)
+
+
+# %% Index class
+
+class TxIndex():
+    """
+    txid -> (file number, block offset, tx offset, length).
+
+    Files are indexed up to the last complete block and the position is
+    saved, so a later .build() picks up blocks appended since.
+
+    Usage:
+        idx = TxIndex("tx_index/")
+        idx.build(Chain("Blocks/", datn=100))
+        idx.lookup("4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b")
+    """
+
+    def __init__(self, path: str,
+                 max_segments: int=64,
+                 merge_chunk: int=2 ** 22) -> None:
+        """
+        Args:
+            path: Folder for the index. Created if needed.
+            max_segments: Merge runs when there are more than this.
+            merge_chunk: Records held in memory while merging.
+        """
+        self.path = path
+        self.store = SegmentStore(path, RECORD,
+                                  max_segments=max_segments,
+                                  merge_chunk=merge_chunk)
+
+    def __repr__(self) -> str:
+        return f"TxIndex: {self.path}, {len(self.files)} files"
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @property
+    def files(self) -> dict:
+        """File number (str) -> [offset, nBlock] indexed up to."""
+        return self.store.meta.get('files', {})
+
+    def index_file(self, d) -> int:
+        """
+        Add records for the blocks in a Dat not yet indexed.
+
+        Only the transaction framing is walked (Dat.iter_trans_spans), no
+        objects are built or validated.
+
+        Args:
+            d: py3.chain.Dat. Read from the saved position.
+
+        Returns:
+            Number of transactions added.
+        """
+        pos = self.files.get(str(d.datn))
+        if pos is not None:
+            d.seek(*pos)
+
+        recs = [(hash_SHA256_twice(d.mmap[s:e]), d.datn, b, s, e - s)
+                for b, s, e in d.iter_trans_spans()]
+
+        files = dict(self.files)
+        files[str(d.datn)] = [d.lastComplete, d.nBlock]
+        self.store.append(np.array(recs, dtype=RECORD),
+                          files=files)
+
+        return len(recs)
+
+    def build(self, chain) -> None:
+        """
+        Index each file in the chain's range, then merge into one run.
+
+        Args:
+            chain: py3.chain.Chain over the .dat files.
+        """
+        for datn in range(chain.datStart, chain.datEnd):
+            try:
+                d = chain.readDat(datn)
+            except FileNotFoundError:
+                break
+            n = self.index_file(d)
+            chain_log.info("Indexed %s transactions in file %s", n, datn)
+
+        self.store.compact()
+
+    def find(self, txid) -> list:
+        """
+        All positions recorded for txid.
+
+        A txid can appear more than once, eg. in a stale block as well as
+        the best chain, or the two duplicated early coinbases.
+
+        Args:
+            txid: Hex (display order) or bytes (internal order).
+
+        Returns:
+            List of (datn, block offset, tx offset, length).
+        """
+        return [(int(r['datn']), int(r['block']),
+                 int(r['offset']), int(r['length']))
+                for r in self.store.find(txid_bytes(txid))]
+
+    def lookup(self, txid) -> tuple:
+        """First position of txid (see .find()), or None."""
+        found = self.find(txid)
+
+        return found[0] if found else None
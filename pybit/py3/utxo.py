@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Unspent transaction output (UTXO) set built from blocks in height order.
+
+Outputs are stored in a local SQLite database. Keys are txid + VARINT(n)
+and values use Core's chainstate encoding (VARINT(height * 2 + coinbase),
+compressed amount and compressed script, see pyx.compress), so an entry is
+typically ~30 bytes. Recently created outputs are held in an in-memory
+cache, since most are spent soon after. Lookups of a block's inputs are
+batched into one query, and writes are flushed in batches inside a single
+transaction.
+"""
+
+# %% Imports
+
+import itertools
+import sqlite3
+import time
+
+from pybit.py3.common import chain_log
+from pybit.pyx.compress import (compress_amount, compress_script,
+                                decompress_amount, read_script, read_varint,
+                                write_varint)
+from pybit.pyx.utils import hash_SHA256_twice
+
+
+# %% Encoding
+
+def outpoint_key(txid: bytes, n: int) -> bytes:
+    """Key for output n of txid (internal byte order)."""
+    return txid + write_varint(n)
+
+
+def encode_coin(value: int, script: bytes,
+                height: int, coinbase: bool) -> bytes:
+    """Compact value for an unspent output."""
+    return write_varint(height * 2 + coinbase) \
+        + write_varint(compress_amount(value)) \
+        + compress_script(script)
+
+
+def decode_coin(raw: bytes) -> tuple:
+    """Inverse of encode_coin, returns (value, script, height, coinbase)."""
+    code, pos = read_varint(raw, 0)
+    amount, pos = read_varint(raw, pos)
+    script, _ = read_script(raw, pos)
+
+    return decompress_amount(amount), script, code >> 1, bool(code & 1)
+
+
+def is_unspendable(script: bytes) -> bool:
+    """OP_RETURN and oversized scripts are never added to the set."""
+    return (len(script) > 0 and script[0] == 0x6a) or len(script) > 10000
+
+
+# %% UTXO set
+
+class UTXOSet():
+    """
+    UTXO set in SQLite with a write-back cache.
+
+    Usage:
+        utxo = UTXOSet("utxo.sqlite")
+        utxo.build(Chain("Blocks/", datn=100), height=100000)
+        utxo.get(txid, 0)
+    """
+
+    def __init__(self, fn: str=":memory:",
+                 cache_size: int=2 ** 20,
+                 flush_every: int=1000,
+                 batch_size: int=500) -> None:
+        """
+        Args:
+            fn: SQLite database file. Default in memory.
+            cache_size: Entries to keep cached after a flush. Above this
+                the oldest are evicted.
+            flush_every: Write to the database every this many blocks.
+            batch_size: Keys per lookup query.
+        """
+        self.fn = fn
+        self.cache_size = cache_size
+        self.flush_every = flush_every
+        self.batch_size = batch_size
+
+        self.db = sqlite3.connect(fn)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS utxo "
+                        "(k BLOB PRIMARY KEY, v BLOB) WITHOUT ROWID")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta "
+                        "(k TEXT PRIMARY KEY, v)")
+        self.db.commit()
+
+        # key -> encoded coin, and keys not yet written to the db
+        self._cache = {}
+        self._fresh = set()
+        # Spent keys that are in the db
+        self._deleted = set()
+        self._since = 0
+
+        self.missing = 0
+        self.height = self._meta('height', -1)
+        self.tip = self._meta('tip', None)
+
+    def __repr__(self) -> str:
+        return f"UTXOSet: {self.fn} @ height {self.height}"
+
+    def __len__(self) -> int:
+        """Number of unspent outputs (flushes first)."""
+        self.flush()
+        return self.db.execute("SELECT COUNT(*) FROM utxo").fetchone()[0]
+
+    def _meta(self, k: str, default=None):
+        row = self.db.execute("SELECT v FROM meta WHERE k = ?",
+                              (k,)).fetchone()
+        return default if row is None else row[0]
+
+    def close(self) -> None:
+        """Flush and close database."""
+        self.flush()
+        self.db.close()
+
+    # Lookups
+
+    def _fetch(self, keys: list) -> dict:
+        """Batched database lookup, returns found key -> encoded coin."""
+        found = {}
+        for i in range(0, len(keys), self.batch_size):
+            batch = keys[i:i+self.batch_size]
+            q = "SELECT k, v FROM utxo WHERE k IN (" \
+                + ",".join("?" * len(batch)) + ")"
+            found.update(self.db.execute(q, batch))
+
+        return found
+
+    def get(self, txid: bytes, n: int) -> tuple:
+        """
+        Return (value, script, height, coinbase) of an unspent output,
+        or None.
+        """
+        key = outpoint_key(txid, n)
+        raw = self._cache.get(key)
+        if raw is None and key not in self._deleted:
+            raw = self._fetch([key]).get(key)
+
+        return None if raw is None else decode_coin(raw)
+
+    def get_many(self, outpoints: list) -> list:
+        """Batched .get() for a list of (txid, n)."""
+        keys = [outpoint_key(t, n) for t, n in outpoints]
+        need = [k for k in keys
+                if k not in self._cache and k not in self._deleted]
+        found = self._fetch(need) if need else {}
+
+        out = []
+        for k in keys:
+            raw = self._cache.get(k) or found.get(k)
+            out.append(None if raw is None else decode_coin(raw))
+
+        return out
+
+    # Updates
+
+    def apply_block(self, block,
+                    height: int,
+                    txids: list=None,
+                    flush: bool=True) -> list:
+        """
+        Spend the block's inputs and add its outputs.
+
+        Args:
+            block: Block (read, with transactions).
+            height: Height of block.
+            txids: Transaction hashes, if already calculated.
+            flush: Flush every flush_every blocks. Indexes built alongside
+                the set pass False and flush it with their own writes, so
+                it's never saved ahead of them.
+
+        Returns:
+            List, one per transaction, of lists of the spent coins
+            (value, script, height, coinbase) per input, or None for an
+            input whose output wasn't found. Empty for the coinbase.
+        """
+        block.check_complete()
+        trans = list(block.trans.values())
+        if txids is None:
+            txids = [hash_SHA256_twice(block.mmap[s:e])
+                     for s, e in block.trans_spans()]
+
+        # One lookup for all inputs not already cached
+        spends = []
+        for t in trans[1:]:
+            spends.append([outpoint_key(i._prevOutput,
+                                        int.from_bytes(i._prevIndex,
+                                                       'little'))
+                           for i in t.txIn])
+        need = [k for keys in spends for k in keys
+                if k not in self._cache and k not in self._deleted]
+        found = self._fetch(need) if need else {}
+
+        cache = self._cache
+        fresh = self._fresh
+        spent = [[]]
+        for ti, (t, txid) in enumerate(zip(trans, txids)):
+            if ti > 0:
+                coins = []
+                for k in spends[ti - 1]:
+                    raw = cache.pop(k, None)
+                    if raw is not None:
+                        if k in fresh:
+                            fresh.discard(k)
+                        else:
+                            self._deleted.add(k)
+                    else:
+                        raw = found.pop(k, None)
+                        if raw is not None:
+                            self._deleted.add(k)
+                    if raw is None:
+                        self.missing += 1
+                        coins.append(None)
+                    else:
+                        coins.append(decode_coin(raw))
+                spent.append(coins)
+
+            # Genesis coinbase output can't be spent, so isn't in the set
+            if height == 0:
+                continue
+
+            for n, o in enumerate(t.txOut):
+                script = o._pkScript
+                if is_unspendable(script):
+                    continue
+                k = outpoint_key(txid, n)
+                cache[k] = encode_coin(int.from_bytes(o._value, 'little'),
+                                       script, height, ti == 0)
+                fresh.add(k)
+
+        self.height = height
+        self.tip = hash_SHA256_twice(block.prep_header())
+        self._since += 1
+        if flush and self._since >= self.flush_every:
+            self.flush()
+
+        return spent
+
+    def flush(self) -> None:
+        """Write new and spent outputs to the database in one transaction."""
+        with self.db:
+            self.db.executemany("DELETE FROM utxo WHERE k = ?",
+                                ((k,) for k in self._deleted))
+            self.db.executemany("INSERT OR REPLACE INTO utxo VALUES (?, ?)",
+                                ((k, self._cache[k]) for k in self._fresh))
+            self.db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                [('height', self.height),
+                                 ('tip', self.tip)])
+
+        self._deleted = set()
+        self._fresh = set()
+        self._since = 0
+        # Oldest first (insertion order), all clean after the write
+        excess = len(self._cache) - self.cache_size
+        if excess > 0:
+            self._cache = dict(itertools.islice(self._cache.items(),
+                                                excess, None))
+
+    def build(self, chain,
+              height: int=None,
+              log_every: float=30) -> None:
+        """
+        Apply blocks from chain in height order, up to and including height.
+
+        Resumes from the height already in the database.
+
+        Args:
+            chain: py3.chain.Chain over the .dat files.
+            height: Last height to apply. Default None (chain tip).
+            log_every: Log progress at most this often (seconds).
+        """
+        stop = None if height is None else height + 1
+        last = time.perf_counter()
+        for h, b in chain.iter_blocks_by_height(self.height + 1, stop):
+            self.apply_block(b, h)
+            if time.perf_counter() - last > log_every:
+                last = time.perf_counter()
+                chain_log.info("UTXO set at height %s, %s cached",
+                               h, len(self._cache))
+
+        self.flush()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Bech32 (BIP173) and bech32m (BIP350) encoding of segwit addresses.
+
+Follows the reference implementation in the BIPs. Decoding is used to turn
+watch-list addresses back into output scripts. bulk_segwit_encode runs the
+same checksum over many equal length programs at once with numpy.
+"""
+
+# %% Imports
+
+import numpy as np
+
+
+# %% Constants
+
+CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+BECH32_CONST = 1
+BECH32M_CONST = 0x2bc830a3
+
+_GENERATOR = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+_CHARSET_ARR = np.frombuffer(CHARSET.encode("ascii"), dtype=np.uint8)
+
+
+# %% Encoding functions
+
+def bech32_polymod(values: list) -> int:
+    """Internal function that computes the Bech32 checksum."""
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            chk ^= _GENERATOR[i] if ((top >> i) & 1) else 0
+
+    return chk
+
+
+def bech32_hrp_expand(hrp: str) -> list:
+    """Expand the HRP into values for checksum computation."""
+    return [ord(x) >> 5 for x in hrp] + [0] + [ord(x) & 31 for x in hrp]
+
+
+def bech32_create_checksum(hrp: str, data: list,
+                           const: int=BECH32_CONST) -> list:
+    """Compute the checksum values given HRP and data."""
+    values = bech32_hrp_expand(hrp) + data
+    polymod = bech32_polymod(values + [0, 0, 0, 0, 0, 0]) ^ const
+
+    return [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+
+
+def bech32_encode(hrp: str, data: list,
+                  const: int=BECH32_CONST) -> str:
+    """Compute a Bech32 or bech32m string given HRP and data values."""
+    combined = data + bech32_create_checksum(hrp, data,
+                                             const=const)
+
+    return hrp + '1' + ''.join([CHARSET[d] for d in combined])
+
+
+def convertbits(data: bytes, frombits: int, tobits: int,
+                pad: bool=True) -> list:
+    """General power-of-2 base conversion."""
+    acc = 0
+    bits = 0
+    ret = []
+    maxv = (1 << tobits) - 1
+    max_acc = (1 << (frombits + tobits - 1)) - 1
+    for value in data:
+        if value < 0 or (value >> frombits):
+            return None
+        acc = ((acc << frombits) | value) & max_acc
+        bits += frombits
+        while bits >= tobits:
+            bits -= tobits
+            ret.append((acc >> bits) & maxv)
+    if pad:
+        if bits:
+            ret.append((acc << (tobits - bits)) & maxv)
+    elif bits >= frombits or ((acc << (tobits - bits)) & maxv):
+        return None
+
+    return ret
+
+
+def segwit_encode(hrp: str, witver: int, witprog: bytes) -> bytes:
+    """
+    Encode a segwit address.
+
+    Version 0 programs use bech32, version 1+ (taproot etc.) use bech32m.
+    Returns ascii bytes to match the base58 encoded addresses.
+    """
+    const = BECH32_CONST if witver == 0 else BECH32M_CONST
+    addr = bech32_encode(hrp, [witver] + convertbits(witprog, 8, 5),
+                         const=const)
+
+    return addr.encode("ascii")
+
+
+# %% Bulk encoding
+
+def bulk_segwit_encode(hrp: str, witver: int, witprogs: list) -> list:
+    """
+    segwit_encode for many witness programs of the same length.
+
+    Each step of the checksum is applied to every program at once, and the
+    hrp part of it, the same for all, is only computed once.
+    """
+    n = len(witprogs)
+    if n == 0:
+        return []
+
+    progs = np.frombuffer(b"".join(witprogs),
+                          dtype=np.uint8).reshape(n, -1)
+
+    # 8 -> 5 bit groups, zero padded
+    bits = np.unpackbits(progs, axis=1)
+    bits = np.pad(bits, ((0, 0), (0, -bits.shape[1] % 5)))
+    data = bits.reshape(n, -1, 5).astype(np.int64) @ np.array(
+        [16, 8, 4, 2, 1], dtype=np.int64)
+    data = np.hstack([np.full((n, 1), witver, dtype=np.int64), data])
+
+    chk = np.full(n, bech32_polymod(bech32_hrp_expand(hrp)), dtype=np.int64)
+    zeros = np.zeros(n, dtype=np.int64)
+    for j in range(data.shape[1] + 6):
+        top = chk >> 25
+        chk = ((chk & 0x1ffffff) << 5) ^ (data[:, j] if j < data.shape[1]
+                                          else zeros)
+        for i in range(5):
+            chk ^= np.where((top >> i) & 1, _GENERATOR[i], 0)
+    chk ^= BECH32_CONST if witver == 0 else BECH32M_CONST
+
+    checksum = np.stack([(chk >> 5 * (5 - i)) & 31 for i in range(6)],
+                        axis=1)
+    chars = np.ascontiguousarray(_CHARSET_ARR[np.hstack([data, checksum])])
+    prefix = (hrp + '1').encode("ascii")
+
+    return [prefix + a for a in chars.view(f"S{chars.shape[1]}").ravel()
+            .tolist()]
+
+
+# %% Decoding functions
+
+def bech32_decode(bech: str) -> tuple:
+    """
+    Validate a Bech32 or bech32m string.
+
+    Returns:
+        Tuple of (hrp, data values, checksum constant), or (None, None,
+        None) if invalid.
+    """
+    if any(ord(x) < 33 or ord(x) > 126 for x in bech) \
+            or (bech.lower() != bech and bech.upper() != bech):
+        return None, None, None
+    bech = bech.lower()
+    pos = bech.rfind('1')
+    if pos < 1 or pos + 7 > len(bech) or len(bech) > 90 \
+            or not all(x in CHARSET for x in bech[pos+1:]):
+        return None, None, None
+
+    hrp = bech[:pos]
+    data = [CHARSET.find(x) for x in bech[pos+1:]]
+    const = bech32_polymod(bech32_hrp_expand(hrp) + data)
+    if const not in (BECH32_CONST, BECH32M_CONST):
+        return None, None, None
+
+    return hrp, data[:-6], const
+
+
+def segwit_decode(hrp: str, addr: str) -> tuple:
+    """
+    Decode a segwit address.
+
+    Returns:
+        Tuple of (witness version, witness program bytes), or (None, None)
+        if addr isn't a valid address for hrp.
+    """
+    hrp_got, data, const = bech32_decode(addr)
+    if hrp_got != hrp or not data:
+        return None, None
+
+    prog = convertbits(data[1:], 5, 8, False)
+    if prog is None or len(prog) < 2 or len(prog) > 40 or data[0] > 16:
+        return None, None
+    if data[0] == 0 and len(prog) not in (20, 32):
+        return None, None
+    if const != (BECH32_CONST if data[0] == 0 else BECH32M_CONST):
+        return None, None
+
+    return data[0], bytes(prog)
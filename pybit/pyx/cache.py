@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Small bounded caches shared between objects.
+"""
+
+# %% Imports
+
+import threading
+from collections import OrderedDict
+
+
+# %% Cache classes
+
+class LRUCache():
+    """
+    Bounded least-recently-used cache with hit/miss counters.
+
+    Safe to share between threads. A maxsize of 0 disables caching (every
+    .get() is a miss and .put() does nothing).
+    """
+
+    def __init__(self,
+                 maxsize: int=65536) -> None:
+        """
+        Args:
+            maxsize: Maximum number of entries to hold.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"LRUCache: {len(self)}/{self.maxsize} " \
+            f"hits={self.hits} misses={self.misses}"
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key,
+            default=None):
+        """Return cached value and mark as recently used, or default."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+
+        return value
+
+    def put(self, key, value) -> None:
+        """Add value, evicting the least recently used entry if full."""
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def resize(self, maxsize: int) -> None:
+        """Change maximum size, evicting oldest entries if needed."""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > max(maxsize, 0):
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        """Return counters and size as dict."""
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self),
+                'maxsize': self.maxsize}
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Bitcoin Core's compact serialisation of integers, amounts and scripts.
+
+These are the formats Core uses in its chainstate and undo (rev*.dat)
+files: an MSB base-128 VARINT (not the CompactSize varint used in blocks),
+amount compression that strips trailing zeros, and script compression that
+stores standard scripts as a type byte plus hash or key.
+"""
+
+# %% VARINT
+
+def write_varint(n: int) -> bytes:
+    """Encode n as Core VARINT (MSB base-128, each continuation +1)."""
+    out = bytearray([n & 0x7f])
+    n >>= 7
+    while n:
+        n -= 1
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+
+    return bytes(reversed(out))
+
+
+def read_varint(buf, pos: int=0) -> tuple:
+    """
+    Decode a Core VARINT from buf at pos.
+
+    Returns:
+        Tuple of (value, position after the VARINT).
+    """
+    n = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n = (n << 7) | (b & 0x7f)
+        if b & 0x80:
+            n += 1
+        else:
+            return n, pos
+
+
+# %% Amounts
+
+def compress_amount(n: int) -> int:
+    """Compress satoshi amount (Core CompressAmount)."""
+    if n == 0:
+        return 0
+    e = 0
+    while n % 10 == 0 and e < 9:
+        n //= 10
+        e += 1
+    if e < 9:
+        d = n % 10
+        n //= 10
+        return 1 + (n * 9 + d - 1) * 10 + e
+
+    return 1 + (n - 1) * 10 + 9
+
+
+def decompress_amount(x: int) -> int:
+    """Inverse of compress_amount (Core DecompressAmount)."""
+    if x == 0:
+        return 0
+    x -= 1
+    e = x % 10
+    x //= 10
+    if e < 9:
+        d = x % 9 + 1
+        x //= 9
+        n = x * 10 + d
+    else:
+        n = x + 1
+
+    return n * 10 ** e
+
+
+# %% Scripts
+
+# Number of special (compressed) script types, raw scripts store len + this
+N_SPECIAL_SCRIPTS = 6
+
+# secp256k1 field prime, for decompressing public keys
+_P = 2 ** 256 - 2 ** 32 - 977
+
+
+def compress_script(script: bytes) -> bytes:
+    """
+    Compress output script (Core ScriptCompression).
+
+    P2PKH, P2SH and compressed key P2PK scripts are stored as a type byte
+    and 20 or 32 bytes. Anything else (including uncompressed key P2PK,
+    which Core compresses further) is stored raw, prefixed with
+    VARINT(len + 6).
+    """
+    n = len(script)
+    if n == 25 and script[0:3] == b"\x76\xa9\x14" \
+            and script[23:25] == b"\x88\xac":
+        return b"\x00" + script[3:23]
+    if n == 23 and script[0:2] == b"\xa9\x14" and script[22] == 0x87:
+        return b"\x01" + script[2:22]
+    if n == 35 and script[0] == 0x21 and script[34] == 0xac \
+            and script[1] in (2, 3):
+        return script[1:34]
+
+    return write_varint(n + N_SPECIAL_SCRIPTS) + script
+
+
+def _decompress_pubkey(x: bytes, odd: bool) -> bytes:
+    """Uncompressed public key from x coordinate and parity of y."""
+    xi = int.from_bytes(x, 'big')
+    y = pow((pow(xi, 3, _P) + 7) % _P, (_P + 1) // 4, _P)
+    if (y & 1) != odd:
+        y = _P - y
+
+    return b"\x04" + x + y.to_bytes(32, 'big')
+
+
+def read_script(buf, pos: int=0) -> tuple:
+    """
+    Decode a compressed script from buf at pos (Core format, all types).
+
+    Returns:
+        Tuple of (script bytes, position after it).
+    """
+    kind, pos = read_varint(buf, pos)
+    if kind == 0:
+        return b"\x76\xa9\x14" + bytes(buf[pos:pos+20]) + b"\x88\xac", \
+            pos + 20
+    if kind == 1:
+        return b"\xa9\x14" + bytes(buf[pos:pos+20]) + b"\x87", pos + 20
+    if kind in (2, 3):
+        return b"\x21" + bytes([kind]) + bytes(buf[pos:pos+32]) + b"\xac", \
+            pos + 32
+    if kind in (4, 5):
+        pk = _decompress_pubkey(bytes(buf[pos:pos+32]), kind == 5)
+        return b"\x41" + pk + b"\xac", pos + 32
+
+    n = kind - N_SPECIAL_SCRIPTS
+    return bytes(buf[pos:pos+n]), pos + n
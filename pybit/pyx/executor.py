@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Thread pool for hashing spans of a mapped .dat.
+
+hashlib releases the GIL while hashing buffers over ~2KB, so hashing large
+transactions in worker threads overlaps with parsing in the main thread.
+Spans are hashed through memoryviews to avoid copying the mapped data.
+"""
+
+# %% Imports
+
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+# %% Hashing functions (memoryview friendly)
+
+def sha256d(by) -> bytes:
+    """SHA256 twice, accepts bytes or memoryview."""
+    return hashlib.sha256(hashlib.sha256(by).digest()).digest()
+
+
+def sha256_ripemd160(by) -> bytes:
+    """SHA256 then RIPEMD160, accepts bytes or memoryview."""
+    return hashlib.new('ripemd160', hashlib.sha256(by).digest()).digest()
+
+
+# %% Executor
+
+class HashExecutor():
+    """
+    Hash batches of (start, end) byte spans in a thread pool.
+
+    Usage:
+        with HashExecutor(threads=8) as ex:
+            fut = ex.submit(dat.mmap, dat.trans_spans())
+            # ... keep parsing ...
+            digests = fut.result()
+    """
+
+    def __init__(self,
+                 threads: int=None,
+                 chunk_bytes: int=2 ** 20,
+                 fn=sha256d) -> None:
+        """
+        Args:
+            threads: Number of worker threads. Default os.cpu_count().
+            chunk_bytes: Approximate number of bytes hashed per task.
+            fn: Hash function applied to each span.
+        """
+        self.threads = threads or os.cpu_count() or 1
+        self.chunk_bytes = chunk_bytes
+        self.fn = fn
+        self._pool = ThreadPoolExecutor(max_workers=self.threads)
+
+    def __enter__(self) -> "HashExecutor":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Wait for outstanding work and stop worker threads."""
+        self._pool.shutdown(wait=True)
+
+    def _chunks(self, spans: list) -> list:
+        """Split spans into tasks of roughly .chunk_bytes each."""
+        chunks = []
+        chunk = []
+        size = 0
+        for s, e in spans:
+            chunk.append((s, e))
+            size += e - s
+            if size >= self.chunk_bytes:
+                chunks.append(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            chunks.append(chunk)
+
+        return chunks
+
+    def _hash_chunk(self, buf, chunk: list) -> list:
+        """Hash each span in chunk without copying buf."""
+        fn = self.fn
+        view = memoryview(buf)
+        try:
+            return [fn(view[s:e]) for s, e in chunk]
+        finally:
+            view.release()
+
+    def submit(self, buf, spans) -> Future:
+        """
+        Queue spans for hashing and return immediately.
+
+        Args:
+            buf: Buffer holding the data, eg. Dat.mmap. Must stay open until
+                the result is collected.
+            spans: Iterable of (start, end) byte ranges.
+
+        Returns:
+            Future resolving to a list of digests, in span order.
+        """
+        futures = [self._pool.submit(self._hash_chunk, buf, c)
+                   for c in self._chunks(list(spans))]
+
+        out = Future()
+        lock = threading.Lock()
+
+        def collect(_):
+            # Last task to finish assembles the result
+            with lock:
+                if out.done() or not all(f.done() for f in futures):
+                    return
+                try:
+                    digests = []
+                    for f in futures:
+                        digests.extend(f.result())
+                    out.set_result(digests)
+                except Exception as e:
+                    out.set_exception(e)
+
+        if not futures:
+            out.set_result([])
+        for f in futures:
+            f.add_done_callback(collect)
+
+        return out
+
+    def map(self, buf, spans) -> list:
+        """Hash spans and wait for the digests."""
+        return self.submit(buf, spans).result()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Transaction filters evaluated on raw bytes.
+
+scan_trans() walks a serialised transaction just far enough to find its
+end and the value and script span of each output, without creating any
+objects. Predicates test those spans (script prefixes, exact scripts,
+values), so a Block can skip non-matching transactions before building
+Trans, TxIn and TxOut objects for them.
+
+Predicates combine with & (all), | (any) and ~ (not), eg.
+    OpReturn() | (ScriptPrefix(b"\\x00\\x14") & OutputValue(min_value=10**8))
+"""
+
+# %% Imports
+
+from pybit.pyx.utils import read_compact_size
+
+
+# %% Walking
+
+def scan_trans(buf, pos: int) -> tuple:
+    """
+    Find the end and outputs of the transaction at pos.
+
+    Returns:
+        Tuple of (end, outputs), outputs being a list of
+        (value, script start, script end) into buf.
+    """
+    n_in, pos = read_compact_size(buf, pos + 4)
+    for _ in range(n_in):
+        # Prevout (36), script, sequence (4)
+        size, pos = read_compact_size(buf, pos + 36)
+        pos += size + 4
+
+    n_out, pos = read_compact_size(buf, pos)
+    outputs = []
+    for _ in range(n_out):
+        value = int.from_bytes(buf[pos:pos+8], 'little')
+        size, pos = read_compact_size(buf, pos + 8)
+        outputs.append((value, pos, pos + size))
+        pos += size
+
+    # Lock time
+    return pos + 4, outputs
+
+
+# %% Predicates
+
+class Predicate():
+    """
+    Base class. Subclasses implement __call__(buf, outputs) -> bool, where
+    outputs is from scan_trans.
+    """
+
+    def __call__(self, buf, outputs: list) -> bool:
+        raise NotImplementedError
+
+    def __and__(self, other: "Predicate") -> "Predicate":
+        return All(self, other)
+
+    def __or__(self, other: "Predicate") -> "Predicate":
+        return Any(self, other)
+
+    def __invert__(self) -> "Predicate":
+        return Not(self)
+
+
+class All(Predicate):
+    """True if every predicate is."""
+
+    def __init__(self, *preds: Predicate) -> None:
+        self.preds = preds
+
+    def __repr__(self) -> str:
+        return " & ".join(repr(p) for p in self.preds)
+
+    def __call__(self, buf, outputs: list) -> bool:
+        return all(p(buf, outputs) for p in self.preds)
+
+
+class Any(Predicate):
+    """True if any predicate is."""
+
+    def __init__(self, *preds: Predicate) -> None:
+        self.preds = preds
+
+    def __repr__(self) -> str:
+        return " | ".join(repr(p) for p in self.preds)
+
+    def __call__(self, buf, outputs: list) -> bool:
+        return any(p(buf, outputs) for p in self.preds)
+
+
+class Not(Predicate):
+    """Negation of a predicate."""
+
+    def __init__(self, pred: Predicate) -> None:
+        self.pred = pred
+
+    def __repr__(self) -> str:
+        return f"~{self.pred!r}"
+
+    def __call__(self, buf, outputs: list) -> bool:
+        return not self.pred(buf, outputs)
+
+
+class ScriptPrefix(Predicate):
+    """Any output script starts with prefix (eg. b"\\x6a" for OP_RETURN)."""
+
+    def __init__(self, prefix: bytes) -> None:
+        self.prefix = prefix
+
+    def __repr__(self) -> str:
+        return f"ScriptPrefix({self.prefix.hex()})"
+
+    def __call__(self, buf, outputs: list) -> bool:
+        n = len(self.prefix)
+        prefix = self.prefix
+        for _, s, e in outputs:
+            if e - s >= n and buf[s:s+n] == prefix:
+                return True
+
+        return False
+
+
+class OpReturn(ScriptPrefix):
+    """Any output is OP_RETURN (data carrier)."""
+
+    def __init__(self) -> None:
+        super().__init__(b"\x6a")
+
+    def __repr__(self) -> str:
+        return "OpReturn()"
+
+
+class ScriptIn(Predicate):
+    """Any output script is one of a set of scripts."""
+
+    def __init__(self, scripts) -> None:
+        """
+        Args:
+            scripts: Iterable of raw pk scripts (bytes).
+        """
+        self.scripts = set(bytes(s) for s in scripts)
+        # Only scripts with a matching length need copying to compare
+        self.lengths = set(len(s) for s in self.scripts)
+
+    def __repr__(self) -> str:
+        return f"ScriptIn({len(self.scripts)} scripts)"
+
+    def __call__(self, buf, outputs: list) -> bool:
+        lengths = self.lengths
+        scripts = self.scripts
+        for _, s, e in outputs:
+            if e - s in lengths and buf[s:e] in scripts:
+                return True
+
+        return False
+
+
+class OutputValue(Predicate):
+    """Any output value (satoshis) in [min_value, max_value]."""
+
+    def __init__(self, min_value: int=None,
+                 max_value: int=None) -> None:
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def __repr__(self) -> str:
+        return f"OutputValue({self.min_value}, {self.max_value})"
+
+    def __call__(self, buf, outputs: list) -> bool:
+        lo = -1 if self.min_value is None else self.min_value
+        hi = self.max_value
+        for v, _, _ in outputs:
+            if v >= lo and (hi is None or v <= hi):
+                return True
+
+        return False
+
+
+class TotalValue(Predicate):
+    """Sum of output values (satoshis) in [min_value, max_value]."""
+
+    def __init__(self, min_value: int=None,
+                 max_value: int=None) -> None:
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def __repr__(self) -> str:
+        return f"TotalValue({self.min_value}, {self.max_value})"
+
+    def __call__(self, buf, outputs: list) -> bool:
+        total = sum(v for v, _, _ in outputs)
+
+        return (self.min_value is None or total >= self.min_value) \
+            and (self.max_value is None or total <= self.max_value)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Golomb-coded sets, as used by BIP158 compact block filters.
+
+Each element is hashed with SipHash-2-4 (keyed by the first 16 bytes of
+the block hash) and mapped to [0, N * M). The sorted values are stored as
+Golomb-Rice coded differences: the quotient (delta >> P) in unary, then P
+low bits. A serialised filter is CompactSize(N) followed by the bit stream.
+
+Matching hashes the query items with the same key and N, so false
+positives occur at about 1 / M per item, and there are no false negatives.
+"""
+
+# %% Imports
+
+import numpy as np
+
+from pybit.pyx.utils import hash_SHA256_twice, read_compact_size, var_int
+
+
+# %% Parameters
+
+# BIP158 basic filter
+BASIC_P = 19
+BASIC_M = 784931
+
+_MASK = 2 ** 64 - 1
+
+
+# %% SipHash
+
+def _rotl(x: int, b: int) -> int:
+    return ((x << b) | (x >> (64 - b))) & _MASK
+
+
+def _sip_rounds(v0: int, v1: int, v2: int, v3: int, n: int) -> tuple:
+    for _ in range(n):
+        v0 = (v0 + v1) & _MASK
+        v1 = _rotl(v1, 13) ^ v0
+        v0 = _rotl(v0, 32)
+        v2 = (v2 + v3) & _MASK
+        v3 = _rotl(v3, 16) ^ v2
+        v0 = (v0 + v3) & _MASK
+        v3 = _rotl(v3, 21) ^ v0
+        v2 = (v2 + v1) & _MASK
+        v1 = _rotl(v1, 17) ^ v2
+        v2 = _rotl(v2, 32)
+
+    return v0, v1, v2, v3
+
+
+def siphash24(k0: int, k1: int, data: bytes) -> int:
+    """SipHash-2-4 of data with key (k0, k1), each 64 bit little endian."""
+    v0 = k0 ^ 0x736f6d6570736575
+    v1 = k1 ^ 0x646f72616e646f6d
+    v2 = k0 ^ 0x6c7967656e657261
+    v3 = k1 ^ 0x7465646279746573
+
+    n = len(data)
+    end = n - n % 8
+    for i in range(0, end, 8):
+        m = int.from_bytes(data[i:i+8], 'little')
+        v3 ^= m
+        v0, v1, v2, v3 = _sip_rounds(v0, v1, v2, v3, 2)
+        v0 ^= m
+
+    m = ((n & 0xff) << 56) | int.from_bytes(data[end:], 'little')
+    v3 ^= m
+    v0, v1, v2, v3 = _sip_rounds(v0, v1, v2, v3, 2)
+    v0 ^= m
+
+    v2 ^= 0xff
+    v0, v1, v2, v3 = _sip_rounds(v0, v1, v2, v3, 4)
+
+    return v0 ^ v1 ^ v2 ^ v3
+
+
+def filter_key(block_hash: bytes) -> tuple:
+    """SipHash key (k0, k1) from a block hash (internal byte order)."""
+    return (int.from_bytes(block_hash[0:8], 'little'),
+            int.from_bytes(block_hash[8:16], 'little'))
+
+
+def hash_to_range(items, key: tuple, f: int) -> list:
+    """Map items into [0, f) (f = N * M)."""
+    k0, k1 = key
+
+    return [(siphash24(k0, k1, bytes(i)) * f) >> 64 for i in items]
+
+
+# %% Encoding
+
+def build_filter(elements,
+                 block_hash: bytes,
+                 P: int=BASIC_P,
+                 M: int=BASIC_M) -> bytes:
+    """
+    Serialised GCS filter of elements.
+
+    Args:
+        elements: Iterable of bytes, duplicates are dropped.
+        block_hash: Block hash (internal byte order), keys the hash.
+        P: Golomb-Rice parameter (bits of remainder).
+        M: Inverse false positive rate.
+    """
+    elements = set(bytes(e) for e in elements)
+    n = len(elements)
+    values = sorted(hash_to_range(elements, filter_key(block_hash), n * M))
+
+    out = bytearray()
+    acc = 0
+    n_bits = 0
+    last = 0
+    low = (1 << P) - 1
+    for v in values:
+        delta = v - last
+        last = v
+        q = delta >> P
+        # q ones, a zero, then the P bit remainder
+        acc = (acc << (q + 1 + P)) | (((1 << (q + 1)) - 2) << P) \
+            | (delta & low)
+        n_bits += q + 1 + P
+        while n_bits >= 8:
+            n_bits -= 8
+            out.append((acc >> n_bits) & 0xff)
+        acc &= (1 << n_bits) - 1
+
+    if n_bits:
+        out.append((acc << (8 - n_bits)) & 0xff)
+
+    # Colliding hash values are kept (zero deltas), so N is elements
+    return var_int(n) + bytes(out)
+
+
+def decode_filter(filt: bytes,
+                  P: int=BASIC_P) -> list:
+    """Sorted hash values of a serialised filter."""
+    n, pos = read_compact_size(filt, 0)
+    if n == 0:
+        return []
+
+    bits = np.unpackbits(np.frombuffer(filt, dtype=np.uint8, offset=pos))
+    length = len(bits)
+
+    # Position of the next zero (end of each unary quotient) at or after i
+    zeros = np.where(bits == 0, np.arange(length), length)
+    next_zero = np.minimum.accumulate(zeros[::-1])[::-1]
+
+    # P bit value starting at each position
+    padded = np.concatenate([bits, np.zeros(P + 1, dtype=np.uint8)])
+    rem = np.zeros(length + 1, dtype=np.int64)
+    for j in range(P):
+        rem = (rem << 1) | padded[j:j+length+1]
+
+    next_zero = next_zero.tolist()
+    rem = rem.tolist()
+    values = []
+    v = 0
+    pos = 0
+    for _ in range(n):
+        z = next_zero[pos]
+        v += ((z - pos) << P) | rem[z + 1]
+        values.append(v)
+        pos = z + 1 + P
+
+    return values
+
+
+def filter_size(filt: bytes) -> int:
+    """Number of elements N in a serialised filter."""
+    return read_compact_size(filt, 0)[0]
+
+
+# %% Matching
+
+def match_any(filt: bytes,
+              block_hash: bytes,
+              items,
+              P: int=BASIC_P,
+              M: int=BASIC_M) -> bool:
+    """
+    True if any item is (probably) in the filter.
+
+    Args:
+        filt: Serialised filter.
+        block_hash: Block hash the filter was built with.
+        items: Iterable of bytes to test.
+    """
+    n = filter_size(filt)
+    if n == 0:
+        return False
+
+    query = set(hash_to_range(items, filter_key(block_hash), n * M))
+    if not query:
+        return False
+
+    return not query.isdisjoint(decode_filter(filt, P))
+
+
+def filter_header(filt: bytes,
+                  prev_header: bytes=b"\x00" * 32) -> bytes:
+    """Filter header: dSHA256(dSHA256(filter) + previous filter header)."""
+    return hash_SHA256_twice(hash_SHA256_twice(filt) + prev_header)
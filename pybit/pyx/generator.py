@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic blk*.dat files for tests and benchmarks.
+
+Writes a linked chain of correctly framed blocks (network magic, size,
+header, varint counts) with valid merkle roots. Transactions spend earlier
+outputs, so values, txids and prevouts are consistent across the chain, and
+outputs follow a configurable mix of standard script types. The same seed
+always produces the same bytes.
+
+Blocks aren't mined (nonces are random) and transactions use the legacy
+serialisation without witness data, as that's what the parser reads.
+Segwit outputs are still generated; their spends just have empty script
+sigs.
+
+Run from top level directory, eg. for ~1GB of regtest blocks:
+    python -m pybit.pyx.generator Synthetic/ --mb 1024 --seed 1
+"""
+
+# %% Imports
+
+import argparse
+import os
+import random
+import struct
+from typing import Iterator
+
+from pybit.pyx.networks import get_network
+from pybit.pyx.scripts import (MULTISIG, OP_RETURN, P2PK, P2PKH, P2SH,
+                               P2TR, P2WPKH, P2WSH)
+from pybit.pyx.utils import hash_SHA256_twice, merkle_root, push, var_int
+
+
+# %% Defaults
+
+# Roughly the recent on chain share of each output type
+OUTPUT_MIX = {P2PKH: 0.30,
+              P2SH: 0.15,
+              P2WPKH: 0.35,
+              P2WSH: 0.05,
+              P2TR: 0.12,
+              OP_RETURN: 0.02,
+              P2PK: 0.005,
+              MULTISIG: 0.005}
+
+# Core rolls over to a new blk file before 128 MiB
+MAX_FILE_BYTES = 128 * 2 ** 20
+
+
+# %% Helpers
+
+def _draw(spec, rng: random.Random) -> int:
+    """Draw a count from an int, (low, high) range or callable(rng)."""
+    if callable(spec):
+        return int(spec(rng))
+    if isinstance(spec, tuple):
+        return rng.randint(*spec)
+
+    return int(spec)
+
+
+# %% Generator
+
+class BlockGenerator():
+    """
+    Generate a chain of synthetic blocks from a seed.
+
+    Usage:
+        gen = BlockGenerator(seed=1, tx_per_block=(50, 500))
+        files = gen.write("Synthetic/", total_bytes=2 ** 30)
+    """
+
+    def __init__(self,
+                 seed: int=0,
+                 network="regtest",
+                 tx_per_block=(1, 100),
+                 inputs=(1, 3),
+                 outputs=(1, 3),
+                 output_mix: dict=None,
+                 reuse: float=0.2,
+                 genesis: bool=True,
+                 start_time: int=None) -> None:
+        """
+        Args:
+            seed: Random seed. Same seed and args give the same bytes.
+            network: Network name or pyx.networks.Network, sets magic, nBits
+                and the genesis block.
+            tx_per_block: Transactions per block, including coinbase. An
+                int, (low, high) range or callable taking a random.Random.
+            inputs: Inputs per (non coinbase) transaction, as above.
+            outputs: Outputs per transaction, as above.
+            output_mix: Dict of script type -> weight. Default OUTPUT_MIX.
+            reuse: Probability an output pays to a script used before.
+            genesis: Start with the network's genesis block. Default True.
+            start_time: Timestamp of the first generated block. Default
+                genesis time + 600.
+        """
+        self.seed = seed
+        self.network = get_network(network)
+        self.tx_per_block = tx_per_block
+        self.inputs = inputs
+        self.outputs = outputs
+        mix = output_mix or OUTPUT_MIX
+        self._types = list(mix.keys())
+        self._weights = list(mix.values())
+        self.reuse = reuse
+        self.genesis = genesis
+
+        self.rng = random.Random(seed)
+        self.height = -1
+        self.tip = b"\x00" * 32
+        self.time = start_time or self.network.genesis_time + 600
+
+        # Spendable outputs: (txid, n, value, script type)
+        self.utxos = []
+        self._scripts = []
+
+    def __repr__(self) -> str:
+        return f"BlockGenerator: seed {self.seed}, {self.network.name} " \
+            f"@ height {self.height}"
+
+    # Scripts
+
+    def _randbytes(self, n: int) -> bytes:
+        """n random bytes, as Random.randbytes (which needs Python 3.9)."""
+        if n == 0:
+            return b""
+
+        return self.rng.getrandbits(8 * n).to_bytes(n, 'little')
+
+    def _new_script(self, script_type: str) -> bytes:
+        """Random output script of the given type."""
+        rb = self._randbytes
+        if script_type == P2PKH:
+            return b"\x76\xa9\x14" + rb(20) + b"\x88\xac"
+        elif script_type == P2SH:
+            return b"\xa9\x14" + rb(20) + b"\x87"
+        elif script_type == P2WPKH:
+            return b"\x00\x14" + rb(20)
+        elif script_type == P2WSH:
+            return b"\x00\x20" + rb(32)
+        elif script_type == P2TR:
+            return b"\x51\x20" + rb(32)
+        elif script_type == P2PK:
+            return b"\x21\x02" + rb(32) + b"\xac"
+        elif script_type == MULTISIG:
+            return b"\x51" + (b"\x21\x03" + rb(32)) * 2 + b"\x52\xae"
+
+        return b"\x6a" + push(rb(self.rng.randint(4, 80)))
+
+    def _output_script(self) -> tuple:
+        """Pick type and script for an output, sometimes reusing one."""
+        if self._scripts and self.rng.random() < self.reuse:
+            return self.rng.choice(self._scripts)
+
+        script_type = self.rng.choices(self._types, self._weights)[0]
+        out = (script_type, self._new_script(script_type))
+        if script_type != OP_RETURN:
+            if len(self._scripts) < 4096:
+                self._scripts.append(out)
+            else:
+                self._scripts[self.rng.randrange(4096)] = out
+
+        return out
+
+    def _script_sig(self, script_type: str) -> bytes:
+        """Script sig of a realistic size for spending script_type."""
+        rb = self._randbytes
+        if script_type in (P2PKH, P2PK):
+            sig = push(rb(self.rng.randint(71, 72)))
+            return sig if script_type == P2PK else sig + push(rb(33))
+        elif script_type == P2SH or script_type == MULTISIG:
+            # 2 of 3 multisig, redeem script pushed for P2SH
+            sigs = b"\x00" + push(rb(72)) + push(rb(72))
+            if script_type == MULTISIG:
+                return sigs
+            redeem = b"\x52" + (b"\x21" + rb(33)) * 3 + b"\x53\xae"
+            return sigs + push(redeem)
+
+        # Segwit: witness isn't serialised
+        return b""
+
+    # Transactions
+
+    def _outputs(self, total: int, n: int) -> tuple:
+        """
+        Split total satoshis over n outputs, return (bytes, outs).
+
+        OP_RETURN outputs carry no value, so total is split over the rest
+        (and at least one output is spendable).
+        """
+        scripts = [self._output_script() for _ in range(n)]
+        paid = [i for i, (t, _) in enumerate(scripts) if t != OP_RETURN]
+        if not paid:
+            scripts[0] = (P2PKH, self._new_script(P2PKH))
+            paid = [0]
+
+        cuts = sorted(self.rng.randint(0, total)
+                      for _ in range(len(paid) - 1))
+        values = [0] * n
+        for i, a, b in zip(paid, [0] + cuts, cuts + [total]):
+            values[i] = b - a
+
+        raw = var_int(n)
+        outs = []
+        for v, (script_type, script) in zip(values, scripts):
+            raw += struct.pack("<q", v) + var_int(len(script)) + script
+            outs.append((v, script_type))
+
+        return raw, outs
+
+    def _add_utxos(self, txid: bytes, outs: list) -> None:
+        for n, (v, script_type) in enumerate(outs):
+            if script_type != OP_RETURN:
+                self.utxos.append((txid, n, v, script_type))
+
+    def _coinbase(self, fees: int) -> tuple:
+        """Coinbase paying 50 BTC plus fees. Returns (bytes, outs)."""
+        h = self.height.to_bytes((self.height.bit_length() + 8) // 8,
+                                 'little')
+        script_sig = push(h) + self._randbytes(8)
+        outs_raw, outs = self._outputs(50 * 10 ** 8 + fees,
+                                       _draw(self.outputs, self.rng))
+        tx = struct.pack("<I", 1) \
+            + b"\x01" + b"\x00" * 32 + b"\xff\xff\xff\xff" \
+            + var_int(len(script_sig)) + script_sig + b"\xff\xff\xff\xff" \
+            + outs_raw + struct.pack("<I", 0)
+
+        return tx, outs
+
+    def _spend(self) -> tuple:
+        """Transaction spending random UTXOs. Returns (bytes, outs, fee)."""
+        n_in = min(_draw(self.inputs, self.rng), len(self.utxos))
+        raw_in = var_int(n_in)
+        total = 0
+        for _ in range(n_in):
+            # Swap remove a random UTXO
+            i = self.rng.randrange(len(self.utxos))
+            self.utxos[i], self.utxos[-1] = self.utxos[-1], self.utxos[i]
+            txid, n, v, script_type = self.utxos.pop()
+            total += v
+            script_sig = self._script_sig(script_type)
+            raw_in += txid + struct.pack("<I", n) \
+                + var_int(len(script_sig)) + script_sig + b"\xff\xff\xff\xff"
+
+        fee = min(self.rng.randint(200, 20000), total // 2)
+        outs_raw, outs = self._outputs(total - fee,
+                                       _draw(self.outputs, self.rng))
+        tx = struct.pack("<I", 2) + raw_in + outs_raw + struct.pack("<I", 0)
+
+        return tx, outs, fee
+
+    # Blocks
+
+    def next_block(self) -> bytes:
+        """Return the next block, framed as in a .dat (magic + size)."""
+        net = self.network
+        if self.height < 0 and self.genesis:
+            self.height = 0
+            block = net.genesis()
+            self.tip = hash_SHA256_twice(block[8:88])
+            return block
+
+        self.height += 1
+        n_tx = max(_draw(self.tx_per_block, self.rng), 1)
+
+        # Spend outputs from earlier blocks only
+        txs = []
+        spent = []
+        fees = 0
+        for _ in range(n_tx - 1):
+            if not self.utxos:
+                break
+            tx, outs, fee = self._spend()
+            txs.append(tx)
+            spent.append(outs)
+            fees += fee
+
+        cb, cb_outs = self._coinbase(fees)
+        txs.insert(0, cb)
+        spent.insert(0, cb_outs)
+
+        txids = [hash_SHA256_twice(tx) for tx in txs]
+        for txid, outs in zip(txids, spent):
+            self._add_utxos(txid, outs)
+
+        self.time += self.rng.randint(1, 1200)
+        header = struct.pack("<I", 0x20000000) \
+            + self.tip \
+            + merkle_root(txids) \
+            + struct.pack("<III", self.time, net.genesis_bits,
+                          self.rng.getrandbits(32))
+        self.tip = hash_SHA256_twice(header)
+
+        block = header + var_int(len(txs)) + b"".join(txs)
+
+        return net.magic + struct.pack("<I", len(block)) + block
+
+    def blocks(self, n: int=None) -> Iterator[bytes]:
+        """Yield n blocks, or forever if n is None."""
+        i = 0
+        while n is None or i < n:
+            yield self.next_block()
+            i += 1
+
+    def write(self, path: str,
+              n_blocks: int=None,
+              total_bytes: int=None,
+              file_bytes: int=MAX_FILE_BYTES,
+              preallocate: int=0,
+              start: int=0) -> list:
+        """
+        Write blocks to blk?????.dat files in path.
+
+        Stops after n_blocks or once total_bytes have been written,
+        whichever comes first. Starts a new file when the next block would
+        take the current one past file_bytes.
+
+        Args:
+            path: Output folder, created if needed.
+            n_blocks: Number of blocks to write.
+            total_bytes: Approximate total size to write.
+            file_bytes: Maximum size of each file. Default 128 MiB.
+            preallocate: Zero pad the last file to a multiple of this many
+                bytes, as a running node does. Default 0 (no padding).
+            start: Number of the first file.
+
+        Returns:
+            List of file names written.
+        """
+        if n_blocks is None and total_bytes is None:
+            raise ValueError("Set n_blocks and/or total_bytes")
+
+        os.makedirs(path, exist_ok=True)
+        files = []
+        written = 0
+        size = 0
+        fo = None
+        try:
+            for block in self.blocks(n_blocks):
+                if fo is None or (size and size + len(block) > file_bytes):
+                    if fo is not None:
+                        fo.close()
+                    fn = "blk{0:05d}.dat".format(start + len(files))
+                    fo = open(os.path.join(path, fn), 'wb')
+                    files.append(fn)
+                    size = 0
+
+                fo.write(block)
+                size += len(block)
+                written += len(block)
+                if total_bytes is not None and written >= total_bytes:
+                    break
+
+            if fo is not None and preallocate and size % preallocate:
+                fo.write(b"\x00" * (preallocate - size % preallocate))
+        finally:
+            if fo is not None:
+                fo.close()
+
+        return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--blocks', type=int,
+                        default=None)
+    parser.add_argument('--mb', type=float,
+                        default=None)
+    parser.add_argument('--seed', type=int,
+                        default=0)
+    parser.add_argument('--network', default="regtest")
+    parser.add_argument('--tx', type=int, nargs=2,
+                        default=(1, 100),
+                        metavar=('MIN', 'MAX'),
+                        help="Transactions per block")
+    parser.add_argument('--file-mb', type=float,
+                        default=128)
+    args = parser.parse_args()
+
+    gen = BlockGenerator(seed=args.seed,
+                         network=args.network,
+                         tx_per_block=tuple(args.tx))
+    total = int(args.mb * 2 ** 20) if args.mb else None
+    files = gen.write(args.path,
+                      n_blocks=args.blocks,
+                      total_bytes=total,
+                      file_bytes=int(args.file_mb * 2 ** 20))
+    print(f"Wrote {gen.height + 1} blocks to {len(files)} files in "
+          f"{args.path}")
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal read only LevelDB reader.
+
+Enough to read a database that isn't open elsewhere (eg. Core's
+blocks/index while bitcoind is stopped) without the LevelDB library:
+sorted tables (.ldb/.sst) and write ahead logs (.log) are read directly
+and, for each key, the entry with the highest sequence number wins.
+
+Core builds LevelDB without compression, so table blocks are expected
+uncompressed; snappy blocks are supported if python-snappy is installed.
+Checksums aren't verified, and all table files in the folder are read
+rather than following the MANIFEST, so files left behind by an interrupted
+compaction are included.
+"""
+
+# %% Imports
+
+import os
+from typing import Iterator
+
+# Optional, only for snappy compressed tables
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+
+# %% Constants
+
+TABLE_MAGIC = 0xdb4775248b80fb57
+LOG_BLOCK = 32768
+
+# Entry kinds
+DELETION = 0
+VALUE = 1
+
+# Log record types
+_FULL = 1
+_FIRST = 2
+_MIDDLE = 3
+_LAST = 4
+
+
+# %% Encoding
+
+def read_uvarint(buf, pos: int=0) -> tuple:
+    """Decode a LevelDB (LEB128) varint, returns (n, new pos)."""
+    n = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if not b & 0x80:
+            return n, pos
+        shift += 7
+
+
+def write_uvarint(n: int) -> bytes:
+    """Encode n as a LevelDB (LEB128) varint."""
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+    return bytes(out)
+
+
+# %% Tables
+
+def _read_block(buf, offset: int, size: int) -> bytes:
+    """Table block contents (trailer is 1 byte type + 4 byte crc)."""
+    data = buf[offset:offset+size]
+    kind = buf[offset+size]
+    if kind == 1:
+        if snappy is None:
+            raise ImportError("python-snappy is needed for compressed "
+                              "tables")
+        data = snappy.decompress(data)
+    elif kind != 0:
+        raise ValueError(f"Unknown block compression {kind}")
+
+    return data
+
+
+def _block_entries(data: bytes) -> Iterator[tuple]:
+    """Yield (key, value) from a table block (prefix compressed keys)."""
+    n_restarts = int.from_bytes(data[-4:], 'little')
+    end = len(data) - 4 - 4 * n_restarts
+    pos = 0
+    key = b""
+    while pos < end:
+        shared, pos = read_uvarint(data, pos)
+        own, pos = read_uvarint(data, pos)
+        size, pos = read_uvarint(data, pos)
+        key = key[:shared] + data[pos:pos+own]
+        pos += own
+        yield key, data[pos:pos+size]
+        pos += size
+
+
+def read_table(fn: str) -> Iterator[tuple]:
+    """Yield (key, sequence, kind, value) from a sorted table file."""
+    with open(fn, 'rb') as f:
+        buf = f.read()
+
+    footer = buf[-48:]
+    if int.from_bytes(footer[40:48], 'little') != TABLE_MAGIC:
+        raise ValueError(f"{fn} isn't a LevelDB table")
+
+    # Metaindex handle, then index handle
+    _, pos = read_uvarint(footer, 0)
+    _, pos = read_uvarint(footer, pos)
+    offset, pos = read_uvarint(footer, pos)
+    size, pos = read_uvarint(footer, pos)
+
+    for _, handle in _block_entries(_read_block(buf, offset, size)):
+        b_offset, p = read_uvarint(handle, 0)
+        b_size, _ = read_uvarint(handle, p)
+        for ikey, value in _block_entries(_read_block(buf, b_offset,
+                                                      b_size)):
+            tag = int.from_bytes(ikey[-8:], 'little')
+            yield ikey[:-8], tag >> 8, tag & 0xff, value
+
+
+# %% Logs
+
+def _batch_entries(data: bytes) -> Iterator[tuple]:
+    """Yield (key, sequence, kind, value) from a WriteBatch."""
+    seq = int.from_bytes(data[0:8], 'little')
+    count = int.from_bytes(data[8:12], 'little')
+    pos = 12
+    for i in range(count):
+        kind = data[pos]
+        size, pos = read_uvarint(data, pos + 1)
+        key = data[pos:pos+size]
+        pos += size
+        value = None
+        if kind == VALUE:
+            size, pos = read_uvarint(data, pos)
+            value = data[pos:pos+size]
+            pos += size
+        yield key, seq + i, kind, value
+
+
+def read_log(fn: str) -> Iterator[tuple]:
+    """Yield (key, sequence, kind, value) from a write ahead log."""
+    with open(fn, 'rb') as f:
+        buf = f.read()
+
+    pos = 0
+    record = b""
+    while pos + 7 <= len(buf):
+        # Records don't span the 32 KiB blocks, tails are zero filled
+        left = LOG_BLOCK - pos % LOG_BLOCK
+        if left < 7:
+            pos += left
+            continue
+
+        size = int.from_bytes(buf[pos+4:pos+6], 'little')
+        kind = buf[pos+6]
+        data = buf[pos+7:pos+7+size]
+        pos += 7 + size
+        if kind == _FULL:
+            yield from _batch_entries(data)
+        elif kind == _FIRST:
+            record = data
+        elif kind == _MIDDLE:
+            record += data
+        elif kind == _LAST:
+            yield from _batch_entries(record + data)
+        else:
+            # Zero filled (preallocated) space
+            break
+
+
+# %% Database
+
+def iter_db(path: str,
+            prefix: bytes=b"") -> Iterator[tuple]:
+    """
+    Yield the live (key, value) pairs with prefix, in key order.
+
+    Args:
+        path: LevelDB folder.
+        prefix: Only keys starting with this.
+    """
+    latest = {}
+    for f in sorted(os.listdir(path)):
+        if f.endswith(".ldb") or f.endswith(".sst"):
+            entries = read_table(os.path.join(path, f))
+        elif f.endswith(".log"):
+            entries = read_log(os.path.join(path, f))
+        else:
+            continue
+
+        for key, seq, kind, value in entries:
+            if not key.startswith(prefix):
+                continue
+            old = latest.get(key)
+            if old is None or seq > old[0]:
+                latest[key] = (seq, kind, value)
+
+    for key in sorted(latest):
+        _, kind, value = latest[key]
+        if kind == VALUE:
+            yield key, value
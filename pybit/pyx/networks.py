@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Network parameters: block file magic, address versions and genesis blocks.
+
+Each network frames blocks in its .dat files with a different 4 byte magic,
+and encodes addresses with different version bytes and bech32 prefixes.
+Genesis blocks are built from their header fields and coinbase, which only
+differ in a few places between networks.
+"""
+
+# %% Imports
+
+import struct
+
+from pybit.pyx.utils import hash_SHA256_twice, push
+
+
+# %% Network class
+
+class Network():
+    """
+    Parameters for one network.
+
+    Attributes:
+        name: Network name, eg. "mainnet".
+        magic: 4 byte magic at the start of each block in a .dat.
+        p2pkh_version: Version byte for public key hash addresses.
+        p2sh_version: Version byte for script hash addresses.
+        hrp: Human readable part of segwit addresses.
+        genesis_hash: Genesis block hash, as hex (display order).
+    """
+
+    def __init__(self, name: str,
+                 magic: bytes,
+                 p2pkh_version: bytes,
+                 p2sh_version: bytes,
+                 hrp: str,
+                 genesis_hash: str,
+                 genesis_time: int,
+                 genesis_bits: int,
+                 genesis_nonce: int,
+                 genesis_msg: bytes=b"The Times 03/Jan/2009 Chancellor on "
+                                    b"brink of second bailout for banks",
+                 genesis_pk: bytes=bytes.fromhex(
+                     "04678afdb0fe5548271967f1a67130b7105cd6a828e03909a679"
+                     "62e0ea1f61deb649f6bc3f4cef38c4f35504e51ec112de5c384d"
+                     "f7ba0b8d578a4c702b6bf11d5f")) -> None:
+        self.name = name
+        self.magic = magic
+        self.p2pkh_version = p2pkh_version
+        self.p2sh_version = p2sh_version
+        self.hrp = hrp
+        self.genesis_hash = genesis_hash
+        self.genesis_time = genesis_time
+        self.genesis_bits = genesis_bits
+        self.genesis_nonce = genesis_nonce
+        self.genesis_msg = genesis_msg
+        self.genesis_pk = genesis_pk
+
+    def __repr__(self) -> str:
+        return f"Network: {self.name} ({self.magic.hex()})"
+
+    def genesis(self) -> bytes:
+        """Return genesis block as stored in a .dat (magic + size + block)."""
+        # Coinbase: scriptSig pushes nBits, 4 and the message
+        script_sig = b"\x04\xff\xff\x00\x1d\x01\x04" \
+            + push(self.genesis_msg)
+        # Single 50 BTC output paying to the public key
+        pk_script = push(self.genesis_pk) + b"\xac"
+        tx = struct.pack("<I", 1) \
+            + b"\x01" + b"\x00" * 32 + b"\xff\xff\xff\xff" \
+            + bytes([len(script_sig)]) + script_sig + b"\xff\xff\xff\xff" \
+            + b"\x01" + struct.pack("<q", 50 * 10 ** 8) \
+            + bytes([len(pk_script)]) + pk_script \
+            + struct.pack("<I", 0)
+
+        header = struct.pack("<I", 1) \
+            + b"\x00" * 32 \
+            + hash_SHA256_twice(tx) \
+            + struct.pack("<III", self.genesis_time, self.genesis_bits,
+                          self.genesis_nonce)
+
+        block = header + b"\x01" + tx
+
+        return self.magic + struct.pack("<I", len(block)) + block
+
+
+# %% Networks
+
+MAINNET = Network(
+    name="mainnet",
+    magic=b"\xf9\xbe\xb4\xd9",
+    p2pkh_version=b"\x00",
+    p2sh_version=b"\x05",
+    hrp="bc",
+    genesis_hash="000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b6"
+                 "0a8ce26f",
+    genesis_time=1231006505,
+    genesis_bits=0x1d00ffff,
+    genesis_nonce=2083236893)
+
+TESTNET3 = Network(
+    name="testnet3",
+    magic=b"\x0b\x11\x09\x07",
+    p2pkh_version=b"\x6f",
+    p2sh_version=b"\xc4",
+    hrp="tb",
+    genesis_hash="000000000933ea01ad0ee984209779baaec3ced90fa3f408719526f8"
+                 "d77f4943",
+    genesis_time=1296688602,
+    genesis_bits=0x1d00ffff,
+    genesis_nonce=414098458)
+
+TESTNET4 = Network(
+    name="testnet4",
+    magic=b"\x1c\x16\x3f\x28",
+    p2pkh_version=b"\x6f",
+    p2sh_version=b"\xc4",
+    hrp="tb",
+    genesis_hash="00000000da84f2bafbbc53dee25a72ae507ff4914b867c565be350b0"
+                 "da8bf043",
+    genesis_time=1714777860,
+    genesis_bits=0x1d00ffff,
+    genesis_nonce=393743547,
+    genesis_msg=b"03/May/2024 000000000000000000001ebd58c244970b3aa9d783bb"
+                b"001011fbe8ea8e98e00e",
+    genesis_pk=b"\x00" * 33)
+
+SIGNET = Network(
+    name="signet",
+    magic=b"\x0a\x03\xcf\x40",
+    p2pkh_version=b"\x6f",
+    p2sh_version=b"\xc4",
+    hrp="tb",
+    genesis_hash="00000008819873e925422c1ff0f99f7cc9bbb232af63a077a480a363"
+                 "3bee1ef6",
+    genesis_time=1598918400,
+    genesis_bits=0x1e0377ae,
+    genesis_nonce=52613770)
+
+REGTEST = Network(
+    name="regtest",
+    magic=b"\xfa\xbf\xb5\xda",
+    p2pkh_version=b"\x6f",
+    p2sh_version=b"\xc4",
+    hrp="bcrt",
+    genesis_hash="0f9188f13cb7b2c71f2a335e3a4fc328bf5beb436012afca590b1a11"
+                 "466e2206",
+    genesis_time=1296688602,
+    genesis_bits=0x207fffff,
+    genesis_nonce=2)
+
+NETWORKS = {n.name: n for n in (MAINNET, TESTNET3, TESTNET4, SIGNET,
+                                REGTEST)}
+
+# Look up by .dat magic
+MAGICS = {n.magic: n for n in NETWORKS.values()}
+
+
+# %% Helpers
+
+def get_network(network) -> Network:
+    """
+    Return Network from a name or Network. None gives MAINNET.
+
+    Raises:
+        KeyError: Unknown network name.
+    """
+    if network is None:
+        return MAINNET
+    if isinstance(network, Network):
+        return network
+
+    return NETWORKS[network]
+
+
+def detect_network(buf,
+                   default: Network=None) -> Network:
+    """
+    Identify network from the magic of the first block in buf.
+
+    Checks the first 4 bytes, then (eg. if the file starts with padding)
+    the earliest known magic found anywhere in buf.
+
+    Args:
+        buf: Mapped .dat (or bytes).
+        default: Returned if no known magic is found.
+    """
+    net = MAGICS.get(bytes(buf[0:4]))
+    if net is not None:
+        return net
+
+    best = None
+    for magic, n in MAGICS.items():
+        pos = buf.find(magic)
+        if pos >= 0 and (best is None or pos < best[0]):
+            best = (pos, n)
+
+    return best[1] if best is not None else default
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Sorted, fixed-width record files for on-disk indexes.
+
+An index is a folder of segment files plus a small JSON manifest. Each
+segment is a flat array of numpy structured records sorted by their leading
+'key' field. Segments are written once and only replaced by compaction,
+which merges them in bounded memory. Queries memory map each segment and
+binary search the key column, so only a few pages are read per lookup.
+"""
+
+# %% Imports
+
+import bisect
+import json
+import os
+
+import numpy as np
+
+
+# %% Segment helpers
+
+def sort_records(records: np.ndarray) -> np.ndarray:
+    """Return records sorted by key, keeping input order for equal keys."""
+    return records[np.argsort(records['key'], kind='stable')]
+
+
+def write_segment(fn: str, records: np.ndarray) -> None:
+    """Write (already sorted) records to fn, replacing it atomically."""
+    tmp = fn + ".tmp"
+    records.tofile(tmp)
+    os.replace(tmp, fn)
+
+
+def open_segment(fn: str, dtype: np.dtype) -> np.ndarray:
+    """Memory map a segment file read only."""
+    if os.path.getsize(fn) == 0:
+        return np.empty(0, dtype=dtype)
+
+    return np.memmap(fn, dtype=dtype, mode='r')
+
+
+def find_range(seg: np.ndarray, key: bytes) -> tuple:
+    """
+    (start, end) of the records with key in a sorted segment.
+
+    Uses bisect over the key column rather than np.searchsorted, which
+    would copy the whole (strided) column first. Keys are compared as
+    stored, ie. without trailing null bytes.
+    """
+    keys = seg['key']
+    key = key.rstrip(b"\x00")
+
+    return bisect.bisect_left(keys, key), bisect.bisect_right(keys, key)
+
+
+def merge_segments(segs: list, fn: str,
+                   chunk: int=2 ** 20) -> int:
+    """
+    Merge sorted segments into one sorted file using bounded memory.
+
+    Reads up to chunk records at a time, split between the inputs. Each
+    round writes everything up to the smallest last key of the inputs that
+    still have more to read, so nothing later can sort before it.
+
+    Args:
+        segs: Sorted record arrays (eg. from open_segment).
+        fn: Output file.
+        chunk: Records to hold in memory per round.
+
+    Returns:
+        Number of records written.
+    """
+    per = max(1, chunk // max(1, len(segs)))
+    pos = [0] * len(segs)
+    n = 0
+    tmp = fn + ".tmp"
+    with open(tmp, 'wb') as f:
+        while True:
+            live = [i for i, s in enumerate(segs) if pos[i] < len(s)]
+            if not live:
+                break
+
+            parts = {i: segs[i][pos[i]:pos[i]+per] for i in live}
+            ends = [parts[i]['key'][-1] for i in live
+                    if pos[i] + per < len(segs[i])]
+            bound = min(ends) if ends else None
+
+            take = []
+            for i in live:
+                p = parts[i]
+                k = len(p) if bound is None \
+                    else int(np.searchsorted(p['key'], bound, side='right'))
+                take.append(p[:k])
+                pos[i] += k
+
+            out = sort_records(np.concatenate(take))
+            out.tofile(f)
+            n += len(out)
+
+    os.replace(tmp, fn)
+
+    return n
+
+
+def pad(b: bytes, n: int=32) -> bytes:
+    """
+    Restore trailing null bytes numpy strips from fixed width 'S' fields.
+    """
+    return bytes(b).ljust(n, b"\x00")
+
+
+# %% Segment store
+
+class SegmentStore():
+    """
+    Append-only set of sorted segments with a manifest.
+
+    Each .append() writes one new segment. When there are more than
+    max_segments, they're compacted into one. Metadata (eg. indexed
+    height) is saved in the manifest with each segment, so it always
+    describes what's on disk.
+
+    Usage:
+        store = SegmentStore("index/", dtype)
+        store.append(records, height=1000)
+        store.find(key)
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, path: str,
+                 dtype: np.dtype,
+                 max_segments: int=16,
+                 merge_chunk: int=2 ** 20) -> None:
+        """
+        Args:
+            path: Folder for segments and manifest. Created if needed.
+            dtype: numpy structured dtype, first field 'key' (bytes).
+            max_segments: Compact when there are more segments than this.
+            merge_chunk: Records held in memory while compacting.
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.max_segments = max_segments
+        self.merge_chunk = merge_chunk
+        os.makedirs(path, exist_ok=True)
+
+        self.segments = []
+        self.meta = {}
+        self._next = 0
+        fn = os.path.join(path, self.MANIFEST)
+        if os.path.exists(fn):
+            with open(fn, 'r') as f:
+                man = json.load(f)
+            self.segments = man['segments']
+            self.meta = man['meta']
+            self._next = man['next']
+        self._maps = {}
+
+        # Segments written after the last manifest save (eg. interrupted)
+        for f in os.listdir(path):
+            if (f.endswith(".seg") and f not in self.segments) \
+                    or f.endswith(".tmp"):
+                os.remove(os.path.join(path, f))
+
+    def __repr__(self) -> str:
+        return f"SegmentStore: {self.path}, {len(self.segments)} segments"
+
+    def __len__(self) -> int:
+        return sum(len(self.segment(s)) for s in self.segments)
+
+    def _save(self) -> None:
+        fn = os.path.join(self.path, self.MANIFEST)
+        with open(fn + ".tmp", 'w') as f:
+            json.dump({'segments': self.segments,
+                       'meta': self.meta,
+                       'next': self._next}, f)
+        os.replace(fn + ".tmp", fn)
+
+    def segment(self, name: str) -> np.ndarray:
+        """Return (cached) memory map of a segment."""
+        seg = self._maps.get(name)
+        if seg is None:
+            seg = open_segment(os.path.join(self.path, name), self.dtype)
+            self._maps[name] = seg
+
+        return seg
+
+    def _new_name(self) -> str:
+        name = "{0:06d}.seg".format(self._next)
+        self._next += 1
+
+        return name
+
+    def append(self, records: np.ndarray, **meta) -> None:
+        """
+        Sort and write records as a new segment, then update meta.
+
+        Args:
+            records: Array of self.dtype, in any order. Can be empty.
+            **meta: JSON serialisable values to store in .meta.
+        """
+        if len(records):
+            name = self._new_name()
+            write_segment(os.path.join(self.path, name),
+                          sort_records(records))
+            self.segments.append(name)
+        self.meta.update(meta)
+        self._save()
+
+        if len(self.segments) > self.max_segments:
+            self.compact()
+
+    def compact(self) -> None:
+        """Merge all segments into one."""
+        if len(self.segments) < 2:
+            return
+
+        old = self.segments
+        name = self._new_name()
+        merge_segments([self.segment(s) for s in old],
+                       os.path.join(self.path, name),
+                       chunk=self.merge_chunk)
+        self.segments = [name]
+        self._save()
+
+        self._maps = {}
+        for s in old:
+            os.remove(os.path.join(self.path, s))
+
+    def find(self, key: bytes) -> np.ndarray:
+        """Return copy of all records with key."""
+        out = []
+        for s in self.segments:
+            seg = self.segment(s)
+            start, end = find_range(seg, key)
+            if end > start:
+                out.append(np.array(seg[start:end]))
+
+        return np.concatenate(out) if out \
+            else np.empty(0, dtype=self.dtype)
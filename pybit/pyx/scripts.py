@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+Template based classification of output scripts.
+
+Standard output scripts have fixed layouts, so they can be identified with a
+length check and a few byte comparisons rather than parsing the script into
+OP_CODES first. Addresses are only derived for matched types.
+"""
+
+# %% Imports
+
+from concurrent.futures import ThreadPoolExecutor
+
+import base58
+import numpy as np
+
+from pybit.pyx.bech32 import bulk_segwit_encode, segwit_decode, segwit_encode
+from pybit.pyx.cache import LRUCache
+from pybit.pyx.networks import MAINNET, Network
+from pybit.pyx.utils import hash_SHA256_ripemd160, hash_SHA256_twice
+
+
+# %% Script types
+
+P2PKH = "P2PKH"
+P2SH = "P2SH"
+P2WPKH = "P2WPKH"
+P2WSH = "P2WSH"
+P2TR = "P2TR"
+P2PK = "P2PK"
+OP_RETURN = "OP_RETURN"
+MULTISIG = "MULTISIG"
+UNKNOWN = "UNKNOWN"
+
+# Sentinel for cache misses (None is a valid cached address)
+_MISSING = object()
+
+# Template bytes
+_P2PKH_HEAD = b"\x76\xa9\x14"  # OP_DUP OP_HASH160 PUSH_BYTES(20)
+_P2PKH_TAIL = b"\x88\xac"  # OP_EQUALVERIFY OP_CHECKSIG
+_P2SH_HEAD = b"\xa9\x14"  # OP_HASH160 PUSH_BYTES(20)
+_P2WPKH_HEAD = b"\x00\x14"  # OP_0 PUSH_BYTES(20)
+_P2WSH_HEAD = b"\x00\x20"  # OP_0 PUSH_BYTES(32)
+_P2TR_HEAD = b"\x51\x20"  # OP_1 PUSH_BYTES(32)
+
+
+# %% Classification
+
+def _is_multisig(script: bytes) -> bool:
+    """
+    Check for bare multisig: OP_m <pubkey>... OP_n OP_CHECKMULTISIG.
+
+    Only walks the pushes once the fixed bytes at either end have matched.
+    """
+    n_keys = script[-2] - 0x50
+    if not (1 <= n_keys <= 16) or not (1 <= script[0] - 0x50 <= n_keys):
+        return False
+
+    cur = 1
+    for _ in range(n_keys):
+        if cur >= len(script) or script[cur] not in (33, 65):
+            return False
+        cur += 1 + script[cur]
+
+    return cur == len(script) - 2
+
+
+def classify_script(script: bytes) -> str:
+    """
+    Return the standard type of an output script, or UNKNOWN.
+
+    Args:
+        script: Raw pk script bytes.
+    """
+    n = len(script)
+
+    if n == 25:
+        if script[0:3] == _P2PKH_HEAD and script[23:25] == _P2PKH_TAIL:
+            return P2PKH
+    elif n == 23:
+        if script[0:2] == _P2SH_HEAD and script[22] == 0x87:
+            return P2SH
+    elif n == 22:
+        if script[0:2] == _P2WPKH_HEAD:
+            return P2WPKH
+    elif n == 34:
+        if script[0:2] == _P2WSH_HEAD:
+            return P2WSH
+        if script[0:2] == _P2TR_HEAD:
+            return P2TR
+    elif n == 35:
+        if script[0] == 0x21 and script[34] == 0xac:
+            return P2PK
+    elif n == 67:
+        if script[0] == 0x41 and script[66] == 0xac:
+            return P2PK
+
+    if n and script[0] == 0x6a:
+        return OP_RETURN
+
+    if n >= 37 and script[-1] == 0xae and _is_multisig(script):
+        return MULTISIG
+
+    return UNKNOWN
+
+
+# %% Address encoding
+
+def base58check(payload: bytes) -> bytes:
+    """Add 4 byte double SHA256 checksum and convert to base58."""
+    return base58.b58encode(payload + hash_SHA256_twice(payload)[0:4])
+
+
+def script_to_addr(script: bytes,
+                   p2pkh_version: bytes=b"\x00",
+                   p2sh_version: bytes=b"\x05",
+                   hrp: str="bc") -> bytes:
+    """
+    Classify script and return its address, or None if it doesn't have one.
+
+    P2PK outputs are given the P2PKH address of the public key, as block
+    explorers do.
+
+    Args:
+        script: Raw pk script bytes.
+        p2pkh_version: Version byte prepended to public key hashes.
+        p2sh_version: Version byte prepended to script hashes.
+        hrp: Human readable part for segwit addresses.
+    """
+    script_type = classify_script(script)
+
+    if script_type == P2PKH:
+        return base58check(p2pkh_version + script[3:23])
+    elif script_type == P2SH:
+        return base58check(p2sh_version + script[2:22])
+    elif script_type == P2WPKH or script_type == P2WSH:
+        return segwit_encode(hrp, 0, script[2:])
+    elif script_type == P2TR:
+        return segwit_encode(hrp, 1, script[2:])
+    elif script_type == P2PK:
+        return base58check(p2pkh_version
+                           + hash_SHA256_ripemd160(script[1:-1]))
+
+    return None
+
+
+def address_to_script(addr,
+                      network: Network=MAINNET) -> bytes:
+    """
+    Output script paying to an address (inverse of script_to_addr).
+
+    Args:
+        addr: Base58 (P2PKH, P2SH) or segwit address, str or bytes.
+        network: pyx.networks.Network giving address versions and hrp.
+
+    Raises:
+        ValueError: If addr isn't a valid address for network.
+    """
+    if isinstance(addr, bytes):
+        addr = addr.decode("ascii")
+
+    if addr.lower().startswith(network.hrp + "1"):
+        witver, prog = segwit_decode(network.hrp, addr)
+        if witver is None:
+            raise ValueError(f"Invalid segwit address {addr}")
+        return bytes([0x50 + witver if witver else 0, len(prog)]) + prog
+
+    raw = base58.b58decode(addr)
+    payload = raw[:-4]
+    if len(payload) != 21 or hash_SHA256_twice(payload)[0:4] != raw[-4:]:
+        raise ValueError(f"Invalid base58 address {addr}")
+    if payload[0:1] == network.p2pkh_version:
+        return _P2PKH_HEAD + payload[1:] + _P2PKH_TAIL
+    if payload[0:1] == network.p2sh_version:
+        return _P2SH_HEAD + payload[1:] + b"\x87"
+
+    raise ValueError(f"Address {addr} isn't for {network.name}")
+
+
+# %% Cached address derivation
+
+# Addresses and public keys repeat heavily on chain, so derived addresses are
+# cached process-wide, keyed by network name and raw script bytes.
+ADDRESS_CACHE = LRUCache(maxsize=2 ** 16)
+
+
+def set_address_cache_size(maxsize: int) -> None:
+    """Resize the shared address cache. 0 turns caching off."""
+    ADDRESS_CACHE.resize(maxsize)
+
+
+def cached_script_to_addr(script: bytes,
+                          network: Network=MAINNET) -> bytes:
+    """
+    As script_to_addr, but check the shared ADDRESS_CACHE first.
+
+    Args:
+        script: Raw pk script bytes.
+        network: pyx.networks.Network giving address versions and hrp.
+    """
+    key = (network.name, script)
+    addr = ADDRESS_CACHE.get(key, _MISSING)
+    if addr is _MISSING:
+        addr = script_to_addr(script,
+                              p2pkh_version=network.p2pkh_version,
+                              p2sh_version=network.p2sh_version,
+                              hrp=network.hrp)
+        ADDRESS_CACHE.put(key, addr)
+
+    return addr
+
+
+# %% Bulk address derivation
+
+def _checksums(payloads: list) -> list:
+    """Base58check checksums for a list of payloads."""
+    return [hash_SHA256_twice(p)[0:4] for p in payloads]
+
+
+def _hash160s(pubkeys: list) -> list:
+    """SHA256 then RIPEMD160 for a list of public keys."""
+    return [hash_SHA256_ripemd160(p) for p in pubkeys]
+
+
+_B58_ALPHABET = np.frombuffer(base58.BITCOIN_ALPHABET, dtype=np.uint8)
+# Largest power of 58 that, times 2 ** 32, fits in an int64
+_B58_STEP = 5
+
+
+def bulk_b58encode(raw: list) -> list:
+    """
+    base58.b58encode for many byte strings of the same length.
+
+    Each string is treated as a big endian number in 32 bit limbs, and the
+    limbs of all of them are divided by 58 ** 5 together, giving 5 digits
+    per pass.
+    """
+    n = len(raw)
+    if n == 0:
+        return []
+
+    size = len(raw[0])
+    arr = np.frombuffer(b"".join(raw), dtype=np.uint8).reshape(n, size)
+    limbs = np.pad(arr, ((0, 0), (-size % 4, 0))).view(">u4") \
+        .astype(np.int64)
+
+    # Digits needed for the largest value, rounded up to whole passes
+    width = 0
+    while 58 ** width < 256 ** size:
+        width += 1
+    passes = -(-width // _B58_STEP)
+    width = passes * _B58_STEP
+
+    div = 58 ** _B58_STEP
+    digits = np.zeros((n, width), dtype=np.int64)
+    for p in range(passes):
+        rem = np.zeros(n, dtype=np.int64)
+        for j in range(limbs.shape[1]):
+            cur = (rem << 32) | limbs[:, j]
+            limbs[:, j] = cur // div
+            rem = cur % div
+        for i in range(_B58_STEP):
+            digits[:, width - 1 - p * _B58_STEP - i] = rem % 58
+            rem //= 58
+
+    # Leading zero bytes become "1"s, leading zero digits are dropped
+    nz = arr != 0
+    zero_bytes = np.where(nz.any(axis=1), nz.argmax(axis=1), size).tolist()
+    nz = digits != 0
+    first = np.where(nz.any(axis=1), nz.argmax(axis=1), width).tolist()
+    chars = np.ascontiguousarray(_B58_ALPHABET[digits]).view(f"S{width}") \
+        .ravel().tolist()
+
+    return [b"1" * z + c[f:] for c, z, f in zip(chars, zero_bytes, first)]
+
+
+def _map_chunks(fn, items: list,
+                threads: int=None,
+                chunk_size: int=4096) -> list:
+    """
+    Apply a list -> list function in chunks, optionally in a thread pool.
+
+    hashlib releases the GIL while hashing, so worker threads can overlap.
+    """
+    if not threads or len(items) <= chunk_size:
+        return fn(items)
+
+    chunks = [items[i:i+chunk_size]
+              for i in range(0, len(items), chunk_size)]
+    out = []
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        for res in ex.map(fn, chunks):
+            out.extend(res)
+
+    return out
+
+
+def bulk_script_to_addr(buf, spans,
+                        p2pkh_version: bytes=b"\x00",
+                        p2sh_version: bytes=b"\x05",
+                        hrp: str="bc",
+                        threads: int=None,
+                        chunk_size: int=4096) -> tuple:
+    """
+    Classify and derive addresses for many scripts in one pass.
+
+    Repeated scripts are only processed once. Hashing is batched per script
+    type and can be split across a thread pool, and base58 and bech32
+    encoding are vectorised across all scripts of a type (see
+    bulk_b58encode and pyx.bech32.bulk_segwit_encode).
+
+    Args:
+        buf: Contiguous buffer holding the scripts, eg. Dat.mmap.
+        spans: Iterable of (start, end) byte ranges of each script in buf.
+        p2pkh_version: Version byte prepended to public key hashes.
+        p2sh_version: Version byte prepended to script hashes.
+        hrp: Human readable part for segwit addresses.
+        threads: Number of hashing threads. None or 0 hashes inline.
+        chunk_size: Number of items per thread pool task.
+
+    Returns:
+        Tuple of object arrays (types, addresses), one entry per span.
+        Address is None for types without one.
+    """
+    scripts = [bytes(buf[s:e]) for s, e in spans]
+
+    # Unique scripts, in order of first appearance
+    lookup = {}
+    for sc in scripts:
+        lookup.setdefault(sc, len(lookup))
+    unique = list(lookup)
+    types = [classify_script(u) for u in unique]
+    addrs = [None] * len(unique)
+
+    by_type = {}
+    for i, t in enumerate(types):
+        by_type.setdefault(t, []).append(i)
+
+    # Public keys -> hashes for P2PK
+    p2pk = by_type.get(P2PK, [])
+    h160 = _map_chunks(_hash160s, [unique[i][1:-1] for i in p2pk],
+                       threads=threads,
+                       chunk_size=chunk_size)
+
+    # Collect base58 payloads
+    b58_idx = list(p2pk)
+    payloads = [p2pkh_version + h for h in h160]
+    for i in by_type.get(P2PKH, []):
+        b58_idx.append(i)
+        payloads.append(p2pkh_version + unique[i][3:23])
+    for i in by_type.get(P2SH, []):
+        b58_idx.append(i)
+        payloads.append(p2sh_version + unique[i][2:22])
+
+    checksums = _map_chunks(_checksums, payloads,
+                            threads=threads,
+                            chunk_size=chunk_size)
+    encoded = bulk_b58encode([p + cs for p, cs in zip(payloads, checksums)])
+    for i, a in zip(b58_idx, encoded):
+        addrs[i] = a
+
+    for t, witver in ((P2WPKH, 0), (P2WSH, 0), (P2TR, 1)):
+        idx = by_type.get(t, [])
+        encoded = bulk_segwit_encode(hrp, witver,
+                                     [unique[i][2:] for i in idx])
+        for i, a in zip(idx, encoded):
+            addrs[i] = a
+
+    # Expand back to one entry per span
+    pos = np.fromiter((lookup[sc] for sc in scripts),
+                      dtype=np.int64,
+                      count=len(scripts))
+
+    types_arr = np.empty(len(unique), dtype=object)
+    types_arr[:] = types
+    addrs_arr = np.empty(len(unique), dtype=object)
+    addrs_arr[:] = addrs
+
+    return types_arr[pos], addrs_arr[pos]
@@ -50,6 +50,57 @@ def hash_SHA256_ripemd160(by):
     return h2
 
 
+def merkle_root(hashes: list) -> bytes:
+    """
+    Return merkle root of a list of hashes (internal byte order, ie. as
+    returned by hash_SHA256_twice). Odd levels duplicate the last hash.
+    """
+    if len(hashes) == 0:
+        return b"\x00" * 32
+
+    level = list(hashes)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hash_SHA256_twice(level[i] + level[i+1])
+                 for i in range(0, len(level), 2)]
+
+    return level[0]
+
+
+def read_compact_size(buf, pos: int) -> tuple:
+    """Decode a CompactSize (block style varint), returns (n, new pos)."""
+    o = buf[pos]
+    if o < 0xfd:
+        return o, pos + 1
+    if o == 0xfd:
+        return int.from_bytes(buf[pos+1:pos+3], 'little'), pos + 3
+    if o == 0xfe:
+        return int.from_bytes(buf[pos+1:pos+5], 'little'), pos + 5
+
+    return int.from_bytes(buf[pos+1:pos+9], 'little'), pos + 9
+
+
+def var_int(n: int) -> bytes:
+    """Encode n as a CompactSize (see read_compact_size)."""
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + n.to_bytes(2, 'little')
+    if n <= 0xffffffff:
+        return b"\xfe" + n.to_bytes(4, 'little')
+
+    return b"\xff" + n.to_bytes(8, 'little')
+
+
+def push(data: bytes) -> bytes:
+    """Script push of data (up to 255 bytes)."""
+    if len(data) < 0x4c:
+        return bytes([len(data)]) + data
+
+    return b"\x4c" + bytes([len(data)]) + data
+
+
 # %% Functions from examples
 
 def split_script(pk_op):
@@ -6,12 +6,46 @@ import unittest
 # import coverage
 
 import codecs
+import logging
+import os
+import pstats
+import random
+import shutil
+import tempfile
 
-from pybit.pyx.utils import hash_SHA256, hash_SHA256_twice
-from pybit.py3.chain import Dat
-from pybit.py3.chain_map import DatMap
-from pybit.py3.block import TxOut
-from pybit.py3.common import Common
+import base58
+import numpy as np
+import pandas as pd
+
+from pybit.pyx.utils import (hash_SHA256, hash_SHA256_twice,
+                             read_compact_size, var_int)
+from pybit.pyx import scripts
+from pybit.pyx import compress
+from pybit.pyx import filters
+from pybit.pyx.bech32 import bulk_segwit_encode, segwit_encode
+from pybit.pyx import gcs
+from pybit.pyx import leveldb
+from pybit.pyx import records
+from pybit.pyx.executor import HashExecutor
+from pybit.pyx.generator import BlockGenerator
+from pybit.pyx.networks import NETWORKS, REGTEST
+from pybit.pyx.scripts import cached_script_to_addr
+from pybit.py3.address_index import AddressIndex
+from pybit.py3 import block_index
+from pybit.py3.compact_filters import FilterIndex, block_filter
+from pybit.py3.chain import Chain, Dat
+from pybit.py3.checkpoint import Checkpoint
+from pybit.py3.header_index import HeaderIndex
+from pybit.py3.fees import fees_to_pandas, iter_fees
+from pybit.py3.graph import GraphExporter, load_edges, load_nodes
+from pybit.py3.profiling import BlockProfiler
+from pybit.py3.rev import RevChain, encode_block_undo, frame_undo
+from pybit.py3.utxo import UTXOSet
+from pybit.py3.chain_map import ChainMap, DatMap
+from pybit.py3.block import Block, TxOut
+from pybit.py3.block_map import TransMap
+from pybit.py3.common import (Common, FilteredBlock, MagicMismatch,
+                               block_log, set_verbosity)
 
 
 # %% Tests for functions
@@ -38,6 +72,921 @@ class TestHashes(unittest.TestCase):
         self.assertEqual(hash_SHA256_twice(inp), exp)
 
 
+class TestScripts(unittest.TestCase):
+    """Test output script classification and addresses in pyx.scripts."""
+
+    def test_classify_templates(self):
+        """Check each standard template is recognised."""
+        cases = {
+            '76a91462e907b15cbf27d5425399ebf6f0fb50ebb88f1888ac':
+                scripts.P2PKH,
+            'a914f815b036d9bbbce5e9f2a00abd1bf3dc91e9551087': scripts.P2SH,
+            '0014751e76e8199196d454941c45d1b3a323f1433bd6': scripts.P2WPKH,
+            '00201863143c14c5166804bd19203356da136c985678cd4d27a1b8c63296'
+            '04903262': scripts.P2WSH,
+            '512079be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b'
+            '16f81798': scripts.P2TR,
+            '21' + '02' + '11' * 32 + 'ac': scripts.P2PK,
+            '6a0461626364': scripts.OP_RETURN,
+            '51' + '21' + '02' + '11' * 32 + '21' + '03' + '22' * 32
+            + '52ae': scripts.MULTISIG,
+            '': scripts.UNKNOWN,
+            '51': scripts.UNKNOWN}
+
+        for script, exp in cases.items():
+            self.assertEqual(exp,
+                             scripts.classify_script(bytes.fromhex(script)))
+
+    def test_addresses(self):
+        """Check base58, bech32 and bech32m addresses."""
+        cases = {
+            '76a91462e907b15cbf27d5425399ebf6f0fb50ebb88f1888ac':
+                b'1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa',
+            '0014751e76e8199196d454941c45d1b3a323f1433bd6':
+                b'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4',
+            '00201863143c14c5166804bd19203356da136c985678cd4d27a1b8c63296'
+            '04903262': b'bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvp'
+                        b'ysxf3qccfmv3',
+            '512079be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b'
+            '16f81798': b'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9'
+                        b'hcz7vqzk5jj0',
+            '6a0461626364': None}
+
+        for script, exp in cases.items():
+            self.assertEqual(exp,
+                             scripts.script_to_addr(bytes.fromhex(script)))
+            if exp is not None:
+                self.assertEqual(bytes.fromhex(script),
+                                 scripts.address_to_script(exp))
+
+        with self.assertRaises(ValueError):
+            scripts.address_to_script('1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNb')
+        with self.assertRaises(ValueError):
+            scripts.address_to_script(
+                'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t5')
+
+    def test_bulk_encoding(self):
+        """Check vectorised base58 and bech32 match one at a time."""
+        rng = random.Random(7)
+        raws = [bytes(rng.randrange(256) for _ in range(25))
+                for _ in range(200)]
+        raws += [b'\x00' * 25, b'\x00\x00' + b'\xff' * 23]
+        self.assertEqual([base58.b58encode(r) for r in raws],
+                         scripts.bulk_b58encode(raws))
+
+        for witver, size in ((0, 20), (0, 32), (1, 32)):
+            progs = [bytes(rng.randrange(256) for _ in range(size))
+                     for _ in range(50)]
+            self.assertEqual([segwit_encode('bcrt', witver, p)
+                              for p in progs],
+                             bulk_segwit_encode('bcrt', witver, progs))
+
+    def test_address_cache(self):
+        """Check repeated derivation hits the shared LRU cache."""
+        script = bytes.fromhex('0014751e76e8199196d454941c45d1b3a323f1433bd6')
+        cache = scripts.ADDRESS_CACHE
+        cache.clear()
+
+        a1 = scripts.cached_script_to_addr(script)
+        a2 = scripts.cached_script_to_addr(script)
+
+        self.assertEqual(a1, a2)
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+        # Bounded: oldest entries evicted on resize
+        scripts.cached_script_to_addr(b'\x6a')
+        scripts.set_address_cache_size(1)
+        self.assertEqual(1, len(cache))
+        self.assertNotIn(('mainnet', script), cache)
+        scripts.set_address_cache_size(2 ** 16)
+
+
+class TestNetworks(unittest.TestCase):
+    """Test per network magic, genesis and addresses."""
+
+    def test_genesis(self):
+        """Check built genesis blocks hash to the known genesis hashes."""
+        for name, net in NETWORKS.items():
+            g = Block.genesis(name)
+            self.assertEqual(net.magic, g[0:4])
+            self.assertEqual(net.genesis_hash,
+                             hash_SHA256_twice(g[8:88])[::-1].hex())
+
+    def test_detect_regtest(self):
+        """Test regtest .dat is detected and uses regtest addresses."""
+        path = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, path)
+        with open(path + 'blk00000.dat', 'wb') as f:
+            f.write(Block.genesis('regtest') * 2)
+
+        dat = Dat(path, 'blk00000.dat',
+                  verb=0,
+                  validateBlocks=False,
+                  validateTrans=False)
+        dat.read_all()
+
+        self.assertIs(REGTEST, dat.network)
+        self.assertEqual(2, len(dat.blocks))
+        out = dat.blocks[0].trans[0].txOut[0]
+        self.assertEqual(b'mpXwg4jMtRhuSpVq4xS3HFHmCmWp9NyGKt', out.outputAddr)
+        self.assertEqual(out.outputAddr,
+                         dat.outputs_to_pandas().outputAddr[0])
+
+    def test_magic_mismatch(self):
+        """Test a block from another network raises."""
+        path = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, path)
+        with open(path + 'blk00000.dat', 'wb') as f:
+            f.write(Block.genesis() + Block.genesis('signet'))
+
+        dat = Dat(path, 'blk00000.dat',
+                  verb=0,
+                  network='mainnet',
+                  validateBlocks=False,
+                  validateTrans=False)
+
+        with self.assertRaises(MagicMismatch):
+            dat.read_all()
+        self.assertEqual(1, len(dat.blocks))
+
+
+class TestGenerator(unittest.TestCase):
+    """Test synthetic .dat files parse back consistently."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_deterministic(self):
+        """Test same seed gives same bytes."""
+        b1 = list(BlockGenerator(seed=3).blocks(5))
+        b2 = list(BlockGenerator(seed=3).blocks(5))
+        b3 = list(BlockGenerator(seed=4).blocks(5))
+
+        self.assertEqual(b1, b2)
+        self.assertNotEqual(b1, b3)
+
+    def test_filters(self):
+        """Test raw byte predicates select the same transactions as
+        filtering fully parsed ones."""
+        files = BlockGenerator(seed=6, tx_per_block=(1, 40)).write(
+            self.path, n_blocks=40)
+        kwargs = dict(verb=0, validateBlocks=False, validateTrans=False)
+
+        full = {}
+        for b in Chain(self.path, datn=len(files), **kwargs).iter_blocks():
+            for i, t in b.trans.items():
+                full[(b.hash, i)] = [(o.satoshis, o._pkScript)
+                                     for o in t.txOut]
+        scripts = [outs[0][1] for outs in list(full.values())[::7]]
+
+        cases = [
+            (filters.OpReturn(),
+             lambda outs: any(sc[:1] == b'\x6a' for _, sc in outs)),
+            (filters.ScriptIn(scripts),
+             lambda outs: any(sc in scripts for _, sc in outs)),
+            (filters.OutputValue(min_value=10 ** 9),
+             lambda outs: any(v >= 10 ** 9 for v, _ in outs)),
+            (filters.ScriptPrefix(b'\x00\x14')
+             & ~filters.TotalValue(max_value=10 ** 8),
+             lambda outs: any(sc[:2] == b'\x00\x14' for _, sc in outs)
+             and sum(v for v, _ in outs) > 10 ** 8)]
+        for pred, check in cases:
+            exp = sorted(k for k, outs in full.items() if check(outs))
+            self.assertGreater(len(exp), 0)
+            self.assertLess(len(exp), len(full))
+
+            c = Chain(self.path, datn=len(files), predicate=pred, **kwargs)
+            got = []
+            skipped = 0
+            for b in c.iter_blocks():
+                got.extend((b.hash, i) for i in b.trans)
+                skipped += b.skipped
+                for i, t in b.trans.items():
+                    self.assertEqual(i, t.index)
+            self.assertEqual(exp, sorted(got), repr(pred))
+            self.assertEqual(len(full), len(got) + skipped)
+
+        # Consumers needing every transaction refuse a filtered block
+        b = next(b for b in c.iter_blocks() if b.skipped)
+        self.assertEqual(len(b.trans), len(b.trans_spans(partial=True)))
+        with self.assertRaises(FilteredBlock):
+            b.calc_merkleRootHash()
+        with self.assertRaises(FilteredBlock):
+            UTXOSet().apply_block(b, 1)
+        with self.assertRaises(FilteredBlock):
+            block_filter(b)
+
+    def test_parse_chain(self):
+        """Test generated files link, have valid merkle roots and spend
+        earlier outputs."""
+        files = BlockGenerator(seed=1, tx_per_block=(1, 40)).write(
+            self.path, n_blocks=60, file_bytes=20000, preallocate=4096)
+        self.assertGreater(len(files), 1)
+
+        c = Chain(self.path, datn=len(files),
+                  verb=0,
+                  validateBlocks=False,
+                  validateTrans=False)
+        txids = set()
+        prev = None
+        n = 0
+        for b in c.iter_blocks():
+            if prev is not None:
+                self.assertEqual(prev, b.prevHash)
+            self.assertEqual(b._merkleRootHash, b.calc_merkleRootHash())
+            for t in b.trans.values():
+                if t.index > 0:
+                    for i in t.txIn:
+                        self.assertIn(i._prevOutput, txids)
+                txids.add(hash_SHA256_twice(t.prep_header()))
+            prev = b.hash
+            n += 1
+
+        self.assertEqual(60, n)
+        self.assertIs(REGTEST, c.network)
+        # Stats shared over all files
+        self.assertEqual(60, c.stats.blocks)
+
+    def test_bulk_addresses(self):
+        """Test the bulk output table matches each TxOut."""
+        BlockGenerator(seed=4, tx_per_block=(1, 40)).write(self.path,
+                                                           n_blocks=30)
+        dat = Dat(self.path, 'blk00000.dat',
+                  verb=0,
+                  validateBlocks=False,
+                  validateTrans=False)
+        dat.read_all()
+        df = dat.outputs_to_pandas()
+
+        exp = [(o.value, o.pkScriptLen, cached_script_to_addr(o._pkScript,
+                                                              REGTEST))
+               for b in dat.blocks.values() for t in b.trans.values()
+               for o in t.txOut]
+        self.assertEqual(exp, list(zip(df.value, df.pkScriptLen,
+                                       df.outputAddr)))
+        self.assertGreater(df.outputType.nunique(), 4)
+
+    def test_map_matches_load(self):
+        """Test BlockMap reads the same as Block, incl. long varints."""
+        # Outputs grow ~2x per block, so later blocks have 300 tx
+        BlockGenerator(seed=2, tx_per_block=300, inputs=1, outputs=2).write(
+            self.path, n_blocks=11)
+        kwargs = dict(verb=0, validateBlocks=False, validateTrans=False)
+        dat = Dat(self.path, 'blk00000.dat', **kwargs)
+        dat_map = DatMap(self.path, 'blk00000.dat', **kwargs)
+        dat.read_all()
+        dat_map.read_all()
+
+        self.assertEqual(300, dat_map.blocks[10].nTransactions)
+        self.assertEqual([b.hash for b in dat.blocks.values()],
+                         [b.hash for b in dat_map.blocks.values()])
+
+
+class TestCompress(unittest.TestCase):
+    """Test Core VARINT, amount and script compression."""
+
+    def test_varint(self):
+        """Test known encodings and round trips."""
+        self.assertEqual('8000', compress.write_varint(128).hex())
+        self.assertEqual('ff7f', compress.write_varint(16511).hex())
+        for n in (0, 127, 255, 2 ** 32, 2 ** 60):
+            self.assertEqual(n, compress.read_varint(
+                compress.write_varint(n))[0])
+
+    def test_compact_size(self):
+        """Test CompactSize sizes and round trips."""
+        for n, size in ((0, 1), (252, 1), (253, 3), (2 ** 16, 5),
+                        (2 ** 32, 9)):
+            raw = var_int(n)
+            self.assertEqual(size, len(raw))
+            self.assertEqual((n, size), read_compact_size(raw, 0))
+
+    def test_amount(self):
+        """Test amount compression round trips."""
+        self.assertEqual(50, compress.compress_amount(50 * 10 ** 8))
+        for v in (0, 1, 999, 123456789, 21 * 10 ** 14):
+            self.assertEqual(v, compress.decompress_amount(
+                compress.compress_amount(v)))
+
+    def test_scripts(self):
+        """Test compressed scripts, including uncompressed P2PK keys."""
+        pk = bytes.fromhex(
+            '04678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea1f'
+            '61deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d578a4c70'
+            '2b6bf11d5f')
+        p2pk = b'\x41' + pk + b'\xac'
+        script, pos = compress.read_script(bytes([4 + (pk[-1] & 1)])
+                                           + pk[1:33])
+        self.assertEqual((p2pk, 33), (script, pos))
+
+        for sc in (b'\x76\xa9\x14' + b'\x01' * 20 + b'\x88\xac',
+                   b'\xa9\x14' + b'\x02' * 20 + b'\x87',
+                   b'\x21\x02' + b'\x03' * 32 + b'\xac',
+                   p2pk,
+                   b'\x00\x14' + b'\x04' * 20):
+            c = compress.compress_script(sc)
+            self.assertEqual(sc, compress.read_script(c)[0])
+        self.assertEqual(21, len(compress.compress_script(
+            b'\x76\xa9\x14' + b'\x01' * 20 + b'\x88\xac')))
+
+
+class TestRecords(unittest.TestCase):
+    """Test sorted segment files in pyx.records."""
+
+    def test_merge(self):
+        """Test bounded memory merge gives fully sorted output."""
+        path = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, path)
+
+        dtype = [('key', 'S4'), ('v', '<u4')]
+        rng = random.Random(2)
+        store = records.SegmentStore(path, dtype, max_segments=100)
+        everything = []
+        for _ in range(5):
+            recs = [(bytes([rng.randrange(8), rng.randrange(256), 0, 0]),
+                     rng.randrange(1000)) for _ in range(rng.randrange(200))]
+            everything += recs
+            store.append(np.array(recs, dtype=dtype))
+
+        store.merge_chunk = 16
+        store.compact()
+        self.assertEqual(1, len(store.segments))
+        seg = store.segment(store.segments[0])
+        self.assertEqual(sorted(k for k, _ in everything),
+                         [records.pad(k, 4) for k in seg['key']])
+        self.assertEqual(sorted(everything),
+                         sorted((records.pad(k, 4), int(v))
+                                for k, v in seg))
+
+        key = everything[0][0]
+        self.assertEqual(sum(k == key for k, _ in everything),
+                         len(store.find(key)))
+
+
+def _ldb_key(key, seq, kind=leveldb.VALUE):
+    """LevelDB internal key."""
+    return key + ((seq << 8) | kind).to_bytes(8, 'little')
+
+
+def _ldb_block(entries):
+    """Uncompressed table block, no prefix compression, plus trailer."""
+    out = b''.join(leveldb.write_uvarint(0) + leveldb.write_uvarint(len(k))
+                   + leveldb.write_uvarint(len(v)) + k + v
+                   for k, v in entries)
+    return out + (0).to_bytes(4, 'little') + (1).to_bytes(4, 'little') \
+        + b'\x00' * 5
+
+
+def _ldb_table(entries):
+    """Minimal LevelDB table: one data block, index and empty metaindex."""
+    data = _ldb_block(sorted(entries))
+    meta = _ldb_block([])
+    handle = leveldb.write_uvarint(0) + leveldb.write_uvarint(len(data) - 5)
+    index = _ldb_block([(max(entries)[0], handle)])
+    footer = leveldb.write_uvarint(len(data)) \
+        + leveldb.write_uvarint(len(meta) - 5) \
+        + leveldb.write_uvarint(len(data) + len(meta)) \
+        + leveldb.write_uvarint(len(index) - 5)
+    footer = footer.ljust(40, b'\x00') \
+        + leveldb.TABLE_MAGIC.to_bytes(8, 'little')
+    return data + meta + index + footer
+
+
+def _ldb_log(batches):
+    """LevelDB log of (sequence, [(key, value or None), ...]) batches."""
+    out = bytearray()
+    for seq, ops in batches:
+        data = seq.to_bytes(8, 'little') + len(ops).to_bytes(4, 'little')
+        for k, v in ops:
+            data += bytes([v is not None]) + leveldb.write_uvarint(len(k)) + k
+            if v is not None:
+                data += leveldb.write_uvarint(len(v)) + v
+        first = True
+        while True:
+            left = leveldb.LOG_BLOCK - len(out) % leveldb.LOG_BLOCK
+            if left < 7:
+                out += b'\x00' * left
+                continue
+            n = min(len(data), left - 7)
+            last = n == len(data)
+            kind = (1 if last else 2) if first else (4 if last else 3)
+            out += b'\x00' * 4 + n.to_bytes(2, 'little') + bytes([kind]) \
+                + data[:n]
+            data = data[n:]
+            first = False
+            if last:
+                break
+    return bytes(out)
+
+
+class TestGCS(unittest.TestCase):
+    """Test Golomb-coded set filters in pyx.gcs."""
+
+    def test_siphash(self):
+        """Check the SipHash-2-4 reference vector."""
+        self.assertEqual(0xa129ca6149be45e5,
+                         gcs.siphash24(0x0706050403020100, 0x0f0e0d0c0b0a0908,
+                                       bytes(range(15))))
+
+    def test_genesis_vector(self):
+        """Check the BIP158 testnet3 genesis filter and header."""
+        net = NETWORKS['testnet3']
+        block_hash = bytes.fromhex(net.genesis_hash)[::-1]
+        filt = gcs.build_filter([b'\x41' + net.genesis_pk + b'\xac'],
+                                block_hash)
+
+        self.assertEqual('019dfca8', filt.hex())
+        self.assertEqual('21584579b7eb08997773e5aeff3a7f932700042d0ed2a612'
+                         '9012b7d7ae81b750',
+                         gcs.filter_header(filt)[::-1].hex())
+
+    def test_match(self):
+        """Test decoding round trips and members always match."""
+        rng = random.Random(4)
+        block_hash = bytes(rng.randrange(256) for _ in range(32))
+        items = [bytes(rng.randrange(256) for _ in range(25))
+                 for _ in range(500)]
+        filt = gcs.build_filter(items, block_hash)
+
+        self.assertEqual(500, gcs.filter_size(filt))
+        self.assertEqual(sorted(gcs.hash_to_range(
+            items, gcs.filter_key(block_hash), 500 * gcs.BASIC_M)),
+            gcs.decode_filter(filt))
+        for i in items[::25]:
+            self.assertTrue(gcs.match_any(filt, block_hash, [b'x', i]))
+        self.assertFalse(gcs.match_any(filt, block_hash, [b'x' * 25]))
+        self.assertFalse(gcs.match_any(gcs.build_filter([], block_hash),
+                                       block_hash, items))
+
+
+class TestUTXO(unittest.TestCase):
+    """Test height ordering and UTXO set against the generator's."""
+
+    def setUp(self):
+        """Write generated blocks out of order, plus a stale block."""
+        self.path = tempfile.mkdtemp() + os.sep
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.gen = BlockGenerator(seed=5, tx_per_block=(1, 30))
+        blocks = list(self.gen.blocks(80))
+
+        # Sibling of block 40: same parent, different nonce
+        stale = bytearray(blocks[40])
+        stale[84:88] = b'\x01\x02\x03\x04'
+
+        order = blocks[1:] + [bytes(stale)]
+        random.Random(1).shuffle(order)
+        order = [blocks[0]] + order
+        with open(self.path + 'blk00000.dat', 'wb') as f:
+            f.write(b''.join(order[0:40]))
+        with open(self.path + 'blk00001.dat', 'wb') as f:
+            f.write(b''.join(order[40:]))
+
+        self.chain = Chain(self.path, datn=2,
+                           verb=0,
+                           validateBlocks=False,
+                           validateTrans=False)
+
+    def test_height_order(self):
+        """Test blocks come out linked, in height order, without stale."""
+        idx = self.chain.header_index()
+        self.assertEqual(81, len(idx.entries))
+        self.assertEqual(79, idx.height)
+
+        prev = None
+        for h, b in self.chain.iter_blocks_by_height():
+            if prev is not None:
+                self.assertEqual(prev, b.prevHash)
+            prev = b.hash
+        self.assertEqual(79, h)
+
+    def test_header_index_range(self):
+        """Test heights are indexed from file 0 whatever the range."""
+        with self.assertRaises(ValueError):
+            HeaderIndex(self.path, datStart=1, verb=0).update()
+
+        chain = Chain(self.path, datStart=1, datn=1,
+                      verb=0, validateTrans=False)
+        idx = chain.header_index()
+        self.assertEqual(self.chain.header_index().hashes, idx.hashes)
+        self.assertEqual(self.chain.block_at(50).hash,
+                         chain.block_at(50).hash)
+
+        # Only blocks in the files in range are selected
+        exp = [h for h in range(80) if idx.position(h)[0] == 1]
+        self.assertGreater(len(exp), 0)
+        self.assertEqual(exp, chain.select_heights())
+        self.assertEqual(exp[:3], chain.select_heights(stop=exp[2] + 1))
+
+    def test_time_queries(self):
+        """Test time searches with out of order timestamps, and ranges."""
+        idx = self.chain.header_index()
+        rng = random.Random(3)
+        for h in idx.hashes:
+            e = idx.entries[h]
+            idx.entries[h] = e[:5] + (e[5] + rng.randrange(-7200, 7200),)
+        idx._set_times()
+        times = [int(t) for t in idx.times]
+        self.assertNotEqual(sorted(times), times)
+
+        for _ in range(100):
+            t0, t1 = sorted(rng.randrange(min(times) - 100, max(times) + 100)
+                            for _ in range(2))
+            exp = [h for h, t in enumerate(times) if t0 <= t < t1]
+            self.assertEqual(exp, list(idx.heights_in_time(t0, t1)))
+            lo, hi = idx.time_window(t0, t1)
+            self.assertTrue(all(lo <= h < hi for h in exp))
+        self.assertEqual(
+            list(idx.heights_in_time(start=max(times))),
+            list(idx.heights_in_time(
+                start=pd.Timestamp(max(times), unit='s').isoformat())))
+        self.assertEqual(
+            list(idx.heights_in_time(start=max(times))),
+            list(idx.heights_in_time(
+                start=pd.Timestamp(max(times), unit='s', tz="UTC")
+                .tz_convert("Asia/Tokyo"))))
+
+        t0 = sorted(times)[30]
+        hs = self.chain.select_heights(start=10, stop=70, start_time=t0)
+        self.assertEqual([h for h in range(10, 70) if times[h] >= t0], hs)
+        ranges = self.chain.byte_ranges(10, 70, start_time=t0)
+        self.assertLessEqual(len(ranges), len(hs))
+        self.assertEqual(sum(e - s for _, s, e in ranges),
+                         sum(idx.block_span(h)[2] - idx.block_span(h)[1]
+                             for h in hs))
+
+        got = list(self.chain.iter_blocks_by_time(start_time=t0,
+                                                  order="file"))
+        self.assertEqual(sorted(h for h, t in enumerate(times) if t >= t0),
+                         sorted(h for h, _ in got))
+        for h, b in got:
+            self.assertEqual(idx.hashes[h][::-1].hex(), b.hash)
+
+        # A chain not starting at file 0 gives the same heights, limited
+        # to the blocks in its files
+        chain = Chain(self.path, datStart=1, datn=1,
+                      verb=0, validateTrans=False)
+        own = chain.header_index()
+        self.assertEqual(idx.hashes, own.hashes)
+        exp = [h for h, t in enumerate(own.times)
+               if t >= t0 and own.position(h)[0] == 1]
+        self.assertGreater(len(exp), 0)
+        self.assertEqual(exp, chain.select_heights(start_time=t0))
+        got = list(chain.iter_blocks_by_time(start_time=t0))
+        self.assertEqual(exp, [h for h, _ in got])
+        for h, b in got:
+            self.assertEqual(chain.block_at(h).hash, b.hash)
+
+    def test_block_index(self):
+        """Test block positions from a LevelDB block index fixture."""
+        scanned = self.chain.header_index()
+        table = []
+        ops = []
+        for h, (datn, offset, _, _, _, _) in scanned.entries.items():
+            d = scanned.open(datn)
+            e = {'version': 259900,
+                 'height': scanned.heights[h],
+                 'status': block_index.BLOCK_VALID_SCRIPTS
+                 | block_index.BLOCK_HAVE_DATA,
+                 'nTx': 1,
+                 'file': datn,
+                 'dataPos': offset + 8,
+                 'undoPos': None,
+                 'header': bytes(d.mmap[offset+8:offset+88])}
+            raw = block_index.encode_block_index(e)
+            self.assertEqual(e, block_index.decode_block_index(raw))
+            if h in scanned.hashes[:40]:
+                table.append((_ldb_key(b'b' + h, 1), raw))
+            else:
+                ops.append((b'b' + h, raw))
+
+        # Stale block later marked invalid, unknown header, deleted key
+        stale = [h for h in scanned.entries if h not in scanned.hashes][0]
+        e = block_index.decode_block_index(dict(ops)[b'b' + stale])
+        e['status'] |= 32
+        ops.append((b'b' + stale, block_index.encode_block_index(e)))
+        ops.append((b'b' + b'\x07' * 32, block_index.encode_block_index(
+            {'version': 1, 'height': 90, 'status': 2, 'nTx': 0,
+             'file': None, 'dataPos': None, 'undoPos': None,
+             'header': b'\x00' * 80})))
+        table.append((_ldb_key(b'F', 1), b'\x01'))
+
+        db = self.path + 'index' + os.sep
+        os.mkdir(db)
+        with open(db + '000005.ldb', 'wb') as f:
+            f.write(_ldb_table(table))
+        with open(db + '000006.log', 'wb') as f:
+            f.write(_ldb_log([(2, ops[:-2]),
+                              (200, [(b'x', b'\x01' * 70000)]),
+                              (300, ops[-2:] + [(b'x', None)])]))
+        self.assertEqual(83, len(dict(leveldb.iter_db(db))))
+
+        chain = Chain(self.path, datn=2, verb=0, validateTrans=False)
+        idx = chain.header_index(block_index=db)
+        self.assertEqual(80, len(idx.entries))
+        self.assertEqual(scanned.hashes, idx.hashes)
+        self.assertEqual(scanned.read_block(50).hash,
+                         chain.block_at(50).hash)
+
+    def test_utxo_set(self):
+        """Test set matches generator, incl. resuming from the db."""
+        fn = self.path + 'utxo.sqlite'
+        utxo = UTXOSet(fn, flush_every=10, cache_size=20)
+        utxo.build(self.chain, height=50)
+        utxo.close()
+
+        utxo = UTXOSet(fn)
+        self.assertEqual(50, utxo.height)
+        utxo.build(self.chain)
+
+        exp = {(txid, n): v for txid, n, v, _ in self.gen.utxos}
+        got = utxo.get_many(list(exp))
+        self.assertEqual(list(exp.values()), [c[0] for c in got])
+        self.assertEqual(len(exp), len(utxo))
+        self.assertEqual(0, utxo.missing)
+
+    def test_utxo_cache(self):
+        """Test unflushed spends aren't re-read and the cache is trimmed."""
+        utxo = UTXOSet(cache_size=20)
+        utxo.build(self.chain, height=50)
+        self.assertEqual(20, len(utxo._cache))
+
+        # Spending block 51 twice finds its db coins spent the second time
+        b = self.chain.block_at(51)
+        utxo.apply_block(b, 51)
+        deleted = len(utxo._deleted)
+        self.assertGreater(deleted, 0)
+        utxo.apply_block(b, 52)
+        self.assertEqual(deleted, utxo.missing)
+
+    def test_fees(self):
+        """Test fees in each block add up to coinbase minus subsidy."""
+        coinbase = {}
+        for h, b, _ in iter_fees(self.chain, start=1):
+            coinbase[h] = b.trans[0].outputValue - 50 * 10 ** 8
+
+        df = fees_to_pandas(self.chain, start=1)
+        self.assertFalse(df.fee.isnull().any())
+        self.assertTrue((df.fee > 0).all())
+        self.assertTrue((df.feerate == df.fee / df.vsize).all())
+        sums = df.groupby('height').fee.sum()
+        for h, fee in sums.items():
+            self.assertEqual(coinbase[h], fee)
+
+    def test_address_index(self):
+        """Test index history matches a direct pass over the blocks."""
+        path = self.path + 'addr' + os.sep
+        utxo = UTXOSet(self.path + 'utxo.sqlite')
+        idx = AddressIndex(path, flush_every=7, max_segments=3)
+        idx.build(self.chain, utxo, height=40)
+        utxo.close()
+
+        # Resume, compacting as segments are added
+        utxo = UTXOSet(self.path + 'utxo.sqlite')
+        idx = AddressIndex(path, flush_every=7, max_segments=3)
+        self.assertEqual(40, idx.height)
+        idx.build(self.chain, utxo)
+        self.assertLessEqual(len(idx.store.segments), 3)
+
+        exp = {}
+        where = {}
+        for h, b in self.chain.iter_blocks_by_height():
+            for t, (s, e) in zip(b.trans.values(), b.trans_spans()):
+                txid = hash_SHA256_twice(b.mmap[s:e])[::-1].hex()
+                if t.index > 0:
+                    for vin, i in enumerate(t.txIn):
+                        op = (i._prevOutput[::-1].hex(),
+                              int.from_bytes(i._prevIndex, 'little'))
+                        if op in where:
+                            exp[where[op]][op][3] = (txid, vin, h)
+                for n, o in enumerate(t.txOut):
+                    addr = cached_script_to_addr(o._pkScript, REGTEST)
+                    if addr is None:
+                        continue
+                    exp.setdefault(addr, {})[(txid, n)] = [
+                        h, o.satoshis, None, None]
+                    where[(txid, n)] = addr
+
+        for addr, outs in exp.items():
+            hist = sorted((h, txid, n, v, s)
+                          for (txid, n), (h, v, _, s) in outs.items())
+            self.assertEqual(hist, idx.history(addr))
+        self.assertEqual([], idx.history("not an address"))
+
+    def _interrupt_at(self, height):
+        """Make the chain raise when reaching height, until restored."""
+        iter_blocks = self.chain.iter_blocks_by_height
+
+        def interrupted(start=0, stop=None):
+            for h, b in iter_blocks(start, stop):
+                if h == height:
+                    raise RuntimeError("Interrupted")
+                yield h, b
+        self.chain.iter_blocks_by_height = interrupted
+        self.addCleanup(setattr, self.chain, 'iter_blocks_by_height',
+                        iter_blocks)
+
+    def test_address_index_resume(self):
+        """Test interrupted builds resume to the same index."""
+        ref = AddressIndex(self.path + 'ref' + os.sep)
+        ref.build(self.chain)
+
+        path = self.path + 'addr' + os.sep
+        fn = self.path + 'utxo.sqlite'
+        self._interrupt_at(32)
+        with self.assertRaises(RuntimeError):
+            AddressIndex(path, flush_every=7).build(
+                self.chain, UTXOSet(fn, flush_every=3))
+        self.assertEqual(27, AddressIndex(path).height)
+        self.assertEqual(27, UTXOSet(fn).height)
+
+        # Interrupted between writing the index and the UTXO set
+        del self.chain.iter_blocks_by_height
+        def interrupted():
+            raise RuntimeError("Interrupted")
+        utxo = UTXOSet(fn)
+        utxo.flush = interrupted
+        with self.assertRaises(RuntimeError):
+            AddressIndex(path, flush_every=7).build(self.chain, utxo)
+        self.assertEqual(34, AddressIndex(path).height)
+        self.assertEqual(27, UTXOSet(fn).height)
+
+        idx = AddressIndex(path, flush_every=7)
+        idx.build(self.chain, UTXOSet(fn))
+        self.assertEqual(ref.height, idx.height)
+        for h, b in self.chain.iter_blocks_by_height():
+            for t in b.trans.values():
+                for o in t.txOut:
+                    addr = cached_script_to_addr(o._pkScript, REGTEST)
+                    if addr is not None:
+                        self.assertEqual(ref.history(addr),
+                                         idx.history(addr))
+
+    def test_compact_filters(self):
+        """Test candidate blocks include every block using a script."""
+        utxo = UTXOSet(self.path + 'utxo.sqlite')
+        fi = FilterIndex(self.path + 'filters.sqlite', flush_every=7,
+                         network=REGTEST)
+        fi.build(self.chain, utxo, height=40)
+        with self.assertRaises(ValueError):
+            FilterIndex(network=REGTEST).build(self.chain, utxo)
+
+        # Resume
+        fi = FilterIndex(self.path + 'filters.sqlite', network=REGTEST)
+        self.assertEqual(40, fi.height)
+        fi.build(self.chain, utxo)
+        self.assertEqual(79, fi.height)
+
+        used = {}
+        prev = b'\x00' * 32
+        for h, b in self.chain.iter_blocks_by_height():
+            block_hash, filt, header = fi.get(h)
+            self.assertEqual(hash_SHA256_twice(b.prep_header()), block_hash)
+            self.assertEqual(gcs.filter_header(filt, prev), header)
+            prev = header
+            for t in b.trans.values():
+                for o in t.txOut:
+                    used.setdefault(o._pkScript, set()).add(h)
+
+        rng = random.Random(6)
+        watch = rng.sample(sorted(s for s in used if s and s[0] != 0x6a), 5)
+        for script in watch:
+            got = list(fi.match([script]))
+            self.assertTrue(used[script] <= set(got))
+        got = list(fi.match(watch, start=20, stop=60))
+        self.assertTrue(all(20 <= h < 60 for h in got))
+        self.assertEqual([], list(fi.match([b'\x51' * 30])))
+
+        script, addr = next((s, cached_script_to_addr(s, REGTEST))
+                            for s in sorted(used)
+                            if cached_script_to_addr(s, REGTEST))
+        self.assertEqual(list(fi.match([script])),
+                         [h for h, _ in fi.iter_matching_blocks(
+                             self.chain, [addr.decode()])])
+
+        # Interrupted, and interrupted between the filter and UTXO writes
+        fn = self.path + 'utxo2.sqlite'
+        self._interrupt_at(32)
+        with self.assertRaises(RuntimeError):
+            FilterIndex(self.path + 'filters2.sqlite', flush_every=7).build(
+                self.chain, UTXOSet(fn, flush_every=3))
+        self.assertEqual(27, UTXOSet(fn).height)
+        del self.chain.iter_blocks_by_height
+
+        def interrupted():
+            raise RuntimeError("Interrupted")
+        utxo = UTXOSet(fn)
+        utxo.flush = interrupted
+        with self.assertRaises(RuntimeError):
+            FilterIndex(self.path + 'filters2.sqlite', flush_every=7).build(
+                self.chain, utxo)
+        fi2 = FilterIndex(self.path + 'filters2.sqlite')
+        self.assertEqual(34, fi2.height)
+        fi2.build(self.chain, UTXOSet(fn))
+        self.assertEqual([fi.get(h) for h in range(80)],
+                         [fi2.get(h) for h in range(80)])
+
+        # Output only filter of a block matches its outputs
+        b = self.chain.block_at(5)
+        filt = block_filter(b)
+        block_hash = hash_SHA256_twice(b.prep_header())
+        for t in b.trans.values():
+            for o in t.txOut:
+                if o._pkScript and o._pkScript[0] != 0x6a:
+                    self.assertTrue(gcs.match_any(filt, block_hash,
+                                                  [o._pkScript]))
+
+    def test_graph(self):
+        """Test edges match each input's resolved prevout, over chunks."""
+        path = self.path + 'graph' + os.sep
+        g = GraphExporter(path, chunk_size=50, cache_size=20)
+        g.export(self.chain, flush_every=5)
+        self.assertEqual(0, g.missing)
+
+        nodes = load_nodes(path)
+        self.assertEqual(list(range(g.nTx)), list(nodes.id))
+        txids = [records.pad(t) for t in nodes.txid]
+        edges = load_edges(path)
+        self.assertGreater(len(os.listdir(path)), 4)
+        got = sorted(zip((txids[s] for s in edges.src), edges.vout,
+                         (txids[d] for d in edges.dst), edges.vin,
+                         edges.value, edges.dstHeight))
+
+        exp = []
+        for h, b, ids in iter_fees(self.chain):
+            for t, txid in zip(list(b.trans.values())[1:], ids[1:]):
+                for vin, (i, v) in enumerate(zip(t.txIn, t.inputValues)):
+                    exp.append((i._prevOutput,
+                                int.from_bytes(i._prevIndex, 'little'),
+                                txid, vin, v, h))
+        self.assertEqual(sorted(exp), got)
+
+    def test_rev(self):
+        """Test undo records written in height order match shuffled blocks."""
+        utxo = UTXOSet()
+        revs = {0: [], 1: []}
+        exp = {}
+        for h, b in self.chain.iter_blocks_by_height():
+            txids = [hash_SHA256_twice(b.mmap[s:e])
+                     for s, e in b.trans_spans()]
+            spent = utxo.apply_block(b, h, txids=txids)
+            if h == 0:
+                continue
+            exp.update(zip(txids, spent))
+            revs[b.datn].append(frame_undo(encode_block_undo(spent),
+                                           b.mmap[b.start+12:b.start+44],
+                                           REGTEST.magic))
+        for datn, recs in revs.items():
+            with open(self.path + 'rev{0:05d}.dat'.format(datn), 'wb') as f:
+                f.write(b''.join(recs) + b'\x00' * 100)
+
+        rc = RevChain(self.path, datn=2, validateTrans=False)
+        n = 0
+        for b, spent in rc.iter_blocks():
+            if spent is None:
+                continue
+            for (s, e), coins in zip(b.trans_spans(), spent):
+                self.assertEqual(exp[hash_SHA256_twice(b.mmap[s:e])], coins)
+            n += 1
+        self.assertEqual(79, n)
+        # Genesis and the stale block (or its sibling, same undo data)
+        self.assertEqual(2, rc.unmatched)
+
+        df = rc.fees_to_pandas()
+        ref = fees_to_pandas(self.chain, start=1)
+        self.assertEqual(sorted(ref.fee), sorted(df.fee))
+
+    def test_tx_index(self):
+        """Test txid lookups read back the right transaction."""
+        path = self.path + 'txids' + os.sep
+        first = Chain(self.path, datn=1, verb=0, validateTrans=False)
+        first.tx_index(path)
+        idx = self.chain.tx_index(path, rebuild=True)
+        self.assertEqual(['0', '1'], sorted(idx.files))
+        self.assertEqual(1, len(idx.store.segments))
+
+        n = 0
+        for d in range(2):
+            for b in Dat(self.path, 'blk{0:05d}.dat'.format(d),
+                         verb=0, validateTrans=False).iter_blocks():
+                for s, e in b.trans_spans():
+                    txid = hash_SHA256_twice(b.mmap[s:e])
+                    t = self.chain.get_transaction(txid[::-1].hex())
+                    self.assertEqual(txid,
+                                     hash_SHA256_twice(t.prep_header()))
+                    n += 1
+        self.assertEqual(n, len(idx))
+        self.assertIsNone(self.chain.get_transaction(b'\x01' * 32))
+
+        # Transactions are read with the Dat's classes
+        chain_map = ChainMap(self.path, datn=2, verb=0, validateTrans=False)
+        chain_map.tx_index(path)
+        t = chain_map.get_transaction(txid)
+        self.assertIsInstance(t, TransMap)
+        self.assertEqual(txid, hash_SHA256_twice(t.prep_header()))
+
+
 # %% Tests for specific blocks (genesis etc.)
 
 class GenesisTest(unittest.TestCase):
@@ -94,6 +1043,280 @@ class GenesisTestMap(GenesisTest):
         self.dat = dat
 
 
+class GenesisFileTest(unittest.TestCase):
+    """Parse a .dat written from Block.genesis() (no download needed)."""
+
+    nBlocks = 3
+
+    def setUp(self):
+        """Write genesis block repeatedly to a temporary blk00000.dat."""
+        self.path = tempfile.mkdtemp() + os.sep
+        with open(self.path + 'blk00000.dat', 'wb') as f:
+            f.write(Block.genesis() * self.nBlocks)
+
+        self.dat = Dat(self.path, 'blk00000.dat',
+                       verb=0,
+                       validateBlocks=False,
+                       validateTrans=False)
+
+    def test_outputs_to_pandas(self):
+        """Test bulk address column in output table."""
+        self.dat.read_next_block(self.nBlocks,
+                                 tqdm_on=False)
+        df = self.dat.outputs_to_pandas()
+
+        self.assertEqual(self.nBlocks, len(df))
+        self.assertEqual(['P2PK'] * self.nBlocks, list(df.outputType))
+        self.assertEqual([b'1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa']
+                         * self.nBlocks, list(df.outputAddr))
+
+    def test_stats(self):
+        """Test counters and stage timings."""
+        self.dat.read_all()
+        st = self.dat.stats
+
+        self.assertEqual((self.nBlocks,) * 4,
+                         (st.blocks, st.tx, st.inputs, st.outputs))
+        self.assertEqual(self.nBlocks * len(Block.genesis()), st.bytes)
+        self.assertGreater(st.times['tx'], 0)
+        self.assertIn(f'pybit_blocks_total {self.nBlocks}\n',
+                      st.prometheus())
+
+    def test_profiler(self):
+        """Test slowest blocks are kept and profiles dumped."""
+        prof_dir = os.path.join(self.path, 'prof')
+        prof = BlockProfiler(top_n=2,
+                             threshold=0,
+                             profile_dir=prof_dir,
+                             max_profiles=1)
+        self.dat.profiler = prof
+        self.dat.read_all()
+
+        df = prof.to_pandas()
+        self.assertEqual(self.nBlocks, prof.n)
+        self.assertEqual(2, len(df))
+        self.assertTrue(df.seconds.is_monotonic_decreasing)
+        self.assertTrue((df.validation > 0).all())
+        self.assertAlmostEqual(prof.validation,
+                               self.dat.stats.times['validation'])
+        self.assertEqual([len(Block.genesis())] * 2, list(df['size']))
+        self.assertEqual(2, len(prof.trans_to_pandas()))
+        self.assertEqual(1, len(prof.profiles))
+        pstats.Stats(prof.profiles[0])
+
+    def test_logging_off(self):
+        """Test verb=0 disables block logging and objects hold no verb."""
+        self.dat.read_next_block(tqdm_on=False)
+
+        self.assertFalse(block_log.isEnabledFor(logging.INFO))
+        self.assertFalse(hasattr(self.dat.blocks[0], 'verb'))
+        self.assertFalse(hasattr(self.dat.blocks[0].trans[0], 'verb'))
+
+        set_verbosity(3)
+        self.assertTrue(block_log.isEnabledFor(logging.INFO))
+        set_verbosity(0)
+
+    def test_logging_default(self):
+        """Test default verb leaves logger levels and handlers alone."""
+        root = logging.getLogger("pybit")
+        handlers = list(root.handlers)
+        block_log.setLevel(logging.DEBUG)
+        self.addCleanup(set_verbosity, 0)
+
+        dat = Dat(self.path, 'blk00000.dat',
+                  validateBlocks=False,
+                  validateTrans=False)
+        with self.assertLogs("pybit.block", logging.INFO) as cm:
+            dat.read_next_block(tqdm_on=False)
+            dat.blocks[0]._print()
+        dat.mmap.close()
+
+        self.assertEqual(logging.DEBUG, block_log.level)
+        self.assertEqual(handlers, root.handlers)
+        self.assertTrue(any(isinstance(h, logging.NullHandler)
+                            for h in handlers))
+        self.assertIn(dat.blocks[0].hash, cm.output[-1])
+
+    def test_iter_blocks(self):
+        """Test streaming over Dat and Chain retains nothing by default."""
+        h = '000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f'
+        hashes = [b.hash for b in self.dat.iter_blocks()]
+        self.assertEqual([h] * self.nBlocks, hashes)
+        self.assertEqual({}, self.dat.blocks)
+
+        shutil.copy(self.path + 'blk00000.dat', self.path + 'blk00001.dat')
+        c = Chain(path=self.path,
+                  datStart=0,
+                  datn=2,
+                  verb=0,
+                  validateBlocks=False,
+                  validateTrans=False)
+        trans = list(c.iter_transactions())
+
+        self.assertEqual(2 * self.nBlocks, len(trans))
+        self.assertEqual({}, c.dats)
+
+    def test_checkpoint_resume(self):
+        """Test an interrupted scan resumes without repeating rows."""
+        shutil.copy(self.path + 'blk00000.dat', self.path + 'blk00001.dat')
+        fn = self.path + 'scan.json'
+        rows = []
+
+        def chain(cp):
+            return Chain(path=self.path,
+                         datStart=0,
+                         datn=2,
+                         verb=0,
+                         checkpoint=cp,
+                         validateBlocks=False,
+                         validateTrans=False)
+
+        # Export stage records rows written, interrupt after 4 blocks
+        cp = Checkpoint(fn, every=2)
+        cp.register('export', lambda: {'rows': len(rows)})
+        for b in chain(cp).iter_blocks():
+            rows.append(b.id)
+            if len(rows) == 4:
+                break
+
+        # Resume: roll export back to saved state and carry on
+        cp = Checkpoint(fn, every=2)
+        cp.register('export', lambda: {'rows': len(rows)})
+        del rows[cp.state['export']['rows']:]
+        for b in chain(cp).iter_blocks():
+            rows.append(b.id)
+
+        self.assertEqual([(d, i) for d in range(2)
+                          for i in range(self.nBlocks)], rows)
+        self.assertEqual((2, 0), (cp.datn, cp.cursor))
+
+    def test_checkpoint_read_all(self):
+        """Test read_all resumes mid-file from an iter_blocks checkpoint."""
+        shutil.copy(self.path + 'blk00000.dat', self.path + 'blk00001.dat')
+        fn = self.path + 'scan.json'
+
+        def chain(cp):
+            return Chain(path=self.path,
+                         datStart=0,
+                         datn=2,
+                         checkpoint=cp,
+                         validateBlocks=False,
+                         validateTrans=False)
+
+        # Block 0 is recorded once the caller asks for block 1
+        for i, b in enumerate(chain(Checkpoint(fn, every=1)).iter_blocks()):
+            if i == 1:
+                break
+
+        cp = Checkpoint(fn)
+        self.assertEqual((0, 0), (cp.datn, cp.nBlock))
+        c = chain(cp)
+        c.read_all()
+
+        self.assertEqual(list(range(1, self.nBlocks)), list(c.dats[0].blocks))
+        self.assertEqual(list(range(self.nBlocks)), list(c.dats[1].blocks))
+        self.assertEqual((2, 0), (cp.datn, cp.cursor))
+
+    def test_padding_and_partial_blocks(self):
+        """Test zero padding and a truncated block end reading cleanly."""
+        g = Block.genesis()
+        pad = b'\x00' * 1000
+
+        # Block, padding, block (found by magic scan), padding
+        with open(self.path + 'blk00002.dat', 'wb') as f:
+            f.write(g + pad + g + pad)
+        dat = Dat(self.path, 'blk00002.dat',
+                  verb=0,
+                  validateBlocks=False,
+                  validateTrans=False)
+        dat.read_all()
+        self.assertEqual(2, len(dat.blocks))
+        self.assertEqual(2 * len(g) + len(pad), dat.lastComplete)
+        self.assertEqual('padding', dat.tailState)
+
+        # Block followed by partially written block
+        with open(self.path + 'blk00003.dat', 'wb') as f:
+            f.write(g + g[0:100])
+        dat = Dat(self.path, 'blk00003.dat',
+                  verb=0,
+                  validateBlocks=False,
+                  validateTrans=False)
+        self.assertEqual(1, len(list(dat.iter_blocks())))
+        self.assertEqual(len(g), dat.lastComplete)
+        self.assertEqual('truncated', dat.tailState)
+
+    def test_follow(self):
+        """Test follow mode picks up written, appended and new files."""
+        g = Block.genesis()
+        with open(self.path + 'blk00000.dat', 'wb') as f:
+            # One block then preallocated zero padding
+            f.write(g + b'\x00' * len(g))
+
+        def node():
+            # Simulate node writing while follow() is idle
+            step = len(events)
+            events.append(step)
+            if step == 0:
+                with open(self.path + 'blk00000.dat', 'r+b') as f:
+                    f.seek(len(g))
+                    f.write(g)
+            elif step == 1:
+                with open(self.path + 'blk00000.dat', 'ab') as f:
+                    f.write(g)
+            elif step == 2:
+                with open(self.path + 'blk00001.dat', 'wb') as f:
+                    f.write(g)
+
+            return step > 2
+
+        events = []
+        c = Chain(path=self.path,
+                  verb=0,
+                  validateBlocks=False,
+                  validateTrans=False)
+        ids = [b.id for b in c.follow(datn=0,
+                                      from_end=False,
+                                      poll=0,
+                                      stop=node)]
+
+        self.assertEqual([(0, 0), (0, 1), (0, 2), (1, 0)], ids)
+
+    def test_interleaved_indexing(self):
+        """Test block ids are owned by each Dat, not a global counter."""
+        shutil.copy(self.path + 'blk00000.dat', self.path + 'blk00001.dat')
+        dat1 = Dat(self.path, 'blk00001.dat',
+                   verb=0,
+                   validateBlocks=False,
+                   validateTrans=False)
+
+        for _ in range(self.nBlocks):
+            self.dat.read_next_block(tqdm_on=False)
+            dat1.read_next_block(tqdm_on=False)
+        dat1.mmap.close()
+
+        self.assertEqual(1, dat1.datn)
+        self.assertEqual(list(range(self.nBlocks)), list(dat1.blocks))
+        self.assertEqual((1, 2), dat1.blocks[2].id)
+        self.assertEqual((0, 2), self.dat.blocks[2].id)
+        self.assertEqual(0, dat1.blocks[2].trans[0].index)
+
+    def test_merkle_root_threaded(self):
+        """Test txids hashed in HashExecutor reproduce merkle root."""
+        self.dat.read_next_block(self.nBlocks,
+                                 tqdm_on=False)
+        with HashExecutor(threads=2, chunk_bytes=1) as ex:
+            txids = self.dat.txids(executor=ex)
+            root = self.dat.blocks[0].calc_merkleRootHash(executor=ex)
+
+        self.assertEqual(self.dat.txids(), txids)
+        self.assertEqual(self.dat.blocks[0]._merkleRootHash, root)
+
+    def tearDown(self):
+        """Close and remove temporary file."""
+        self.dat.mmap.close()
+        shutil.rmtree(self.path)
+
+
 # %% Tests for classes
 
 class TestCommon(unittest.TestCase):
@@ -143,6 +1366,20 @@ class TestTxOut(unittest.TestCase):
 
         self.assertEqual(exp, TxOut.PK2Addr(pk))
 
+    def test_outputAddr_P2PK(self):
+        """Test address of genesis coinbase output (P2PK)."""
+        pk = "04678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0e"\
+            "a1f61deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d578a4"\
+            "c702b6bf11d5f"
+        raw = b'\x00\xf2\x05\x2a\x01\x00\x00\x00' + b'\x43' \
+            + codecs.decode("41" + pk + "ac", "hex")
+        txOut = TxOut(raw, 0)
+        txOut.read_out()
+
+        self.assertEqual(scripts.P2PK, txOut.outputType)
+        self.assertEqual(b'1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa',
+                         txOut.outputAddr)
+
     def tearDown(self):
         """Close dummy object."""
         pass